@@ -1,346 +1,131 @@
-import requests
 from datetime import datetime, timedelta, date
 import argparse
+from psycopg2.extras import execute_values
 from db_connection import get_connection
-
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-BASE_URL = "https://api.balldontlie.io/v1"
+import bdl_client
+import dimensions
+import fetch_engine
+import ingest_state
+import pipeline
+from ingest_dates import (
+    date_strings, chunk_dates, dates_params,
+    add_schedule_arg, filter_to_game_dates, failed_batch_dates,
+)
+
+# Range used when neither dates nor a FactPlayerAdvanced watermark exist.
+DEFAULT_BACKFILL_START = date(2022, 10, 1)
+
+BASE_URL = bdl_client.BASE_URL_V1
 ADVANCED_URL = f"{BASE_URL}/stats/advanced"  # path per balldontlie docs
 
-HEADERS = {
-    "Authorization": API_KEY
-}
+# ---------- Fact insert ----------
 
-# ---------- Dim helpers ----------
+UPSERT_PLAYER_ADVANCED_SQL = """
+    INSERT INTO factplayeradvanced
+        (playerid, gameid, teamid,
+         pie, pace,
+         assistpercentage, assistratio, assisttoturnover,
+         defensiverating, defensivereboundpercentage,
+         effectivefieldgoalpercentage, netrating,
+         offensiverating, offensivereboundpercentage,
+         reboundpercentage, trueshootingpercentage,
+         turnoverratio, usagepercentage)
+    VALUES %s
+    ON CONFLICT (playerid, gameid) DO UPDATE
+    SET teamid                       = EXCLUDED.teamid,
+        pie                          = EXCLUDED.pie,
+        pace                         = EXCLUDED.pace,
+        assistpercentage             = EXCLUDED.assistpercentage,
+        assistratio                  = EXCLUDED.assistratio,
+        assisttoturnover             = EXCLUDED.assisttoturnover,
+        defensiverating              = EXCLUDED.defensiverating,
+        defensivereboundpercentage   = EXCLUDED.defensivereboundpercentage,
+        effectivefieldgoalpercentage = EXCLUDED.effectivefieldgoalpercentage,
+        netrating                    = EXCLUDED.netrating,
+        offensiverating              = EXCLUDED.offensiverating,
+        offensivereboundpercentage   = EXCLUDED.offensivereboundpercentage,
+        reboundpercentage            = EXCLUDED.reboundpercentage,
+        trueshootingpercentage       = EXCLUDED.trueshootingpercentage,
+        turnoverratio                = EXCLUDED.turnoverratio,
+        usagepercentage              = EXCLUDED.usagepercentage;
+"""
+
+
+def player_advanced_row(adv: dict):
+    """FactPlayerAdvanced column values for an advanced_stats entry."""
+    return (
+        adv["player"]["id"],
+        adv["game"]["id"],
+        # prefer team.id from top-level team object
+        adv["team"]["id"],
+        adv.get("pie"),
+        adv.get("pace"),
+        adv.get("assist_percentage"),
+        adv.get("assist_ratio"),
+        adv.get("assist_to_turnover"),
+        adv.get("defensive_rating"),
+        adv.get("defensive_rebound_percentage"),
+        adv.get("effective_field_goal_percentage"),
+        adv.get("net_rating"),
+        adv.get("offensive_rating"),
+        adv.get("offensive_rebound_percentage"),
+        adv.get("rebound_percentage"),
+        adv.get("true_shooting_percentage"),
+        adv.get("turnover_ratio"),
+        adv.get("usage_percentage"),
+    )
 
-def ensure_calendar(conn, game_dt: date, season: int, postseason: bool):
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dimcalendar (date, year, month, day, week, dayofweek, season, isplayoffs)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (date) DO NOTHING;
-    """, (
-        game_dt,
-        game_dt.year,
-        game_dt.month,
-        game_dt.day,
-        game_dt.isocalendar()[1],
-        game_dt.isoweekday(),
-        str(season),
-        postseason,
-    ))
-    conn.commit()
-    cur.close()
-
-
-def ensure_team(conn, team_obj: dict):
-    team_id = team_obj["id"]
-    full_name = team_obj.get("full_name") or team_obj.get("name") or f"Team {team_id}"
-    shortname = team_obj.get("name") or ""
-    abbr = team_obj.get("abbreviation") or ""
-    conference = team_obj.get("conference") or ""
-    division = team_obj.get("division") or ""
-    city = team_obj.get("city") or ""
 
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dimteams
-            (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
-        VALUES
-            (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (teamid) DO UPDATE
-        SET teamname    = EXCLUDED.teamname,
-            abbreviation= EXCLUDED.abbreviation,
-            conference  = EXCLUDED.conference,
-            division    = EXCLUDED.division,
-            city        = EXCLUDED.city,
-            shortname   = EXCLUDED.shortname;
-    """, (
-        team_id,
-        full_name,
-        abbr,
-        conference,
-        division,
-        "",
-        city,
-        shortname,
-    ))
-    conn.commit()
-    cur.close()
-
-
-def ensure_game(conn, game_obj: dict):
+def write_advanced_batch(conn, rows: list):
     """
-    Ensure DimGames + DimCalendar rows exist for this game, then return (game_id, game_date).
-    advanced_stats.game has a simpler shape.
+    Upsert a batch of advanced_stats entries (dimensions + FactPlayerAdvanced)
+    in ONE transaction: one statement per dimension table and one
+    execute_values for the facts, de-duplicated by (playerid, gameid).
     """
-    game_id = game_obj["id"]
-    # date is "YYYY-MM-DD"
-    game_dt = datetime.strptime(game_obj["date"], "%Y-%m-%d").date()
-    season = game_obj.get("season")
-    postseason = game_obj.get("postseason", False)
+    if not rows:
+        return
 
-    ensure_calendar(conn, game_dt, season, postseason)
-
-    home_id = game_obj["home_team_id"]
-    away_id = game_obj["visitor_team_id"]
-
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dimgames
-            (gameid, date, hometeamid, awayteamid, season, gamenumber,
-             home_score, visitor_score, status, period)
-        VALUES
-            (%s,%s,%s,%s,%s,%s,
-             %s,%s,%s,%s)
-        ON CONFLICT (gameid) DO UPDATE
-        SET date          = EXCLUDED.date,
-            hometeamid    = EXCLUDED.hometeamid,
-            awayteamid    = EXCLUDED.awayteamid,
-            season        = EXCLUDED.season,
-            home_score    = COALESCE(EXCLUDED.home_score, dimgames.home_score),
-            visitor_score = COALESCE(EXCLUDED.visitor_score, dimgames.visitor_score),
-            status        = COALESCE(EXCLUDED.status, dimgames.status),
-            period        = COALESCE(EXCLUDED.period, dimgames.period);
-    """, (
-        game_id,
-        game_dt,
-        home_id,
-        away_id,
-        str(season),
-        None,
-        game_obj.get("home_team_score"),
-        game_obj.get("visitor_team_score"),
-        game_obj.get("status"),
-        game_obj.get("period"),
-    ))
-    conn.commit()
-    cur.close()
-
-    return game_id, game_dt
-
-
-def ensure_player(conn, player_obj: dict):
-    """
-    Minimal ensure for DimPlayers; most enrichment is already done via players_ingest.
-    advanced_stats.player includes a team_id.
-    """
-    player_id = player_obj["id"]
-    first = player_obj.get("first_name") or ""
-    last = player_obj.get("last_name") or ""
-    name = f"{first} {last}".strip()
-    position = player_obj.get("position") or ""
-    height = player_obj.get("height")
-    weight = player_obj.get("weight")
-    jersey_number = player_obj.get("jersey_number")
-    college = player_obj.get("college")
-    country = player_obj.get("country")
-    draft_round = player_obj.get("draft_round")
-    draft_number = player_obj.get("draft_number")
-    draft_year = player_obj.get("draft_year")
-    team_id = player_obj.get("team_id")
-
-    def parse_height(height_str: str):
-        if not height_str:
-            return None
-        try:
-            parts = height_str.split("-")
-            feet = int(parts[0])
-            inches = int(parts[1]) if len(parts) > 1 else 0
-            return feet * 12 + inches
-        except Exception:
-            return None
-
-    def to_int_or_none(v):
-        try:
-            return int(v) if v is not None else None
-        except Exception:
-            return None
-
-    height_in = parse_height(height)
-    weight_lb = to_int_or_none(weight)
-    draft_round = to_int_or_none(draft_round)
-    draft_number = to_int_or_none(draft_number)
-    draft_year = to_int_or_none(draft_year)
+    fact_rows = {}
+    for adv in rows:
+        row = player_advanced_row(adv)
+        fact_rows[(row[0], row[1])] = row
 
+    ingest_state.ensure_state_tables(conn)
     cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dimplayers
-            (playerid, playername, teamid, position,
-             height, weight, birthdate, yearsexperience, activeflag,
-             country, college, draft_round, draft_number, draft_year, jersey_number)
-        VALUES
-            (%s,%s,%s,%s,
-             %s,%s,%s,%s,%s,
-             %s,%s,%s,%s,%s,%s)
-        ON CONFLICT (playerid) DO UPDATE
-        SET playername     = EXCLUDED.playername,
-            teamid         = COALESCE(EXCLUDED.teamid, dimplayers.teamid),
-            position       = EXCLUDED.position,
-            height         = COALESCE(EXCLUDED.height, dimplayers.height),
-            weight         = COALESCE(EXCLUDED.weight, dimplayers.weight),
-            country        = COALESCE(EXCLUDED.country, dimplayers.country),
-            college        = COALESCE(EXCLUDED.college, dimplayers.college),
-            draft_round    = COALESCE(EXCLUDED.draft_round, dimplayers.draft_round),
-            draft_number   = COALESCE(EXCLUDED.draft_number, dimplayers.draft_number),
-            draft_year     = COALESCE(EXCLUDED.draft_year, dimplayers.draft_year),
-            jersey_number  = COALESCE(EXCLUDED.jersey_number, dimplayers.jersey_number),
-            activeflag     = COALESCE(dimplayers.activeflag, TRUE);
-    """, (
-        player_id,
-        name,
-        team_id,
-        position,
-        height_in,
-        weight_lb,
-        None,
-        None,
-        True,
-        country,
-        college,
-        draft_round,
-        draft_number,
-        draft_year,
-        jersey_number,
-    ))
-    conn.commit()
-    cur.close()
-
-    return player_id, team_id
-
-
-# ---------- Fact insert ----------
-
-def upsert_player_advanced(conn, adv: dict):
-    """
-    Insert/update one row in FactPlayerAdvanced from an advanced_stats entry.
-    """
-    player_obj = adv["player"]
-    team_obj   = adv["team"]
-    game_obj   = adv["game"]
-
-    # ensure dims
-    ensure_team(conn, team_obj)
-    game_id, game_dt = ensure_game(conn, game_obj)
-    player_id, team_id_from_player = ensure_player(conn, player_obj)
-
-    # prefer team.id from top-level team object
-    team_id = team_obj["id"]
-
-    # advanced metrics
-    pie   = adv.get("pie")
-    pace  = adv.get("pace")
-    ap    = adv.get("assist_percentage")
-    ar    = adv.get("assist_ratio")
-    a2t   = adv.get("assist_to_turnover")
-    drtg  = adv.get("defensive_rating")
-    drebp = adv.get("defensive_rebound_percentage")
-    efg   = adv.get("effective_field_goal_percentage")
-    nrtg  = adv.get("net_rating")
-    ortg  = adv.get("offensive_rating")
-    orebp = adv.get("offensive_rebound_percentage")
-    rebp  = adv.get("rebound_percentage")
-    tsp   = adv.get("true_shooting_percentage")
-    tor   = adv.get("turnover_ratio")
-    usg   = adv.get("usage_percentage")
-
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO factplayeradvanced
-            (playerid, gameid, teamid,
-             pie, pace,
-             assistpercentage, assistratio, assisttoturnover,
-             defensiverating, defensivereboundpercentage,
-             effectivefieldgoalpercentage, netrating,
-             offensiverating, offensivereboundpercentage,
-             reboundpercentage, trueshootingpercentage,
-             turnoverratio, usagepercentage)
-        VALUES
-            (%s,%s,%s,
-             %s,%s,
-             %s,%s,%s,
-             %s,%s,
-             %s,%s,
-             %s,%s,
-             %s,%s,
-             %s,%s)
-        ON CONFLICT (playerid, gameid) DO UPDATE
-        SET teamid                       = EXCLUDED.teamid,
-            pie                          = EXCLUDED.pie,
-            pace                         = EXCLUDED.pace,
-            assistpercentage             = EXCLUDED.assistpercentage,
-            assistratio                  = EXCLUDED.assistratio,
-            assisttoturnover             = EXCLUDED.assisttoturnover,
-            defensiverating              = EXCLUDED.defensiverating,
-            defensivereboundpercentage   = EXCLUDED.defensivereboundpercentage,
-            effectivefieldgoalpercentage = EXCLUDED.effectivefieldgoalpercentage,
-            netrating                    = EXCLUDED.netrating,
-            offensiverating              = EXCLUDED.offensiverating,
-            offensivereboundpercentage   = EXCLUDED.offensivereboundpercentage,
-            reboundpercentage            = EXCLUDED.reboundpercentage,
-            trueshootingpercentage       = EXCLUDED.trueshootingpercentage,
-            turnoverratio                = EXCLUDED.turnoverratio,
-            usagepercentage              = EXCLUDED.usagepercentage;
-    """, (
-        player_id, game_id, team_id,
-        pie, pace,
-        ap, ar, a2t,
-        drtg, drebp,
-        efg, nrtg,
-        ortg, orebp,
-        rebp, tsp,
-        tor, usg,
-    ))
-    conn.commit()
-    cur.close()
+    try:
+        pending = dimensions.upsert_teams(conn, [adv["team"] for adv in rows], commit=False)
+        # the embedded games can carry newer scores: queue those for FactTeamGame
+        before = ingest_state.game_results(cur, [adv["game"]["id"] for adv in rows])
+        pending += dimensions.upsert_games(conn, [adv["game"] for adv in rows], commit=False)
+        ingest_state.mark_changed_games_dirty(cur, before)
+        pending += dimensions.upsert_players(conn, [adv["player"] for adv in rows], commit=False)
+        execute_values(cur, UPSERT_PLAYER_ADVANCED_SQL,
+                       [fact_rows[k] for k in sorted(fact_rows)], page_size=1000)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    dimensions.get_cache(conn).remember_all(pending)
 
 
 # ---------- Fetch from API ----------
 
 def fetch_advanced_for_date(target_date_str: str):
-    """
-    Fetch all advanced stats for a given date using cursor-based pagination.
-    """
-    per_page = 100
-    cursor_val = None
-    page_idx = 1
-    all_rows = []
-
-    while True:
-        params = {
-            "per_page": per_page,
-            "dates[]": target_date_str
-        }
-        if cursor_val is not None:
-            params["cursor"] = cursor_val
-
-        print(f"Calling {ADVANCED_URL} with params={params}")
-        resp = requests.get(ADVANCED_URL, headers=HEADERS, params=params, timeout=30)
-        print("Status:", resp.status_code)
-        if resp.status_code != 200:
-            print("Body:", resp.text[:300])
-            resp.raise_for_status()
-
-        data = resp.json()
-        batch = data.get("data", [])
-        meta = data.get("meta", {}) or {}
-
-        print(f"Fetched {len(batch)} advanced rows on cursor-page {page_idx}. Meta: {meta}")
+    """Fetch all advanced stats for a single date (see fetch_advanced_for_dates)."""
+    return fetch_advanced_for_dates([target_date_str])
 
-        if not batch:
-            print("No advanced stats on this cursor page. Stopping pagination for this date.")
-            break
 
-        all_rows.extend(batch)
+def advanced_pages(date_strs: list):
+    """Yield pages of advanced stats for one or more dates from a single dates[] query."""
+    return bdl_client.paginate(ADVANCED_URL, dates_params(date_strs))
 
-        cursor_val = meta.get("next_cursor")
-        if not cursor_val:
-            print("No next_cursor for advanced stats. Reached end for this date.")
-            break
 
-        page_idx += 1
-
-    return all_rows
+def fetch_advanced_for_dates(date_strs: list):
+    """Fetch all advanced stats for one or more dates as one list (see advanced_pages)."""
+    return bdl_client.collect(advanced_pages(date_strs))
 
 
 # ---------- Date range helper ----------
@@ -348,8 +133,12 @@ def fetch_advanced_for_date(target_date_str: str):
 def get_date_range_from_args():
     """
     Parse --start-date / --end-date.
-    If none provided, default to your current backfill window:
-    2022-10-01 to 2025-12-05.
+    If none provided, return (None, None): main resumes from the
+    FactPlayerAdvanced watermark, or backfills from DEFAULT_BACKFILL_START
+    through yesterday on the first run.
+
+    Returns (start_date, end_date, args) so callers can read the other
+    options (e.g. --concurrency).
     """
     parser = argparse.ArgumentParser(
         description="Ingest advanced NBA stats into FactPlayerAdvanced"
@@ -364,51 +153,91 @@ def get_date_range_from_args():
         type=str,
         help="End date (YYYY-MM-DD).",
     )
+    fetch_engine.add_fetch_args(parser)
+    add_schedule_arg(parser)
     args = parser.parse_args()
 
     if args.start_date and args.end_date:
         s = datetime.strptime(args.start_date, "%Y-%m-%d").date()
         e = datetime.strptime(args.end_date, "%Y-%m-%d").date()
-        return s, e
+        return s, e, args
     elif args.start_date and not args.end_date:
         d = datetime.strptime(args.start_date, "%Y-%m-%d").date()
-        return d, d
+        return d, d, args
     elif not args.start_date and args.end_date:
         d = datetime.strptime(args.end_date, "%Y-%m-%d").date()
-        return d, d
+        return d, d, args
     else:
-        # default backfill window (matches your earlier config)
-        s = datetime.strptime("2022-10-01", "%Y-%m-%d").date()
-        e = datetime.strptime("2025-12-05", "%Y-%m-%d").date()
-        return s, e
+        # Default: resume from watermark (resolved in main once we have a connection)
+        return None, None, args
 
 
 # ---------- Main driver ----------
 
-def main():
-    start_date, end_date = get_date_range_from_args()
+def advanced_batch_done(date_batch: list, total: int):
+    print(f"Finished inserting advanced stats for {date_batch[0]}..{date_batch[-1]}: {total} rows.")
+
+
+def run_advanced_range(conn, start_date, end_date,
+                       concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+                       batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+                       all_dates: bool = False):
+    """
+    Load FactPlayerAdvanced for start_date..end_date (inclusive) without
+    touching the watermark. Only dates with games on the schedule are
+    queried (unless all_dates). Returns the dates that failed.
+    """
     print(f"Advanced stats ingest from {start_date} to {end_date}")
 
-    conn = get_connection()
+    dates = date_strings(start_date, end_date)
+    if not all_dates:
+        dates = filter_to_game_dates(conn, dates)
+
+    # pages stream from the fetchers straight into write_advanced_batch; each
+    # batch resumes from its pagination checkpoint if an earlier run failed
+    pages = ingest_state.ResumablePages(conn, ADVANCED_URL, dates_params)
+    failed = pipeline.run(
+        chunk_dates(dates, batch_days),
+        pages.pages,
+        lambda batch, rows: write_advanced_batch(conn, rows),
+        done_fn=advanced_batch_done,
+        checkpoint_fn=pages.checkpoint,
+        concurrency=concurrency,
+        label="advanced stats",
+    )
+    return failed_batch_dates(failed)
 
-    current = start_date
-    while current <= end_date:
-        target_str = current.strftime("%Y-%m-%d")
-        print(f"\n===== Loading advanced stats for {target_str} =====")
-        try:
-            rows = fetch_advanced_for_date(target_str)
-            print(f"Got {len(rows)} advanced stat rows for {target_str}.")
 
-            for adv in rows:
-                upsert_player_advanced(conn, adv)
+def run(conn, start_date: date | None = None, end_date: date | None = None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+        batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+        all_dates: bool = False):
+    """
+    run_advanced_range plus the FactPlayerAdvanced watermark: with no dates,
+    resume from the watermark (DEFAULT_BACKFILL_START on the first run).
+    Returns the failed dates.
+    """
+    if start_date is None:
+        start_date, end_date = ingest_state.resume_range(
+            conn, "factplayeradvanced",
+            DEFAULT_BACKFILL_START, date.today() - timedelta(days=1),
+        )
+
+    failed_dates = run_advanced_range(conn, start_date, end_date,
+                                      concurrency=concurrency, batch_days=batch_days,
+                                      all_dates=all_dates)
+    ingest_state.advance_watermark(conn, "factplayeradvanced", start_date, end_date, failed_dates)
+    return failed_dates
 
-            print(f"Finished inserting advanced stats for {target_str}.")
-        except Exception as e:
-            print(f"Error while processing advanced stats for {target_str}: {e}")
 
-        current += timedelta(days=1)
+def main():
+    start_date, end_date, args = get_date_range_from_args()
 
+    conn = get_connection()
+    run(conn, start_date, end_date, concurrency=args.concurrency,
+        batch_days=args.batch_days, all_dates=args.all_dates)
     conn.close()
+    bdl_client.stats.print_summary()
     print("\nAll advanced stats loaded into FactPlayerAdvanced for the selected range.")
 
 
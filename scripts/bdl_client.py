@@ -0,0 +1,305 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import landing
+import rate_limiter
+
+# Shared balldontlie HTTP client.
+# Every ingest script goes through get() so all calls in one process reuse
+# the same keep-alive connection pool instead of paying a fresh TCP+TLS
+# handshake per page.
+
+API_KEY = os.getenv("BDL_API_KEY", "3b13604b-63be-47ce-a594-bca471752359")
+BASE_URL_V1 = os.getenv("BDL_BASE_URL_V1", "https://api.balldontlie.io/v1")
+BASE_URL_V2 = os.getenv("BDL_BASE_URL_V2", "https://api.balldontlie.io/v2")
+
+HEADERS = {
+    "Authorization": API_KEY
+}
+
+# Number of keep-alive connections kept open per host.
+POOL_SIZE = int(os.getenv("BDL_POOL_SIZE", "10"))
+
+CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# Retry policy for 429 / 5xx / connection errors.
+MAX_RETRIES = int(os.getenv("BDL_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Most rows collect() will hold in memory. paginate() / iter_rows() only
+# ever hold one page, and pipeline.py bounds its page queue, so this only
+# limits the callers that need a whole result as one list.
+MAX_COLLECT_ROWS = int(os.getenv("BDL_MAX_COLLECT_ROWS", "50000"))
+
+# Read timeouts (seconds) per endpoint path, relative to the v1/v2 base URL.
+ENDPOINT_TIMEOUTS = {
+    "players": 20,
+    "teams": 20,
+    "player_injuries": 20,
+    "games": 30,
+    "stats": 30,
+    "stats/advanced": 30,
+    "standings": 30,
+    "contracts/teams": 30,
+    "contracts/players/aggregate": 30,
+    "odds": 30,
+    "odds/player_props": 30,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# ------------- Session -----------------
+
+
+def get_session():
+    """
+    Return the process-wide requests.Session, creating it on first use.
+    The session mounts an HTTPAdapter sized by BDL_POOL_SIZE so concurrent
+    fetchers share warm connections.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+def close_session():
+    """Close the shared session (mainly for long-running orchestrators)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def endpoint_for(url: str) -> str:
+    """Map a full URL to its endpoint key, e.g. '.../v2/odds/player_props' -> 'odds/player_props'."""
+    for base in (BASE_URL_V1, BASE_URL_V2):
+        if url.startswith(base):
+            return url[len(base):].strip("/")
+    return url
+
+
+# ------------- Counters -----------------
+
+
+class ClientStats:
+    """Thread-safe counters for requests, bytes and latency, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.by_endpoint = {}
+
+    def record(self, endpoint: str, status: int, num_bytes: int, latency: float):
+        with self._lock:
+            s = self.by_endpoint.setdefault(endpoint, {
+                "requests": 0,
+                "errors": 0,
+                "bytes": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+            })
+            s["requests"] += 1
+            if status >= 400:
+                s["errors"] += 1
+            s["bytes"] += num_bytes
+            s["latency_total"] += latency
+            s["latency_max"] = max(s["latency_max"], latency)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self.by_endpoint.items()}
+
+    def print_summary(self):
+        snap = self.snapshot()
+        if not snap:
+            return
+        print("\n----- balldontlie client stats -----")
+        for endpoint, s in sorted(snap.items()):
+            avg_ms = 1000.0 * s["latency_total"] / s["requests"] if s["requests"] else 0.0
+            print(
+                f"{endpoint}: {s['requests']} requests, {s['errors']} errors, "
+                f"{s['bytes'] / 1024:.1f} KiB, avg {avg_ms:.0f} ms, "
+                f"max {1000.0 * s['latency_max']:.0f} ms"
+            )
+
+
+stats = ClientStats()
+
+
+# ------------- Requests -----------------
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for the given (0-based) retry attempt."""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def retry_after_seconds(resp):
+    """Parse a Retry-After header (delta-seconds or HTTP-date). Returns None if absent."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get(url: str, params=None, timeout=None):
+    """
+    GET a balldontlie URL on the shared session and return the Response.
+
+    Each attempt first takes a token from the shared cross-process rate
+    limiter. 429s back off for Retry-After (shared with every other process
+    using this key); 5xx and connection errors retry with jittered
+    exponential backoff, up to MAX_RETRIES. After that the last response is
+    returned (or the last exception raised) so callers keep their own
+    status-code handling (404 checks, raise_for_status, ...).
+
+    The read timeout defaults to ENDPOINT_TIMEOUTS for the endpoint.
+    Successful pages are also kept in the raw landing zone (landing.py).
+    """
+    endpoint = endpoint_for(url)
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_READ_TIMEOUT))
+
+    bucket = rate_limiter.get_bucket(API_KEY)
+    attempt = 0
+    while True:
+        bucket.acquire()
+        started = time.perf_counter()
+        try:
+            resp = get_session().get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            stats.record(endpoint, 599, 0, time.perf_counter() - started)
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request to {endpoint} failed ({e.__class__.__name__}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        stats.record(endpoint, resp.status_code, len(resp.content), time.perf_counter() - started)
+
+        if resp.status_code == 200:
+            landing.record(endpoint, params, resp.text)
+        if resp.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            return resp
+
+        if resp.status_code == 429:
+            wait = retry_after_seconds(resp)
+            if wait is None:
+                wait = backoff_delay(attempt)
+            else:
+                wait += random.uniform(0, 1.0)
+            print(f"Rate limited (429) on {endpoint}; backing off {wait:.1f}s")
+            bucket.block_for(wait)
+        else:
+            delay = backoff_delay(attempt)
+            print(f"Server error {resp.status_code} on {endpoint}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+        attempt += 1
+
+
+# ------------- Pagination -----------------
+
+
+class Page(list):
+    """One page of `data` rows, plus the meta.next_cursor that follows it (None on the last page)."""
+
+    def __init__(self, rows, next_cursor=None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+
+def paginate(url: str, params=None, per_page: int = 100, allow_404: bool = False, cursor=None):
+    """
+    Walk a cursor-paginated endpoint and yield each page's `data` rows (a
+    Page) as soon as it arrives. Stops on an empty page or when
+    meta.next_cursor runs out. With allow_404, a 404 means "no data" (e.g.
+    no props for a game) instead of an error. `cursor` starts the walk
+    part-way through (see ingest_state.ResumablePages).
+    """
+    params = dict(params or {})
+    params["per_page"] = per_page
+    if cursor:
+        params["cursor"] = cursor
+    endpoint = endpoint_for(url)
+    page_num = 1
+
+    while True:
+        print(f"Calling {url} with params={params}")
+        resp = get(url, params=params)
+        if resp.status_code == 404 and allow_404:
+            print(f"No {endpoint} data for these params (404).")
+            return
+        if resp.status_code != 200:
+            print("Status:", resp.status_code)
+            print("Body:", resp.text[:300])
+            resp.raise_for_status()
+
+        data = resp.json()
+        rows = data.get("data", [])
+        meta = data.get("meta", {}) or {}
+        print(f"Fetched {len(rows)} {endpoint} rows on cursor-page {page_num}. Meta: {meta}")
+
+        if not rows:
+            return
+        cursor = meta.get("next_cursor")
+        yield Page(rows, cursor)
+
+        if not cursor:
+            return
+        params["cursor"] = cursor
+        page_num += 1
+
+
+def iter_rows(url: str, params=None, per_page: int = 100, allow_404: bool = False):
+    """paginate(), one row at a time."""
+    for rows in paginate(url, params, per_page=per_page, allow_404=allow_404):
+        yield from rows
+
+
+def collect(pages, max_rows: int = MAX_COLLECT_ROWS):
+    """
+    Gather an iterator of pages (e.g. paginate(...)) into one list of rows.
+    Raises RuntimeError instead of holding more than max_rows; stream the
+    pages (pipeline.py) for anything that big.
+    """
+    rows = []
+    for page in pages:
+        if len(rows) + len(page) > max_rows:
+            if hasattr(pages, "close"):
+                pages.close()
+            raise RuntimeError(f"More than {max_rows} rows to collect (BDL_MAX_COLLECT_ROWS); "
+                               "stream the pages instead.")
+        rows.extend(page)
+    return rows
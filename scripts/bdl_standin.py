@@ -0,0 +1,571 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import landing
+
+# Local stand-in for the balldontlie API, for offline benchmarks and tests.
+#
+# Serves the v1 and v2 endpoints the ingests use, from a deterministic
+# synthetic league (same seed, same data) or from the pages recorded in the
+# landing zone (--recorded, see landing.py), with the API's cursor
+# pagination (per_page up to 100, meta.next_cursor), optional latency and
+# injected 429 / 5xx errors. Point the ingest scripts at it with:
+#
+#   python bdl_standin.py --start-date 2024-01-01 --end-date 2024-01-31 \
+#       --latency-ms 80 --error-rate-429 0.02 --error-rate-5xx 0.01
+#   BDL_BASE_URL_V1=http://127.0.0.1:8099/v1 \
+#   BDL_BASE_URL_V2=http://127.0.0.1:8099/v2 \
+#   NBA_LANDING=off python player_logs_ingest_real.py --start-date 2024-01-01 --end-date 2024-01-31
+#
+# The scripts' rate limiter still applies; raise BDL_RATE_PER_MINUTE to
+# benchmark the ingest itself rather than the API quota.
+
+DEFAULT_PORT = 8099
+MAX_PER_PAGE = 100
+DEFAULT_PER_PAGE = 25
+
+ODDS_VENDORS = ["draftkings", "fanduel", "betmgm"]
+PROP_TYPES = ["points", "rebounds", "assists"]
+
+_CONFERENCES = [("East", ["Atlantic", "Central", "Southeast"]), ("West", ["Northwest", "Pacific", "Southwest"])]
+_POSITIONS = ["G", "G", "F", "F", "C", "G-F", "F-C"]
+
+
+def season_for(day: date) -> int:
+    """NBA season (its starting year) a date falls in; seasons start Oct 1."""
+    return day.year if day.month >= 10 else day.year - 1
+
+
+# ------------- Synthetic league -----------------
+
+
+class Dataset:
+    """
+    Rows per endpoint ({endpoint: [row, ...]}, sorted by id) plus the game
+    date of every game id, used to filter odds by dates[].
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.game_dates = {}
+
+    def add(self, endpoint: str, rows):
+        self.rows.setdefault(endpoint, []).extend(rows)
+
+    def finish(self):
+        for endpoint, rows in self.rows.items():
+            rows.sort(key=lambda r: r.get("id", 0))
+        return self
+
+
+def synthetic_dataset(start_date: date, end_date: date, games_per_day: int = 8,
+                      players_per_team: int = 12, seed: int = 42):
+    """Generate a league: 30 teams, their players, and every game between start_date and end_date."""
+    rng = random.Random(seed)
+    data = Dataset()
+
+    teams = []
+    for i in range(30):
+        conference, divisions = _CONFERENCES[i // 15]
+        teams.append({
+            "id": i + 1,
+            "conference": conference,
+            "division": divisions[(i % 15) // 5],
+            "city": f"City{i + 1}",
+            "name": f"Team{i + 1}",
+            "full_name": f"City{i + 1} Team{i + 1}",
+            "abbreviation": f"T{i + 1:02d}",
+        })
+    data.add("teams", teams)
+
+    players = {}
+    for team in teams:
+        roster = []
+        for k in range(players_per_team):
+            player = {
+                "id": team["id"] * 1000 + k + 1,
+                "first_name": f"First{team['id']}x{k + 1}",
+                "last_name": f"Last{team['id']}x{k + 1}",
+                "position": rng.choice(_POSITIONS),
+                "height": f"6-{rng.randint(0, 11)}",
+                "weight": str(rng.randint(180, 260)),
+                "jersey_number": str(rng.randint(0, 99)),
+                "college": f"College{rng.randint(1, 60)}",
+                "country": "USA",
+                "draft_year": rng.randint(2010, 2023),
+                "draft_round": rng.randint(1, 2),
+                "draft_number": rng.randint(1, 30),
+                "team_id": team["id"],
+            }
+            roster.append(player)
+        players[team["id"]] = roster
+    data.add("players", [dict(p, team=teams[p["team_id"] - 1]) for roster in players.values() for p in roster])
+
+    seasons = set()
+    today = date.today()
+    day = start_date
+    while day <= end_date:
+        seasons.add(season_for(day))
+        day_rng = random.Random(f"{seed}-{day}")
+        matchups = day_rng.sample(range(1, 31), min(games_per_day * 2, 30))
+        for n in range(len(matchups) // 2):
+            home, visitor = teams[matchups[2 * n] - 1], teams[matchups[2 * n + 1] - 1]
+            game_id = int(day.strftime("%Y%m%d")) * 100 + n + 1
+            _add_game(data, day_rng, day, today, game_id, home, visitor, players)
+        day += timedelta(days=1)
+
+    _add_season_rows(data, rng, sorted(seasons), teams, players)
+    return data.finish()
+
+
+def _add_game(data, rng, day, today, game_id, home, visitor, players):
+    final = day < today
+    season = season_for(day)
+    tipoff = datetime(day.year, day.month, day.day, 0, 0) + timedelta(hours=rng.choice([0, 0, 1, 2, 3]))
+
+    stats = []
+    scores = {}
+    for team in (home, visitor):
+        for player in players[team["id"]][:10] if final else []:
+            fga, fg3a, fta = rng.randint(2, 22), rng.randint(0, 10), rng.randint(0, 10)
+            fgm, fg3m, ftm = rng.randint(0, fga), rng.randint(0, fg3a), rng.randint(0, fta)
+            fg3m = min(fg3m, fgm)
+            oreb, dreb = rng.randint(0, 4), rng.randint(0, 9)
+            pts = 2 * (fgm - fg3m) + 3 * fg3m + ftm
+            scores[team["id"]] = scores.get(team["id"], 0) + pts
+            stats.append({
+                "id": game_id * 100 + len(stats) + 1,
+                "min": f"{rng.randint(8, 40)}:{rng.randint(0, 59):02d}",
+                "fgm": fgm, "fga": fga, "fg_pct": round(fgm / fga, 3),
+                "fg3m": fg3m, "fg3a": fg3a, "fg3_pct": round(fg3m / fg3a, 3) if fg3a else 0.0,
+                "ftm": ftm, "fta": fta, "ft_pct": round(ftm / fta, 3) if fta else 0.0,
+                "oreb": oreb, "dreb": dreb, "reb": oreb + dreb,
+                "ast": rng.randint(0, 12), "stl": rng.randint(0, 4), "blk": rng.randint(0, 4),
+                "turnover": rng.randint(0, 6), "pf": rng.randint(0, 6), "pts": pts,
+                "player": player, "team": team,
+            })
+
+    game = {
+        "id": game_id,
+        "date": day.isoformat(),
+        "season": season,
+        "status": "Final" if final else tipoff.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "period": 4 if final else 0,
+        "time": "Final" if final else "",
+        "postseason": False,
+        "datetime": tipoff.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "home_team_score": scores.get(home["id"], 0),
+        "visitor_team_score": scores.get(visitor["id"], 0),
+        "home_team_id": home["id"],
+        "visitor_team_id": visitor["id"],
+    }
+    for stat in stats:
+        stat["game"] = game
+    data.add("games", [dict(game, home_team=home, visitor_team=visitor)])
+    data.add("stats", stats)
+    data.game_dates[game_id] = day.isoformat()
+
+    data.add("stats/advanced", [{
+        "id": s["id"],
+        "player": s["player"], "team": s["team"], "game": game,
+        "pie": round(rng.uniform(-0.05, 0.25), 3),
+        "pace": round(rng.uniform(94, 104), 1),
+        "assist_percentage": round(rng.uniform(0, 0.4), 3),
+        "assist_ratio": round(rng.uniform(0, 40), 1),
+        "assist_to_turnover": round(rng.uniform(0, 5), 2),
+        "defensive_rating": round(rng.uniform(100, 125), 1),
+        "defensive_rebound_percentage": round(rng.uniform(0, 0.35), 3),
+        "effective_field_goal_percentage": round(rng.uniform(0.3, 0.7), 3),
+        "net_rating": round(rng.uniform(-20, 20), 1),
+        "offensive_rating": round(rng.uniform(100, 125), 1),
+        "offensive_rebound_percentage": round(rng.uniform(0, 0.15), 3),
+        "rebound_percentage": round(rng.uniform(0, 0.25), 3),
+        "true_shooting_percentage": round(rng.uniform(0.35, 0.75), 3),
+        "turnover_ratio": round(rng.uniform(0, 20), 1),
+        "usage_percentage": round(rng.uniform(0.1, 0.35), 3),
+    } for s in stats])
+
+    # lines posted the morning before tipoff
+    posted = (tipoff - timedelta(hours=rng.randint(6, 30))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    spread = rng.choice([0.5, 1.5, 2.5, 3.5, 4.5, 6.5, 8.5]) * rng.choice([-1, 1])
+    total = rng.choice([215.5, 221.5, 226.5, 231.5, 236.5])
+    data.add("odds", [{
+        "id": game_id * 10 + v + 1,
+        "game_id": game_id,
+        "vendor": vendor,
+        "spread_home_value": str(spread), "spread_home_odds": -110,
+        "spread_away_value": str(-spread), "spread_away_odds": -110,
+        "moneyline_home_odds": -150 if spread < 0 else 130,
+        "moneyline_away_odds": 130 if spread < 0 else -150,
+        "total_value": str(total), "total_over_odds": -110, "total_under_odds": -110,
+        "updated_at": posted,
+    } for v, vendor in enumerate(ODDS_VENDORS)])
+
+    props = []
+    for team in (home, visitor):
+        for player in players[team["id"]][:10]:
+            for prop_type in PROP_TYPES:
+                line = rng.randint(2, 28) + 0.5
+                for vendor in ODDS_VENDORS:
+                    props.append({
+                        "id": game_id * 1000 + len(props) + 1,
+                        "game_id": game_id,
+                        "player_id": player["id"],
+                        "vendor": vendor,
+                        "prop_type": prop_type,
+                        "line_value": str(line),
+                        "market": {"type": "over_under", "over_odds": rng.choice([-120, -115, -110, -105]),
+                                   "under_odds": rng.choice([-120, -115, -110, -105])},
+                        "updated_at": posted,
+                    })
+    data.add("odds/player_props", props)
+
+
+def _add_season_rows(data, rng, seasons, teams, players):
+    all_players = [p for roster in players.values() for p in roster]
+
+    data.add("player_injuries", [{
+        "id": p["id"],
+        "player": p,
+        "status": rng.choice(["Out", "Day-To-Day", "Questionable"]),
+        "return_date": rng.choice(["Nov 17", "Dec 2", "Jan 8", "Feb 1"]),
+        "description": "Synthetic injury report.",
+    } for p in rng.sample(all_players, min(40, len(all_players)))])
+
+    for season in seasons:
+        wins = {t["id"]: rng.randint(15, 65) for t in teams}
+        ranked = sorted(teams, key=lambda t: -wins[t["id"]])
+        standings = []
+        for team in teams:
+            w = wins[team["id"]]
+            same_conf = [t["id"] for t in ranked if t["conference"] == team["conference"]]
+            same_div = [t["id"] for t in ranked if t["division"] == team["division"]]
+            standings.append({
+                "id": season * 100 + team["id"],
+                "team": team,
+                "season": season,
+                "wins": w,
+                "losses": 82 - w,
+                "conference_record": f"{w * 52 // 82}-{52 - w * 52 // 82}",
+                "conference_rank": same_conf.index(team["id"]) + 1,
+                "division_record": f"{w * 16 // 82}-{16 - w * 16 // 82}",
+                "division_rank": same_div.index(team["id"]) + 1,
+                "home_record": f"{w // 2}-{41 - w // 2}",
+                "road_record": f"{w - w // 2}-{41 - (w - w // 2)}",
+            })
+        data.add("standings", standings)
+
+        contracts = []
+        for roster in players.values():
+            for k, p in enumerate(roster):
+                salary = 1_000_000 * (len(roster) - k)
+                contracts.append({
+                    "id": season * 1000000 + p["id"],
+                    "player_id": p["id"],
+                    "team_id": p["team_id"],
+                    "season": season,
+                    "rank": k + 1,
+                    "cap_hit": salary,
+                    "total_cash": salary + 50_000,
+                    "base_salary": salary,
+                    "player": p,
+                    "team": teams[p["team_id"] - 1],
+                })
+        data.add("contracts/teams", contracts)
+
+    first = seasons[0] if seasons else 2024
+    data.add("contracts/players/aggregate", [{
+        "id": p["id"],
+        "player_id": p["id"],
+        "team_id": p["team_id"],
+        "start_year": first - (p["id"] % 3),
+        "end_year": first + 1 + (p["id"] % 4),
+        "contract_years": 2 + (p["id"] % 3) + (p["id"] % 4),
+        "total_value": 10_000_000 + 1_000_000 * (p["id"] % 40),
+        "average_salary": 4_000_000 + 250_000 * (p["id"] % 40),
+        "guaranteed_at_signing": 8_000_000,
+        "total_guaranteed": 9_000_000,
+        "signed_using": "Cap Space",
+        "free_agent_year": first + 2 + (p["id"] % 4),
+        "free_agent_status": "UFA",
+        "contract_type": "Veteran",
+        "contract_status": "Active",
+        "contract_notes": ["Synthetic contract."],
+        "player": p,
+        "team": teams[p["team_id"] - 1],
+    } for p in all_players])
+
+
+def recorded_dataset():
+    """Rows from the landing zone, latest fetch of each row per endpoint (see ROW_KEYS)."""
+    data = Dataset()
+    for endpoint in FILTERS:
+        row_key = ROW_KEYS.get(endpoint, lambda r: r["id"])
+        latest = {}
+        for rec in landing.records(endpoint):
+            for row in rec["body"].get("data", []):
+                latest[row_key(row)] = row
+        data.add(endpoint, latest.values())
+    for g in data.rows.get("games", []):
+        data.game_dates[g["id"]] = g["date"][:10]
+    for s in data.rows.get("stats", []):
+        data.game_dates.setdefault(s["game"]["id"], s["game"]["date"][:10])
+    return data.finish()
+
+
+# ------------- Query filters -----------------
+
+
+def _game_date(r):
+    return r["game"]["date"][:10]
+
+
+# endpoint -> {query param: field of a row it matches}
+FILTERS = {
+    "teams": {},
+    "players": {"team_ids[]": lambda r: r.get("team_id")},
+    "games": {
+        "seasons[]": lambda r: r["season"],
+        "team_ids[]": lambda r: (r["home_team"]["id"], r["visitor_team"]["id"]),
+    },
+    "stats": {
+        "game_ids[]": lambda r: r["game"]["id"],
+        "player_ids[]": lambda r: r["player"]["id"],
+    },
+    "stats/advanced": {
+        "game_ids[]": lambda r: r["game"]["id"],
+        "player_ids[]": lambda r: r["player"]["id"],
+    },
+    "player_injuries": {"team_ids[]": lambda r: r["player"].get("team_id")},
+    "standings": {"season": lambda r: r["season"]},
+    "contracts/teams": {"team_id": lambda r: r["team_id"], "season": lambda r: r["season"]},
+    "contracts/players/aggregate": {"player_id": lambda r: r["player_id"]},
+    "odds": {"game_ids[]": lambda r: r["game_id"]},
+    "odds/player_props": {
+        "game_id": lambda r: r["game_id"],
+        "player_id": lambda r: r["player_id"],
+        "prop_type": lambda r: r["prop_type"],
+        "vendors[]": lambda r: r["vendor"],
+    },
+}
+
+# endpoint -> natural key of a row, for endpoints whose rows may come without
+# an id (the rest are keyed by id)
+ROW_KEYS = {
+    "player_injuries": lambda r: r["player"]["id"],
+    "standings": lambda r: (r["season"], r["team"]["id"]),
+    "contracts/teams": lambda r: (r["player_id"], r["team_id"], r["season"]),
+    "contracts/players/aggregate": lambda r: (r["player_id"], r.get("start_year")),
+}
+
+# endpoint -> date of a row, for dates[] / start_date / end_date
+DATE_FIELDS = {
+    "games": lambda data, r: r["date"][:10],
+    "stats": lambda data, r: _game_date(r),
+    "stats/advanced": lambda data, r: _game_date(r),
+    "odds": lambda data, r: data.game_dates.get(r["game_id"]),
+}
+
+# endpoints the real API refuses without these params
+REQUIRED = {
+    "standings": ["season"],
+    "odds/player_props": ["game_id"],
+}
+
+
+def select_rows(data: Dataset, endpoint: str, query: dict):
+    """Rows of `endpoint` matching the query's filters, in id order."""
+    rows = data.rows.get(endpoint, [])
+    filters = FILTERS.get(endpoint, {})
+    date_fn = DATE_FIELDS.get(endpoint)
+
+    for param, field in filters.items():
+        if param not in query:
+            continue
+        wanted = set(query[param])
+        rows = [r for r in rows if _matches(field(r), wanted)]
+
+    if date_fn is not None:
+        if "dates[]" in query:
+            wanted = set(query["dates[]"])
+            rows = [r for r in rows if date_fn(data, r) in wanted]
+        if "start_date" in query:
+            rows = [r for r in rows if (date_fn(data, r) or "") >= query["start_date"][0]]
+        if "end_date" in query:
+            rows = [r for r in rows if (date_fn(data, r) or "9999") <= query["end_date"][0]]
+    return rows
+
+
+def _matches(value, wanted: set):
+    values = value if isinstance(value, tuple) else (value,)
+    return any(str(v) in wanted for v in values)
+
+
+# ------------- Server -----------------
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, data: Dataset, latency_ms: float = 0, jitter: float = 0.5,
+                 error_rate_429: float = 0, error_rate_5xx: float = 0, retry_after: int = 1,
+                 verbose: bool = False, seed: int = 42):
+        super().__init__(address, _Handler)
+        self.data = data
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, status: int):
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def roll(self):
+        """Return 429, a 5xx status or None for this request (injected errors)."""
+        with self._lock:
+            r = self.rng.random()
+            if r < self.error_rate_429:
+                return 429
+            if r < self.error_rate_429 + self.error_rate_5xx:
+                return self.rng.choice([500, 502, 503, 504])
+            return None
+
+    def delay(self) -> float:
+        if not self.latency_ms:
+            return 0.0
+        with self._lock:
+            spread = self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, self.latency_ms * spread / 1000.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay())
+
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/", 1)
+        if len(parts) < 2 or parts[0] not in ("v1", "v2"):
+            return self._send(404, {"error": "Not found"})
+        endpoint = parts[1].strip("/")
+        if endpoint not in FILTERS:
+            return self._send(404, {"error": f"Unknown endpoint {endpoint}"})
+
+        status = server.roll()
+        if status == 429:
+            return self._send(429, {"error": "Too many requests"}, {"Retry-After": str(server.retry_after)})
+        if status is not None:
+            return self._send(status, {"error": "Injected server error"})
+
+        query = parse_qs(url.query)
+        missing = [p for p in REQUIRED.get(endpoint, []) if p not in query]
+        if endpoint == "odds" and "dates[]" not in query and "game_ids[]" not in query:
+            missing = ["dates[] or game_ids[]"]
+        if missing:
+            return self._send(400, {"error": f"Missing required parameter(s): {', '.join(missing)}"})
+
+        rows = select_rows(server.data, endpoint, query)
+        try:
+            per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+            offset = int(query.get("cursor", [0])[0])
+        except ValueError:
+            return self._send(400, {"error": "per_page and cursor must be integers"})
+
+        page = rows[offset:offset + per_page]
+        meta = {"per_page": per_page}
+        if offset + per_page < len(rows):
+            meta["next_cursor"] = offset + per_page
+        self._send(200, {"data": page, "meta": meta})
+
+    def _send(self, status: int, body: dict, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.count(status)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_in_thread(data: Dataset, host: str = "127.0.0.1", port: int = 0, **options):
+    """
+    Start a StandinServer on a daemon thread (port 0 = any free port) and
+    return it; its base URLs are f"http://{host}:{server.server_port}/v1" and
+    ".../v2". Call server.shutdown() when done.
+    """
+    server = StandinServer((host, port), data, **options)
+    threading.Thread(target=server.serve_forever, name="bdl-standin", daemon=True).start()
+    return server
+
+
+def main():
+    yday = date.today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Local stand-in for the balldontlie API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--recorded", action="store_true",
+                        help="Serve the pages recorded in the landing zone instead of synthetic data.")
+    parser.add_argument("--start-date", type=str, default=(yday - timedelta(days=29)).isoformat(),
+                        help="First day of synthetic games (YYYY-MM-DD, default 30 days ago).")
+    parser.add_argument("--end-date", type=str, default=yday.isoformat(),
+                        help="Last day of synthetic games (YYYY-MM-DD, default yesterday).")
+    parser.add_argument("--games-per-day", type=int, default=8)
+    parser.add_argument("--players-per-team", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic data and injected errors.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mean added latency per request.")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency spread, as a fraction of the mean.")
+    parser.add_argument("--error-rate-429", type=float, default=0, help="Fraction of requests answered 429.")
+    parser.add_argument("--error-rate-5xx", type=float, default=0, help="Fraction of requests answered 5xx.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    if args.recorded:
+        print(f"Loading recorded pages from {landing.LANDING_DIR} ...")
+        data = recorded_dataset()
+    else:
+        start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date()
+        data = synthetic_dataset(start_date, end_date, args.games_per_day, args.players_per_team, args.seed)
+    print("Serving: " + ", ".join(f"{ep} {len(rows)}" for ep, rows in sorted(data.rows.items())))
+
+    server = StandinServer(
+        (args.host, args.port), data,
+        latency_ms=args.latency_ms, jitter=args.jitter,
+        error_rate_429=args.error_rate_429, error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after, verbose=args.verbose, seed=args.seed,
+    )
+    base = f"http://{args.host}:{server.server_port}"
+    print(f"balldontlie stand-in listening on {base}")
+    print(f"  export BDL_BASE_URL_V1={base}/v1 BDL_BASE_URL_V2={base}/v2")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Responses by status: " + ", ".join(f"{s}: {n}" for s, n in sorted(server.counts.items())))
+
+
+if __name__ == "__main__":
+    main()
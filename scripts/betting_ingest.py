@@ -1,11 +1,12 @@
-import subprocess
 import sys
 import os
 import logging
 from datetime import date
 
-# Change if you normally use "py" instead of "python"
-PYTHON_EXE = "python"
+import orchestrator
+from orchestrator import Stage
+import odds_ingest
+import props_ingest
 
 # Folder where this file lives (your scripts folder)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -41,48 +42,6 @@ def setup_logging(job_name: str):
     logging.info(f"Logging initialized. Writing to: {log_path}")
 
 
-def run_script(script_name: str, extra_args=None):
-    """
-    Run one of your ingestion scripts as a subprocess from the scripts folder.
-    Captures stdout/stderr and writes them into the log.
-    """
-    script_path = os.path.join(SCRIPT_DIR, script_name)
-    cmd = [PYTHON_EXE, script_path]
-    if extra_args:
-        cmd.extend(extra_args)
-
-    logging.info(f"\n=== Running {script_name} ===")
-    logging.info(f"Command: {' '.join(cmd)}")
-
-    try:
-        result = subprocess.run(
-            cmd,
-            cwd=SCRIPT_DIR,
-            capture_output=True,
-            text=True,
-        )
-
-        if result.stdout:
-            logging.info(f"[{script_name} STDOUT]\n{result.stdout}")
-        if result.stderr:
-            logging.warning(f"[{script_name} STDERR]\n{result.stderr}")
-
-        if result.returncode != 0:
-            logging.error(
-                f"❌ {script_name} failed with exit code {result.returncode}"
-            )
-            sys.exit(result.returncode)
-
-        logging.info(f"=== {script_name} completed successfully ===")
-
-    except FileNotFoundError:
-        logging.error(
-            f"⚠ Could not find script: {script_path}. "
-            f"If the name is different on your machine, update betting_ingest.py."
-        )
-        sys.exit(1)
-
-
 def main():
     setup_logging("betting_ingest")
 
@@ -93,20 +52,17 @@ def main():
 
     # Use "today" for both odds & props
     today = date.today()
-    today_str = today.strftime("%Y-%m-%d")
-    logging.info(f"Betting ingest date: {today_str}")
+    logging.info(f"Betting ingest date: {today}")
 
-    # 1) Odds – for today only
-    run_script(
-        "odds_ingest.py",
-        ["--start-date", today_str, "--end-date", today_str],
-    )
+    # Odds and player props for today only; independent, so they run in parallel
+    result = orchestrator.run_dag([
+        Stage("odds", lambda conn: odds_ingest.run(conn, today, today)),
+        Stage("props", lambda conn: props_ingest.run(conn, today, today)),
+    ])
 
-    # 2) Player props – for today only
-    run_script(
-        "props_ingest.py",
-        ["--start-date", today_str, "--end-date", today_str],
-    )
+    if result["failed"]:
+        logging.error(f"❌ Betting ingest failed: {result['failed']}")
+        sys.exit(1)
 
     logging.info("\n✅ Betting ingest finished for today.")
 
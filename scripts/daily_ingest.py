@@ -1,11 +1,22 @@
-import subprocess
 import sys
 import os
+import argparse
 import logging
 from datetime import date, timedelta
 
-# Change if you normally use "py" instead of "python"
-PYTHON_EXE = "python"
+import orchestrator
+from orchestrator import Stage
+import players_ingest
+import games_ingest
+import player_logs_ingest_real
+import team_game_aggregate
+import advanced_stats_ingest
+import standings_ingest
+import odds_ingest
+import props_ingest
+import injuries_ingest
+import contracts_team_ingest
+import contracts_aggregate_ingest
 
 # Folder where this file lives (your scripts folder)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -43,111 +54,73 @@ def setup_logging(job_name: str):
     logging.info(f"Logging initialized. Writing to: {log_path}")
 
 
-def run_script(script_name: str, extra_args=None):
+def daily_stages(yesterday: date, today: date):
     """
-    Run one of your ingestion scripts as a subprocess from the scripts folder.
-    Captures stdout/stderr and writes them into the log.
-    extra_args: list of additional CLI args, e.g. ["--start-date", "2025-01-01", "--end-date", "2025-01-02"]
+    The daily DAG. games -> player logs -> team aggregate; everything that
+    reads DimGames waits for games; the rest is independent.
     """
-    script_path = os.path.join(SCRIPT_DIR, script_name)
-    cmd = [PYTHON_EXE, script_path]
-    if extra_args:
-        cmd.extend(extra_args)
-
-    logging.info(f"=== Running {script_name} ===")
-    logging.info(f"Command: {' '.join(cmd)}")
-
-    try:
-        result = subprocess.run(
-            cmd,
-            cwd=SCRIPT_DIR,
-            capture_output=True,
-            text=True,
-        )
-
-        if result.stdout:
-            logging.info(f"[{script_name} STDOUT]\n{result.stdout}")
-        if result.stderr:
-            logging.warning(f"[{script_name} STDERR]\n{result.stderr}")
-
-        if result.returncode != 0:
-            logging.error(
-                f"❌ {script_name} failed with exit code {result.returncode}"
-            )
-            sys.exit(result.returncode)
-
-        logging.info(f"=== {script_name} completed successfully ===")
-
-    except FileNotFoundError:
-        logging.error(
-            f"⚠ Could not find script: {script_path}. "
-            f"If the name is different on your machine, update daily_ingest.py."
-        )
-        sys.exit(1)
+    return [
+        # DimPlayers (safe to rerun; upserts metadata)
+        Stage("players", players_ingest.fetch_all_players),
 
+        # DimGames (for yesterday/today only)
+        Stage("games", lambda conn: games_ingest.run(conn, yesterday, today)),
 
-def main():
-    setup_logging("daily_ingest")
+        # FactPlayerGame (yesterday/today only)
+        Stage("player_logs", lambda conn: player_logs_ingest_real.run(conn, yesterday, today),
+              deps=["games"]),
 
-    logging.info("===========================================")
-    logging.info(" NBA Analytics – DAILY INGEST ORCHESTRATOR ")
-    logging.info("===========================================\n")
-    logging.info(f"SCRIPT_DIR resolved as: {SCRIPT_DIR}\n")
+        # Aggregate to FactTeamGame (incremental: only the games player logs / games touched)
+        Stage("team_aggregate", team_game_aggregate.aggregate_team_games, deps=["player_logs"]),
 
-    # ---- Compute your daily window: yesterday + today ----
-    today = date.today()
-    yesterday = today - timedelta(days=1)
+        # Advanced stats – only for yesterday/today
+        Stage("advanced_stats", lambda conn: advanced_stats_ingest.run(conn, yesterday, today),
+              deps=["games"]),
 
-    start_date_str = yesterday.strftime("%Y-%m-%d")
-    end_date_str = today.strftime("%Y-%m-%d")
+        # Standings
+        Stage("standings", standings_ingest.run),
 
-    logging.info(f"Daily ingest date window: {start_date_str} → {end_date_str}")
+        # Odds and player props (today only); both look games up in DimGames
+        Stage("odds", lambda conn: odds_ingest.run(conn, today, today), deps=["games"]),
+        Stage("props", lambda conn: props_ingest.run(conn, today, today), deps=["games"]),
 
-    # 1) DimPlayers (safe to rerun; upserts metadata)
-    run_script("players_ingest.py")
+        # Injuries snapshot
+        Stage("injuries", injuries_ingest.refresh_injuries),
 
-    # 2) DimGames (for yesterday/today only)
-    run_script(
-        "games_ingest.py",
-        ["--start-date", start_date_str, "--end-date", end_date_str],
-    )
-
-    # 3) FactPlayerGame (yesterday/today only)
-    run_script(
-        "player_logs_ingest_real.py",
-        ["--start-date", start_date_str, "--end-date", end_date_str],
-    )
+        # Contracts – occasional but safe to run; aggregates read FactPlayerContracts
+        Stage("contracts_team", contracts_team_ingest.run),
+        Stage("contracts_aggregate", contracts_aggregate_ingest.run, deps=["contracts_team"]),
+    ]
 
-    # 4) Aggregate to FactTeamGame
-    run_script("team_game_aggregate.py")
 
-        # 5) Advanced stats – only for yesterday/today
-    run_script(
-        "advanced_stats_ingest.py",
-        ["--start-date", start_date_str, "--end-date", end_date_str],
+def main():
+    parser = argparse.ArgumentParser(description="Daily NBA ingest (in-process DAG).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=orchestrator.DEFAULT_WORKERS,
+        help=f"Number of independent stages run in parallel (default {orchestrator.DEFAULT_WORKERS}).",
     )
+    args = parser.parse_args()
 
-    # 6) Standings
-    run_script("standings_ingest.py")
+    setup_logging("daily_ingest")
 
-    # 7) Odds (for today only)
-    run_script(
-        "odds_ingest.py",
-        ["--start-date", end_date_str, "--end-date", end_date_str],
-    )
+    logging.info("===========================================")
+    logging.info(" NBA Analytics – DAILY INGEST ORCHESTRATOR ")
+    logging.info("===========================================\n")
+    logging.info(f"SCRIPT_DIR resolved as: {SCRIPT_DIR}\n")
 
-    # 8) Player props (today only)
-    run_script(
-        "props_ingest.py",
-        ["--start-date", end_date_str, "--end-date", end_date_str],
-    )
+    # ---- Compute your daily window: yesterday + today ----
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+
+    logging.info(f"Daily ingest date window: {yesterday} → {today}")
 
-    # 9) Injuries snapshot
-    run_script("injuries_ingest.py")
+    result = orchestrator.run_dag(daily_stages(yesterday, today), max_workers=args.workers)
 
-    # 10) Contracts – occasional but safe to run
-    run_script("contracts_team_ingest.py")
-    run_script("contracts_aggregate_ingest.py")
+    if result["failed"] or result["skipped"]:
+        logging.error(f"❌ Daily ingest incomplete. Failed: {result['failed']}; skipped: {result['skipped']}")
+        sys.exit(1)
 
     logging.info("\n✅ Daily ingest finished. Database should now be up-to-date for yesterday/today.")
 
@@ -1,12 +1,150 @@
 import os
+import sys
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+# Session settings applied to every connection.
+# synchronous_commit=off: commits return before the WAL is flushed. A crash
+# can lose the last few hundred ms of commits, but async commits still reach
+# disk in order (a watermark never survives without the rows before it) and
+# everything here can be re-fetched from the API.
+SYNCHRONOUS_COMMIT = os.getenv("NBA_DB_SYNCHRONOUS_COMMIT", "off")
+# Kill runaway statements instead of letting a stuck ingest hold locks forever.
+STATEMENT_TIMEOUT = os.getenv("NBA_DB_STATEMENT_TIMEOUT", "30min")
+POOL_MIN = int(os.getenv("NBA_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("NBA_DB_POOL_MAX", "12"))
+
+
+class TunedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def default_application_name():
+    """'nba-<script>' for the running script, e.g. nba-props_ingest."""
+    script = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0]
+    return os.getenv("NBA_DB_APPLICATION_NAME") or f"nba-{script or 'python'}"
+
 
-def get_connection():
-    return psycopg2.connect(
+def connection_kwargs(application_name: str | None = None):
+    return dict(
         host=os.getenv("NBA_DB_HOST", "localhost"),
         port=os.getenv("NBA_DB_PORT", "5432"),
         dbname=os.getenv("NBA_DB_NAME", "NNBAAnalytics"),  # change if your DB name differs
         user=os.getenv("NBA_DB_USER", "postgres"),          # your Postgres user
         password=os.getenv("NBA_DB_PASSWORD", "ChiefSiv8587!"),
-    
+        application_name=application_name or default_application_name(),
+        options=f"-c synchronous_commit={SYNCHRONOUS_COMMIT} -c statement_timeout={STATEMENT_TIMEOUT}",
+        connection_factory=TunedConnection,
     )
+
+
+def get_connection(application_name: str | None = None):
+    return psycopg2.connect(**connection_kwargs(application_name))
+
+
+# ---------- Connection pool ----------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide ThreadedConnectionPool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, **connection_kwargs())
+    return _pool
+
+
+@contextmanager
+def pooled_connection(application_name: str | None = None):
+    """
+    Borrow a connection from the pool for the duration of a with-block.
+
+    application_name (e.g. the stage being run) is set for the session so
+    pg_stat_activity shows what each pooled connection is doing. Any open
+    transaction is rolled back before the connection goes back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        if application_name:
+            cur = conn.cursor()
+            cur.execute("SELECT set_config('application_name', %s, false);", (application_name,))
+            cur.close()
+            conn.commit()
+        yield conn
+    finally:
+        if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+            conn.rollback()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+# ---------- Server-side prepared statements ----------
+
+
+def prepare_statement(conn, name: str, sql: str) -> str:
+    """
+    PREPARE `sql` (written with %s placeholders) on this connection once,
+    and return the matching "EXECUTE name (%s, ...)" to pass to cur.execute
+    with the same parameters. Saves the parse/plan on every call of the hot
+    single-row upserts.
+
+    Connections that didn't come from get_connection / the pool get the
+    plain SQL back.
+    """
+    prepared = getattr(conn, "prepared", None)
+    if prepared is None:
+        return sql
+
+    n_params = sql.count("%s")
+    if name not in prepared:
+        parts = sql.split("%s")
+        server_sql = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+        cur = conn.cursor()
+        cur.execute(f"PREPARE {name} AS {server_sql.strip().rstrip(';')}")
+        cur.close()
+        prepared.add(name)
+
+    if n_params == 0:
+        return f"EXECUTE {name};"
+    return f"EXECUTE {name} ({', '.join(['%s'] * n_params)});"
+
+
+# ---------- Schema helpers ----------
+
+
+def add_column_if_missing(cur, table: str, column: str, definition: str):
+    """
+    ALTER TABLE table ADD COLUMN column definition, only if the catalog
+    doesn't already list it. ADD COLUMN IF NOT EXISTS would take an ACCESS
+    EXCLUSIVE lock on every run (queueing behind long reads and blocking
+    everything after it) even when the column is already there.
+    """
+    cur.execute("""
+        SELECT 1
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass
+          AND attname = %s
+          AND NOT attisdropped;
+    """, (table, column))
+    if cur.fetchone() is None:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition};")
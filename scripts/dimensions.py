@@ -0,0 +1,532 @@
+import threading
+from datetime import date, datetime
+
+from psycopg2.extras import execute_values
+
+# Dimension maintenance shared by every ingest script (DimTeams, DimPlayers,
+# DimGames, DimCalendar).
+#
+# The batch helpers below (upsert_teams, upsert_players, ensure_calendar,
+# ensure_games, ...) take a list of balldontlie objects and write each table
+# with ONE multi-row statement per batch, skipping rows the in-process
+# DimensionCache already has unchanged.
+#
+# The cache is loaded once per process from the database. A row needs
+# writing when its key is new, or when any non-None attribute differs from
+# what the cache last saw (matching the COALESCE-style upserts). Rows are
+# remembered only after their transaction commits.
+
+
+class DimensionCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.rows = {
+            "teams": {},
+            "players": {},
+            "games": {},
+            "calendar": {},
+        }
+
+    def load(self, conn):
+        """Load every known dimension key (and its tracked attributes) from the DB."""
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT teamid, teamname, abbreviation, conference, division, city, shortname
+            FROM dimteams;
+        """)
+        teams = {
+            r[0]: {
+                "teamname": r[1],
+                "abbreviation": r[2],
+                "conference": r[3],
+                "division": r[4],
+                "city": r[5],
+                "shortname": r[6],
+            }
+            for r in cur.fetchall()
+        }
+
+        cur.execute("""
+            SELECT playerid, playername, teamid, position,
+                   height, weight, country, college,
+                   draft_round, draft_number, draft_year, jersey_number
+            FROM dimplayers;
+        """)
+        players = {
+            r[0]: {
+                "playername": r[1],
+                "teamid": r[2],
+                "position": r[3],
+                "height": r[4],
+                "weight": r[5],
+                "country": r[6],
+                "college": r[7],
+                "draft_round": r[8],
+                "draft_number": r[9],
+                "draft_year": r[10],
+                "jersey_number": r[11],
+            }
+            for r in cur.fetchall()
+        }
+
+        cur.execute("""
+            SELECT gameid, date, hometeamid, awayteamid, season,
+                   home_score, visitor_score, status, period
+            FROM dimgames;
+        """)
+        games = {
+            r[0]: {
+                "date": r[1],
+                "hometeamid": r[2],
+                "awayteamid": r[3],
+                "season": r[4],
+                "home_score": r[5],
+                "visitor_score": r[6],
+                "status": r[7],
+                "period": r[8],
+            }
+            for r in cur.fetchall()
+        }
+
+        cur.execute("SELECT date FROM dimcalendar;")
+        calendar = {r[0]: {} for r in cur.fetchall()}
+        cur.close()
+
+        with self._lock:
+            self.rows = {
+                "teams": teams,
+                "players": players,
+                "games": games,
+                "calendar": calendar,
+            }
+            self.loaded = True
+        print(
+            f"Dimension cache loaded: {len(teams)} teams, {len(players)} players, "
+            f"{len(games)} games, {len(calendar)} calendar dates."
+        )
+
+    def has(self, table: str, key) -> bool:
+        """True if the key is already known to exist (for INSERT ... DO NOTHING rows)."""
+        with self._lock:
+            return key in self.rows[table]
+
+    def needs_write(self, table: str, key, attrs: dict | None = None, exact: bool = False) -> bool:
+        """
+        True if the key is new or any non-None attribute differs from the cached row.
+        With exact=True (full-overwrite upserts) None attributes are compared too.
+        """
+        with self._lock:
+            cached = self.rows[table].get(key)
+            if cached is None:
+                return True
+            for name, value in (attrs or {}).items():
+                if (value is not None or exact) and cached.get(name) != value:
+                    return True
+            return False
+
+    def remember(self, table: str, key, attrs: dict | None = None, exact: bool = False):
+        """Record a committed row. None attributes leave the cached value alone unless exact=True."""
+        with self._lock:
+            cached = self.rows[table].setdefault(key, {})
+            for name, value in (attrs or {}).items():
+                if value is not None or exact:
+                    cached[name] = value
+
+    def remember_all(self, pending):
+        """Record the (table, key, attrs, exact) entries returned by the batch helpers with commit=False."""
+        for table, key, attrs, exact in pending:
+            self.remember(table, key, attrs, exact)
+
+
+_cache = DimensionCache()
+_cache_load_lock = threading.Lock()
+
+
+def get_cache(conn) -> DimensionCache:
+    """Return the process-wide DimensionCache, loading it on first use."""
+    if not _cache.loaded:
+        with _cache_load_lock:
+            if not _cache.loaded:
+                _cache.load(conn)
+    return _cache
+
+
+# ---------- Parsing helpers ----------
+
+
+def parse_height(height_str: str):
+    """balldontlie height like '6-7' -> total inches, or None if missing/malformed."""
+    if not height_str:
+        return None
+    try:
+        parts = height_str.split("-")
+        feet = int(parts[0])
+        inches = int(parts[1]) if len(parts) > 1 else 0
+        return feet * 12 + inches
+    except Exception:
+        return None
+
+
+def to_int_or_none(v):
+    try:
+        return int(v) if v is not None else None
+    except Exception:
+        return None
+
+
+def parse_game_date(raw_date: str) -> date:
+    """Parse ISO date like "2024-01-20" or "2024-01-20T00:00:00.000Z" to a date."""
+    if "T" in raw_date:
+        return datetime.fromisoformat(raw_date.replace("Z", "+00:00")).date()
+    return datetime.strptime(raw_date, "%Y-%m-%d").date()
+
+
+def team_attrs(team_obj: dict) -> dict:
+    """DimTeams attributes from a /teams (or embedded) team object. Missing city/shortname are None."""
+    team_id = team_obj["id"]
+    return {
+        "teamname": team_obj.get("full_name") or team_obj.get("name") or f"Team {team_id}",
+        "abbreviation": team_obj.get("abbreviation") or "",
+        "conference": team_obj.get("conference") or "",
+        "division": team_obj.get("division") or "",
+        "city": team_obj.get("city") or None,
+        "shortname": team_obj.get("name") or None,
+    }
+
+
+def player_attrs(player_obj: dict) -> dict:
+    """
+    DimPlayers attributes from a player object. The team comes from
+    player_obj["team_id"] or an embedded player_obj["team"].
+    """
+    first = player_obj.get("first_name") or ""
+    last = player_obj.get("last_name") or ""
+    team_id = player_obj.get("team_id")
+    if team_id is None:
+        team_id = (player_obj.get("team") or {}).get("id")
+    return {
+        "playername": f"{first} {last}".strip(),
+        "teamid": team_id,
+        "position": player_obj.get("position") or None,
+        "height": parse_height(player_obj.get("height")),
+        "weight": to_int_or_none(player_obj.get("weight")),
+        "country": player_obj.get("country"),
+        "college": player_obj.get("college"),
+        "draft_round": to_int_or_none(player_obj.get("draft_round")),
+        "draft_number": to_int_or_none(player_obj.get("draft_number")),
+        "draft_year": to_int_or_none(player_obj.get("draft_year")),
+        "jersey_number": player_obj.get("jersey_number"),
+    }
+
+
+# ---------- Batch writers ----------
+#
+# Each writer takes a list of API objects and issues one statement per
+# table. With commit=True (the default) it commits and updates the cache.
+# With commit=False the caller owns the transaction: the writer returns the
+# pending cache entries, to be passed to get_cache(conn).remember_all() once
+# the caller has committed. Rows are written in key order so concurrent
+# stages upserting overlapping keys lock them in the same order and can't
+# deadlock.
+
+
+def _write(conn, sql: str, rows: list, pending: list, commit: bool):
+    try:
+        if rows:
+            cur = conn.cursor()
+            execute_values(cur, sql, rows, page_size=1000)
+            cur.close()
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    if commit:
+        get_cache(conn).remember_all(pending)
+        return []
+    return pending
+
+
+def ensure_calendar(conn, games: list, commit: bool = True):
+    """Insert missing DimCalendar rows for the dates of these game objects."""
+    cache = get_cache(conn)
+    rows = {}
+    for g in games:
+        game_dt = parse_game_date(g["date"])
+        if game_dt in rows or cache.has("calendar", game_dt):
+            continue
+        rows[game_dt] = (
+            game_dt,
+            game_dt.year,
+            game_dt.month,
+            game_dt.day,
+            game_dt.isocalendar()[1],
+            game_dt.isoweekday(),
+            str(g["season"]),
+            g.get("postseason", False),
+        )
+
+    pending = [("calendar", d, None, False) for d in rows]
+    return _write(conn, """
+        INSERT INTO dimcalendar (date, year, month, day, week, dayofweek, season, isplayoffs)
+        VALUES %s
+        ON CONFLICT (date) DO NOTHING;
+    """, [rows[d] for d in sorted(rows)], pending, commit)
+
+
+def ensure_team_stubs(conn, team_ids, commit: bool = True):
+    """Insert placeholder DimTeams rows for unknown team ids so FKs don't fail."""
+    cache = get_cache(conn)
+    ids = sorted({tid for tid in team_ids if tid is not None and not cache.has("teams", tid)})
+    rows = [(tid, f"Team {tid}", "", "", "", "", "", "") for tid in ids]
+    pending = [("teams", tid, None, False) for tid in ids]
+    return _write(conn, """
+        INSERT INTO dimteams (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
+        VALUES %s
+        ON CONFLICT (teamid) DO NOTHING;
+    """, rows, pending, commit)
+
+
+def upsert_teams(conn, teams: list, commit: bool = True):
+    """
+    Upsert team objects into DimTeams in one statement. An empty city or
+    shortname never overwrites a known one; venue is left as-is since the
+    API doesn't provide it.
+    """
+    cache = get_cache(conn)
+    by_id = {}
+    for t in teams:
+        if t:
+            by_id[t["id"]] = team_attrs(t)
+
+    rows = []
+    pending = []
+    for team_id, attrs in sorted(by_id.items()):
+        if not cache.needs_write("teams", team_id, attrs):
+            continue
+        rows.append((
+            team_id,
+            attrs["teamname"],
+            attrs["abbreviation"],
+            attrs["conference"],
+            attrs["division"],
+            "",       # venue placeholder
+            attrs["city"] or "",
+            attrs["shortname"] or "",
+        ))
+        pending.append(("teams", team_id, attrs, False))
+
+    return _write(conn, """
+        INSERT INTO dimteams
+            (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
+        VALUES %s
+        ON CONFLICT (teamid) DO UPDATE
+        SET teamname     = EXCLUDED.teamname,
+            abbreviation = EXCLUDED.abbreviation,
+            conference   = EXCLUDED.conference,
+            division     = EXCLUDED.division,
+            city         = COALESCE(NULLIF(EXCLUDED.city, ''), dimteams.city),
+            shortname    = COALESCE(NULLIF(EXCLUDED.shortname, ''), dimteams.shortname);
+    """, rows, pending, commit)
+
+
+def ensure_player_stubs(conn, player_ids, commit: bool = True):
+    """Insert placeholder DimPlayers rows for unknown player ids so FKs don't fail."""
+    cache = get_cache(conn)
+    ids = sorted({pid for pid in player_ids if pid is not None and not cache.has("players", pid)})
+    rows = [(pid, f"Player {pid}", True) for pid in ids]
+    pending = [("players", pid, None, False) for pid in ids]
+    return _write(conn, """
+        INSERT INTO dimplayers (playerid, playername, activeflag)
+        VALUES %s
+        ON CONFLICT (playerid) DO NOTHING;
+    """, rows, pending, commit)
+
+
+PLAYERS_MERGE = """
+    INSERT INTO dimplayers
+        (playerid, playername, teamid, position,
+         height, weight, birthdate, yearsexperience, activeflag,
+         country, college, draft_round, draft_number, draft_year, jersey_number)
+    VALUES %s
+    ON CONFLICT (playerid) DO UPDATE
+    SET playername     = EXCLUDED.playername,
+        teamid         = COALESCE(EXCLUDED.teamid, dimplayers.teamid),
+        position       = COALESCE(NULLIF(EXCLUDED.position, ''), dimplayers.position),
+        height         = COALESCE(EXCLUDED.height, dimplayers.height),
+        weight         = COALESCE(EXCLUDED.weight, dimplayers.weight),
+        country        = COALESCE(EXCLUDED.country, dimplayers.country),
+        college        = COALESCE(EXCLUDED.college, dimplayers.college),
+        draft_round    = COALESCE(EXCLUDED.draft_round, dimplayers.draft_round),
+        draft_number   = COALESCE(EXCLUDED.draft_number, dimplayers.draft_number),
+        draft_year     = COALESCE(EXCLUDED.draft_year, dimplayers.draft_year),
+        jersey_number  = COALESCE(EXCLUDED.jersey_number, dimplayers.jersey_number),
+        activeflag     = COALESCE(dimplayers.activeflag, TRUE);
+"""
+
+PLAYERS_OVERWRITE = """
+    INSERT INTO dimplayers
+        (playerid, playername, teamid, position,
+         height, weight, birthdate, yearsexperience, activeflag,
+         country, college, draft_round, draft_number, draft_year, jersey_number)
+    VALUES %s
+    ON CONFLICT (playerid) DO UPDATE
+    SET playername     = EXCLUDED.playername,
+        teamid         = EXCLUDED.teamid,
+        position       = EXCLUDED.position,
+        height         = EXCLUDED.height,
+        weight         = EXCLUDED.weight,
+        country        = EXCLUDED.country,
+        college        = EXCLUDED.college,
+        draft_round    = EXCLUDED.draft_round,
+        draft_number   = EXCLUDED.draft_number,
+        draft_year     = EXCLUDED.draft_year,
+        jersey_number  = EXCLUDED.jersey_number,
+        activeflag     = EXCLUDED.activeflag;
+"""
+
+
+def upsert_players(conn, players: list, authoritative: bool = False, commit: bool = True):
+    """
+    Upsert player objects into DimPlayers in one statement.
+
+    By default attributes missing from the object (None / empty) keep the
+    value already in DimPlayers, since the player objects embedded in stats,
+    injuries and contracts are partial. authoritative=True is for the
+    /players feed itself: every column is overwritten.
+    """
+    cache = get_cache(conn)
+    by_id = {}
+    for p in players:
+        if not p:
+            continue
+        attrs = player_attrs(p)
+        if authoritative:
+            attrs["position"] = attrs["position"] or ""
+            attrs["country"] = attrs["country"] or ""
+            attrs["college"] = attrs["college"] or ""
+        by_id[p["id"]] = attrs
+
+    rows = []
+    pending = []
+    for player_id, attrs in sorted(by_id.items()):
+        if not cache.needs_write("players", player_id, attrs, exact=authoritative):
+            continue
+        rows.append((
+            player_id,
+            attrs["playername"],
+            attrs["teamid"],
+            attrs["position"] or "",
+            attrs["height"],
+            attrs["weight"],
+            None,   # birthdate not provided by the API
+            None,   # yearsexperience not provided
+            True,   # treat as active
+            attrs["country"],
+            attrs["college"],
+            attrs["draft_round"],
+            attrs["draft_number"],
+            attrs["draft_year"],
+            attrs["jersey_number"],
+        ))
+        pending.append(("players", player_id, attrs, authoritative))
+
+    sql = PLAYERS_OVERWRITE if authoritative else PLAYERS_MERGE
+    return _write(conn, sql, rows, pending, commit)
+
+
+def ensure_games(conn, games: list, commit: bool = True):
+    """
+    Make sure DimGames (plus DimCalendar and placeholder DimTeams) rows exist
+    for these game objects, without touching games already present (they may
+    have been enriched by games_ingest.py).
+    """
+    cache = get_cache(conn)
+    pending = ensure_calendar(conn, games, commit=False)
+    pending += ensure_team_stubs(
+        conn, [tid for g in games for tid in (g["home_team_id"], g["visitor_team_id"])], commit=False
+    )
+
+    rows = {}
+    for g in games:
+        if g["id"] in rows or cache.has("games", g["id"]):
+            continue
+        rows[g["id"]] = (
+            g["id"],
+            parse_game_date(g["date"]),
+            g["home_team_id"],
+            g["visitor_team_id"],
+            str(g["season"]),
+            None,
+        )
+    pending += [("games", gid, None, False) for gid in rows]
+
+    return _write(conn, """
+        INSERT INTO dimgames (gameid, date, hometeamid, awayteamid, season, gamenumber)
+        VALUES %s
+        ON CONFLICT (gameid) DO NOTHING;
+    """, [rows[gid] for gid in sorted(rows)], pending, commit)
+
+
+def upsert_games(conn, games: list, commit: bool = True):
+    """
+    Upsert the flat game objects embedded in stats / advanced stats
+    (home_team_id, visitor_team_id, home_team_score, ...) into DimGames.
+    Scores, status and period only overwrite when present. The full /games
+    objects are handled by games_ingest.upsert_game.
+    """
+    cache = get_cache(conn)
+    pending = ensure_calendar(conn, games, commit=False)
+    pending += ensure_team_stubs(
+        conn, [tid for g in games for tid in (g["home_team_id"], g["visitor_team_id"])], commit=False
+    )
+
+    by_id = {}
+    for g in games:
+        by_id[g["id"]] = {
+            "date": parse_game_date(g["date"]),
+            "hometeamid": g["home_team_id"],
+            "awayteamid": g["visitor_team_id"],
+            "season": str(g.get("season")),
+            "home_score": g.get("home_team_score"),
+            "visitor_score": g.get("visitor_team_score"),
+            "status": g.get("status"),
+            "period": g.get("period"),
+        }
+
+    rows = []
+    for game_id, attrs in sorted(by_id.items()):
+        if not cache.needs_write("games", game_id, attrs):
+            continue
+        rows.append((
+            game_id,
+            attrs["date"],
+            attrs["hometeamid"],
+            attrs["awayteamid"],
+            attrs["season"],
+            None,
+            attrs["home_score"],
+            attrs["visitor_score"],
+            attrs["status"],
+            attrs["period"],
+        ))
+        pending.append(("games", game_id, attrs, False))
+
+    return _write(conn, """
+        INSERT INTO dimgames
+            (gameid, date, hometeamid, awayteamid, season, gamenumber,
+             home_score, visitor_score, status, period)
+        VALUES %s
+        ON CONFLICT (gameid) DO UPDATE
+        SET date          = EXCLUDED.date,
+            hometeamid    = EXCLUDED.hometeamid,
+            awayteamid    = EXCLUDED.awayteamid,
+            season        = EXCLUDED.season,
+            home_score    = COALESCE(EXCLUDED.home_score, dimgames.home_score),
+            visitor_score = COALESCE(EXCLUDED.visitor_score, dimgames.visitor_score),
+            status        = COALESCE(EXCLUDED.status, dimgames.status),
+            period        = COALESCE(EXCLUDED.period, dimgames.period);
+    """, rows, pending, commit)
@@ -0,0 +1,26 @@
+import os
+
+# Fetch settings shared by the date-range (and game-list) backfills: the
+# defaults and the --concurrency / --batch-days options. The fetching itself
+# runs through pipeline.run.
+
+DEFAULT_CONCURRENCY = int(os.getenv("BDL_FETCH_CONCURRENCY", "8"))
+# Dates packed into one dates[] query by the date-range drivers.
+DEFAULT_BATCH_DAYS = int(os.getenv("BDL_BATCH_DAYS", "7"))
+
+
+def add_fetch_args(parser):
+    """Add the standard --concurrency / --batch-days options to an ingest script's argparse parser."""
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Number of requests (date batches / games) fetched in parallel (default {DEFAULT_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--batch-days",
+        type=int,
+        default=DEFAULT_BATCH_DAYS,
+        help=f"Number of dates packed into one paginated dates[] query (default {DEFAULT_BATCH_DAYS}).",
+    )
+
@@ -1,54 +1,136 @@
-import subprocess
 import sys
 import os
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, date, timedelta
 from db_connection import get_connection
 import psycopg2
 
-# If your Python command is not "python" (e.g., "py" on Windows),
-# change this to "py" or the full path.
-PYTHON_EXE = "python"
+import orchestrator
+from orchestrator import Stage
+import players_ingest
+import games_ingest
+import player_logs_ingest_real
+import team_game_aggregate
+import advanced_stats_ingest
+import standings_ingest
+import odds_ingest
+import props_ingest
+import injuries_ingest
+import contracts_team_ingest
+import contracts_aggregate_ingest
+import ingest_state
+import replay
 
 # Absolute path to the folder where THIS file lives (your scripts folder)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# List of ingestion scripts to run, IN ORDER.
-# Make sure these filenames exist inside SCRIPT_DIR.
-INGEST_SCRIPTS = [
+# Ingestion stages and their dependencies. Stages whose dependencies are
+# done run in parallel; the old strict order is kept only where one stage
+# reads what another writes.
+INGEST_STAGES = [
     # Dimensions (optional, but safe to run)
-    "players_ingest.py",            # fills DimPlayers with full metadata
-    "games_ingest.py",              # fills DimGames (+ ensures DimTeams/DimCalendar)
+    Stage("players", players_ingest.fetch_all_players),   # fills DimPlayers with full metadata
+    Stage("games", games_ingest.run),                     # fills DimGames (+ ensures DimTeams/DimCalendar)
 
     # Core facts
-    "player_logs_ingest_real.py",   # fills FactPlayerGame for last 3 seasons
-    "team_game_aggregate.py",       # builds FactTeamGame from FactPlayerGame
+    Stage("player_logs", player_logs_ingest_real.run, deps=["games"]),              # fills FactPlayerGame
+    Stage("team_aggregate", lambda conn: team_game_aggregate.aggregate_team_games(conn, full=True),
+          deps=["player_logs"]),                                                    # builds FactTeamGame from FactPlayerGame
 
     # Advanced stats / season-level stuff
-    "advanced_stats_ingest.py",     # if you created this
-    "standings_ingest.py",          # fills FactTeamStandings (or similar)
+    Stage("advanced_stats", advanced_stats_ingest.run, deps=["games"]),
+    Stage("standings", standings_ingest.run),             # fills FactTeamStandings
 
     # Betting-related
-    "odds_ingest.py",               # fills FactOdds
-    "props_ingest.py",              # fills FactPlayerProps
+    Stage("odds", odds_ingest.run, deps=["games"]),        # fills FactOdds
+    Stage("props", props_ingest.run, deps=["games"]),      # fills FactPlayerProps
 
     # Other facts
-    "injuries_ingest.py",           # fills FactInjuries
-    "contracts_team_ingest.py",     # team contracts
-    "contracts_aggregate_ingest.py", # aggregate contracts
+    Stage("injuries", injuries_ingest.refresh_injuries),  # fills FactInjuries
+    Stage("contracts_team", contracts_team_ingest.run),   # team contracts
+    Stage("contracts_aggregate", contracts_aggregate_ingest.run,
+          deps=["contracts_team"]),                       # aggregate contracts
 ]
 
+# --replay: rebuild from the raw landing zone (landing.py) instead of the API.
+# Only the endpoints that are landed and replayable are rebuilt.
+REPLAY_STAGES = [
+    Stage("games", lambda conn: replay.replay_endpoint(conn, "games")),
+    Stage("player_logs", lambda conn: replay.replay_endpoint(conn, "stats"), deps=["games"]),
+    Stage("team_aggregate", lambda conn: team_game_aggregate.aggregate_team_games(conn, full=True),
+          deps=["player_logs"]),
+    Stage("advanced_stats", lambda conn: replay.replay_endpoint(conn, "stats/advanced"), deps=["games"]),
+    Stage("odds", lambda conn: replay.replay_endpoint(conn, "odds"), deps=["games"]),
+    Stage("props", lambda conn: replay.replay_endpoint(conn, "odds/player_props"), deps=["games"]),
+]
+
+# Tables a replay clears: only the fact tables REPLAY_STAGES reload, plus
+# their watermarks. No CASCADE, so nothing else is emptied along the way
+# (if another table references one of them the reset fails and the replay
+# upserts over the existing rows instead). DimGames is upserted in place.
+# The history tables (FactOddsHistory, FactOddsLines,
+# FactPlayerPropsHistory) are never cleared: snapshots taken before the
+# landing zone existed can't be fetched again, and the replay writers skip
+# snapshots the history already holds.
+REPLAY_RESETS = [
+    "TRUNCATE TABLE factplayerprops, factodds, factteamgame, factplayergame, factplayeradvanced "
+    "RESTART IDENTITY;",
+    "DELETE FROM ingestwatermarks WHERE tablename IN "
+    "('factplayergame', 'factplayeradvanced', 'factodds', 'factplayerprops');",
+    "DELETE FROM paginationcheckpoints WHERE endpoint IN "
+    "('games', 'stats', 'stats/advanced', 'odds', 'odds/player_props');",
+]
+
+
+class ShardedStage(Stage):
+    """A stage run once per shard as fn(conn, start_date, end_date); returns the failed dates."""
+
+
+# --sharded: the same rebuild split into seasons (Oct 1 - Sep 30) or
+# calendar months, run across a process pool. Each ShardedStage runs once
+# per shard, after its dependencies' run for the same shard; plain stages
+# run once (shard "all") after every shard of their dependencies. Every
+# (stage, shard) is checkpointed in RebuildShards, and --resume skips the
+# reset and the shards already done. All processes share the cross-process
+# API rate limit (rate_limiter.py).
+SHARDED_STAGES = [
+    Stage("players", players_ingest.fetch_all_players),
+    ShardedStage("games", games_ingest.run_games_range),
+    ShardedStage("player_logs", player_logs_ingest_real.run_stats_range, deps=["games"]),
+    Stage("team_aggregate", lambda conn: team_game_aggregate.aggregate_team_games(conn, full=True),
+          deps=["player_logs"]),
+    ShardedStage("advanced_stats", advanced_stats_ingest.run_advanced_range, deps=["games"]),
+    Stage("standings", standings_ingest.run),
+    ShardedStage("odds", odds_ingest.run_odds_range, deps=["games"]),
+    Stage("odds_lines", odds_ingest.refresh_odds_lines, deps=["odds"]),
+    ShardedStage("props", props_ingest.run_props_for_range, deps=["games"]),
+    Stage("injuries", injuries_ingest.refresh_injuries),
+    Stage("contracts_team", contracts_team_ingest.run),
+    Stage("contracts_aggregate", contracts_aggregate_ingest.run, deps=["contracts_team"]),
+]
+
+# Watermarks set once every shard is done: shards finish out of order, so
+# the sharded stages use the range-only entry points, which leave them alone.
+SHARDED_WATERMARKS = ["dimgames", "factplayergame", "factplayeradvanced", "factodds", "factplayerprops"]
+
+DEFAULT_PROCESSES = 4
+
 # ------------- Helpers -------------
 
 
-def run_sql_resets():
+def run_sql_resets(statements=None):
     """
-    Truncate fact tables and DimGames so we rebuild everything clean.
-    If some tables don't exist yet, we just print a warning and continue.
+    Truncate fact tables and DimGames so we rebuild everything clean (or run
+    `statements` instead, e.g. REPLAY_RESETS). If some tables don't exist
+    yet, we just print a warning and continue.
     """
     print("=== Resetting database tables ===")
     conn = get_connection()
     cur = conn.cursor()
 
-    statements = [
+    statements = statements or [
         # FACT tables (order doesn't matter because we use CASCADE)
         "TRUNCATE TABLE factplayerprops RESTART IDENTITY CASCADE;",
         "TRUNCATE TABLE factodds RESTART IDENTITY CASCADE;",
@@ -63,6 +145,11 @@ def run_sql_resets():
 
         # DIM games only (do NOT clear DimTeams/DimPlayers!)
         "TRUNCATE TABLE dimgames RESTART IDENTITY CASCADE;",
+
+        # Ingest watermarks, so every stage starts over instead of resuming
+        "TRUNCATE TABLE ingestwatermarks;",
+            "TRUNCATE TABLE rebuildshards;",
+        "TRUNCATE TABLE paginationcheckpoints;",
     ]
 
     for stmt in statements:
@@ -72,6 +159,7 @@ def run_sql_resets():
             conn.commit()
         except psycopg2.Error as e:
             # Don't abort the whole reset if one table doesn't exist yet
+            conn.rollback()
             print(f"  ⚠ Warning: {e.diag.message_primary} (while running `{stmt.strip()}`)")
 
     cur.close()
@@ -79,40 +167,188 @@ def run_sql_resets():
     print("=== DB reset completed ===\n")
 
 
-def run_script(script_name: str):
+# ------------- Sharded rebuild -------------
+
+
+def plan_shards(start_date: date, end_date: date, shard_by: str = "season"):
+    """Split start_date..end_date into [(shard name, start, end)] by season or month."""
+    shards = []
+    day = start_date
+    while day <= end_date:
+        if shard_by == "season":
+            season = day.year if day.month >= 10 else day.year - 1
+            name = f"{season}-{(season + 1) % 100:02d}"
+            last = date(season + 1, 9, 30)
+        else:
+            name = f"{day.year}-{day.month:02d}"
+            last = date(day.year + day.month // 12, day.month % 12 + 1, 1) - timedelta(days=1)
+        last = min(last, end_date)
+        shards.append((name, day, last))
+        day = last + timedelta(days=1)
+    return shards
+
+
+_STAGES_BY_NAME = {stage.name: stage for stage in SHARDED_STAGES}
+
+
+def _run_shard(stage_name: str, shard: str, start_date: date | None, end_date: date | None):
+    """Worker process: run one stage for one shard on its own connection."""
+    stage = _STAGES_BY_NAME[stage_name]
+    with orchestrator.stage_stdout(), orchestrator.stage_output(f"{stage_name} {shard}"):
+        conn = get_connection(f"nba-{stage_name}-{shard}")
+        try:
+            if isinstance(stage, ShardedStage):
+                return stage.fn(conn, start_date, end_date)
+            return stage.fn(conn)
+        finally:
+            conn.close()
+
+
+def run_sharded(start_date: date, end_date: date, shard_by: str = "season",
+                processes: int = DEFAULT_PROCESSES, resume: bool = False):
     """
-    Run one of your ingestion scripts as a subprocess, from the scripts folder.
+    Run SHARDED_STAGES over start_date..end_date, one (stage, shard) per
+    task on a process pool, checkpointing each in RebuildShards. With
+    resume, shards already done are skipped. Returns
+    {"done": [...], "failed": [...], "skipped": [...]} of (stage, shard).
     """
-    script_path = os.path.join(SCRIPT_DIR, script_name)
-    print(f"\n=== Running {script_name} ===")
-    try:
-        subprocess.run(
-            [PYTHON_EXE, script_path],
-            check=True,
-            cwd=SCRIPT_DIR,  # run with working directory = scripts folder
-        )
-        print(f"=== {script_name} completed successfully ===")
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ {script_name} failed with exit code {e.returncode}")
-        sys.exit(1)
-    except FileNotFoundError:
-        print(f"\n⚠ Could not find script: {script_path}. "
-              f"If the name is different on your machine, update INGEST_SCRIPTS.")
-        sys.exit(1)
+    shards = plan_shards(start_date, end_date, shard_by)
+    shard_names = [name for name, _, _ in shards]
+    tasks = {}
+    for stage in SHARDED_STAGES:
+        if isinstance(stage, ShardedStage):
+            for name, shard_start, shard_end in shards:
+                tasks[(stage.name, name)] = (shard_start, shard_end)
+        else:
+            tasks[(stage.name, "all")] = (None, None)
+
+    def deps_of(task):
+        stage_name, shard = task
+        for dep in _STAGES_BY_NAME[stage_name].deps:
+            if not isinstance(_STAGES_BY_NAME[dep], ShardedStage):
+                yield (dep, "all")
+            elif shard == "all":
+                yield from ((dep, name) for name in shard_names)
+            else:
+                yield (dep, shard)
+
+    conn = get_connection()
+    ingest_state.plan_shards(conn, [key + dates for key, dates in tasks.items()])
+    done = sorted(ingest_state.done_shards(conn) & set(tasks)) if resume else []
+    if done:
+        print(f"Resuming: {len(done)} of {len(tasks)} shard(s) already done.")
+    print(f"Rebuilding {start_date} to {end_date} as {len(shards)} {shard_by} shard(s) "
+          f"on {processes} process(es).")
+
+    pending = [task for task in tasks if task not in done]
+    failed, skipped = [], []
+    running = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, processes), mp_context=ctx) as executor:
+        while pending or running:
+            for task in list(pending):
+                deps = list(deps_of(task))
+                blocked = [d for d in deps if d in failed or d in skipped]
+                if blocked:
+                    print(f"Skipping {task[0]} {task[1]}: {blocked[0][0]} {blocked[0][1]} did not succeed.")
+                    skipped.append(task)
+                    pending.remove(task)
+                elif all(d in done for d in deps):
+                    ingest_state.mark_shard(conn, *task, "running")
+                    running[executor.submit(_run_shard, *task, *tasks[task])] = task
+                    pending.remove(task)
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                error = future.exception()
+                if error is None and isinstance(future.result(), list) and future.result():
+                    error = f"failed date(s): {', '.join(str(d) for d in future.result())}"
+                if error is not None:
+                    print(f"❌ {task[0]} {task[1]} failed: {error!r}")
+                    ingest_state.mark_shard(conn, *task, "failed", error=repr(error))
+                    failed.append(task)
+                    continue
+                ingest_state.mark_shard(conn, *task, "done")
+                done.append(task)
+                print(f"✔ {task[0]} {task[1]} done ({len(done)}/{len(tasks)}).")
+
+    if not failed and not skipped:
+        cutoff = min(end_date, date.today() - timedelta(days=1))
+        for table in SHARDED_WATERMARKS:
+            ingest_state.set_watermark(conn, table, cutoff)
+    conn.close()
+    return {"done": done, "failed": failed, "skipped": skipped}
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Full NBA rebuild (in-process DAG).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=orchestrator.DEFAULT_WORKERS,
+        help=f"Number of independent stages run in parallel (default {orchestrator.DEFAULT_WORKERS}).",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Rebuild from the raw landing zone instead of calling the API.",
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Split the history into shards run across a process pool, with checkpoints.",
+    )
+    parser.add_argument("--shard-by", choices=["season", "month"], default="season",
+                        help="Shard size for --sharded (default season).")
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES,
+                        help=f"Worker processes for --sharded (default {DEFAULT_PROCESSES}).")
+    parser.add_argument("--start-date", type=str, help="First date to rebuild with --sharded (YYYY-MM-DD).")
+    parser.add_argument("--end-date", type=str,
+                        help="Last date to rebuild with --sharded (YYYY-MM-DD, default yesterday).")
+    parser.add_argument("--resume", action="store_true",
+                        help="With --sharded: keep the data, skip shards already done and redo the rest.")
+    args = parser.parse_args()
+    if args.sharded and args.replay:
+        parser.error("--sharded and --replay can't be combined.")
+    if args.sharded and not args.start_date:
+        parser.error("--sharded needs --start-date.")
+    if args.resume and not args.sharded:
+        parser.error("--resume only applies to --sharded.")
+
     print("===========================================")
     print(" NBA Analytics – FULL REBUILD ORCHESTRATOR ")
     print("===========================================\n")
     print(f"SCRIPT_DIR resolved as: {SCRIPT_DIR}\n")
 
+    if args.sharded:
+        start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
+        end_date = (datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date
+                    else date.today() - timedelta(days=1))
+        if not args.resume:
+            run_sql_resets()
+        result = run_sharded(start_date, end_date, shard_by=args.shard_by,
+                             processes=args.processes, resume=args.resume)
+        if result["failed"] or result["skipped"]:
+            print(f"\n❌ Sharded rebuild incomplete: {len(result['failed'])} shard(s) failed, "
+                  f"{len(result['skipped'])} skipped. Rerun with --resume to redo them.")
+            sys.exit(1)
+        print("\n✅ Sharded rebuild finished. Database should now be synchronized.")
+        return
+
     # 1) Reset tables
-    run_sql_resets()
+    run_sql_resets(REPLAY_RESETS if args.replay else None)
 
-    # 2) Run each ingestion script in order
-    for script in INGEST_SCRIPTS:
-        run_script(script)
+    # 2) Run the ingestion DAG
+    stages = REPLAY_STAGES if args.replay else INGEST_STAGES
+    result = orchestrator.run_dag(stages, max_workers=args.workers)
+
+    if result["failed"] or result["skipped"]:
+        print(f"\n❌ Full rebuild incomplete. Failed: {result['failed']}; skipped: {result['skipped']}")
+        sys.exit(1)
 
     print("\n✅ Full rebuild finished. Database should now be synchronized.")
 
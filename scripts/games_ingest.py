@@ -1,141 +1,98 @@
-import requests
 from datetime import datetime, timedelta, date
 import argparse
-from db_connection import get_connection
+from db_connection import get_connection, prepare_statement
+import bdl_client
+import dimensions
+import fetch_engine
+import ingest_state
+import pipeline
+from ingest_dates import date_strings, chunk_dates, dates_params, split_rows_by_date, failed_batch_dates
 
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-BASE_URL = "https://api.balldontlie.io/v1"
-
-HEADERS = {
-    "Authorization": API_KEY
-}
+BASE_URL = bdl_client.BASE_URL_V1
 
 # ------------- API Fetch -----------------
 
 
 def fetch_games_for_date(target_date_str: str):
-    """
-    Fetch all games for a given date using cursor-based pagination.
-
-    Uses:
-      ?dates[]=YYYY-MM-DD
-      meta.next_cursor for paging
-    """
-    all_games = []
-    cursor = None
-    page_num = 1
-
-    while True:
-        params = {
-            "dates[]": target_date_str,
-            "per_page": 100,
-        }
-        if cursor is not None:
-            params["cursor"] = cursor
-
-        print(f"Calling {BASE_URL}/games with params={params}")
-        resp = requests.get(
-            f"{BASE_URL}/games",
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-        print("Status:", resp.status_code)
-        if resp.status_code != 200:
-            print("Body:", resp.text[:300])
-            resp.raise_for_status()
-
-        data = resp.json()
-        games_batch = data.get("data", [])
-        meta = data.get("meta", {}) or {}
-
-        print(f"Fetched {len(games_batch)} games on cursor-page {page_num}. Meta: {meta}")
-        all_games.extend(games_batch)
-
-        cursor = meta.get("next_cursor")
-        if not cursor:
-            print("No next_cursor returned. Reached end of pages for this date.")
-            break
-
-        page_num += 1
-
-    return all_games
-
-
-# ------------- Dimension helpers -----------------
+    """Fetch all games for a single date (see fetch_games_for_dates)."""
+    return fetch_games_for_dates([target_date_str])
 
 
-def ensure_calendar(conn, game_dt: date, season: int, postseason: bool):
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimcalendar (date, year, month, day, week, dayofweek, season, isplayoffs)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (date) DO NOTHING;
-        """,
-        (
-            game_dt,
-            game_dt.year,
-            game_dt.month,
-            game_dt.day,
-            game_dt.isocalendar()[1],
-            game_dt.isoweekday(),
-            str(season),
-            postseason,
-        ),
-    )
-    conn.commit()
-    cur.close()
-
-
-def ensure_team(conn, team_obj: dict):
+def games_pages(date_strs: list):
     """
-    Upsert team into DimTeams based on balldontlie /v1/teams or embedded team object.
+    Yield pages of games for one or more dates from a single cursor-paginated
+    query (?dates[]=YYYY-MM-DD&dates[]=..., meta.next_cursor).
     """
-    team_id = team_obj["id"]
-    full_name = team_obj.get("full_name") or team_obj.get("name") or f"Team {team_id}"
-    shortname = team_obj.get("name") or ""
-    abbr = team_obj.get("abbreviation") or ""
-    conference = team_obj.get("conference") or ""
-    division = team_obj.get("division") or ""
-    city = team_obj.get("city") or ""
+    return bdl_client.paginate(f"{BASE_URL}/games", dates_params(date_strs))
 
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimteams
-            (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
-        VALUES
-            (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (teamid) DO UPDATE
-        SET teamname     = EXCLUDED.teamname,
-            abbreviation = EXCLUDED.abbreviation,
-            conference   = EXCLUDED.conference,
-            division     = EXCLUDED.division,
-            city         = EXCLUDED.city,
-            shortname    = EXCLUDED.shortname;
-        -- we leave venue as-is since API doesn't provide it
-        """,
-        (
-            team_id,
-            full_name,
-            abbr,
-            conference,
-            division,
-            "",       # venue placeholder
-            city,
-            shortname,
-        ),
-    )
-    conn.commit()
-    cur.close()
+
+def fetch_games_for_dates(date_strs: list):
+    """Fetch all games for one or more dates as one list (see games_pages)."""
+    return bdl_client.collect(games_pages(date_strs))
 
 
 # ------------- Upsert game -----------------
 
 
-def upsert_game(conn, game_obj: dict):
-    """Insert or update DimGames row from a /games object, using all available fields."""
+UPSERT_GAME_SQL = """
+    INSERT INTO dimgames
+        (gameid, date, hometeamid, awayteamid, season, gamenumber,
+         home_score, visitor_score, status, period,
+         datetime, "time", postseason,
+         home_q1, home_q2, home_q3, home_q4,
+         home_ot1, home_ot2, home_ot3,
+         home_timeouts_remaining, home_in_bonus,
+         visitor_q1, visitor_q2, visitor_q3, visitor_q4,
+         visitor_ot1, visitor_ot2, visitor_ot3,
+         visitor_timeouts_remaining, visitor_in_bonus)
+    VALUES
+        (%s,%s,%s,%s,%s,%s,
+         %s,%s,%s,%s,
+         %s,%s,%s,
+         %s,%s,%s,%s,
+         %s,%s,%s,
+         %s,%s,
+         %s,%s,%s,%s,
+         %s,%s,%s,
+         %s,%s)
+    ON CONFLICT (gameid) DO UPDATE
+    SET date          = EXCLUDED.date,
+        hometeamid    = EXCLUDED.hometeamid,
+        awayteamid    = EXCLUDED.awayteamid,
+        season        = EXCLUDED.season,
+        home_score    = EXCLUDED.home_score,
+        visitor_score = EXCLUDED.visitor_score,
+        status        = EXCLUDED.status,
+        period        = EXCLUDED.period,
+        datetime      = EXCLUDED.datetime,
+        "time"        = EXCLUDED."time",
+        postseason    = EXCLUDED.postseason,
+        home_q1       = EXCLUDED.home_q1,
+        home_q2       = EXCLUDED.home_q2,
+        home_q3       = EXCLUDED.home_q3,
+        home_q4       = EXCLUDED.home_q4,
+        home_ot1      = EXCLUDED.home_ot1,
+        home_ot2      = EXCLUDED.home_ot2,
+        home_ot3      = EXCLUDED.home_ot3,
+        home_timeouts_remaining = EXCLUDED.home_timeouts_remaining,
+        home_in_bonus = EXCLUDED.home_in_bonus,
+        visitor_q1    = EXCLUDED.visitor_q1,
+        visitor_q2    = EXCLUDED.visitor_q2,
+        visitor_q3    = EXCLUDED.visitor_q3,
+        visitor_q4    = EXCLUDED.visitor_q4,
+        visitor_ot1   = EXCLUDED.visitor_ot1,
+        visitor_ot2   = EXCLUDED.visitor_ot2,
+        visitor_ot3   = EXCLUDED.visitor_ot3,
+        visitor_timeouts_remaining = EXCLUDED.visitor_timeouts_remaining,
+        visitor_in_bonus          = EXCLUDED.visitor_in_bonus;
+"""
+
+
+def _game_row(game_obj: dict):
+    """
+    (DimGames params, cache attrs) for a /games object, using all available
+    fields.
+    """
     game_id = game_obj["id"]
 
     # 'date' is usually "YYYY-MM-DD" or ISO with time
@@ -158,19 +115,12 @@ def upsert_game(conn, game_obj: dict):
     else:
         game_datetime = None
 
-    # ensure calendar row
-    ensure_calendar(conn, game_dt, season, postseason)
-
     home_team = game_obj["home_team"]
     visitor_team = game_obj["visitor_team"]
 
     home_id = home_team["id"]
     away_id = visitor_team["id"]
 
-    # ensure both teams exist
-    ensure_team(conn, home_team)
-    ensure_team(conn, visitor_team)
-
     # core fields
     home_score = game_obj.get("home_team_score", 0)
     visitor_score = game_obj.get("visitor_team_score", 0)
@@ -199,96 +149,85 @@ def upsert_game(conn, game_obj: dict):
     visitor_timeouts_remaining = game_obj.get("visitor_timeouts_remaining")
     visitor_in_bonus = game_obj.get("visitor_in_bonus")
 
+    return (
+        game_id,
+        game_dt,
+        home_id,
+        away_id,
+        str(season),
+        None,  # gamenumber (optional / not used yet)
+        home_score,
+        visitor_score,
+        status,
+        period,
+        game_datetime,
+        time_str,
+        postseason,
+        home_q1,
+        home_q2,
+        home_q3,
+        home_q4,
+        home_ot1,
+        home_ot2,
+        home_ot3,
+        home_timeouts_remaining,
+        home_in_bonus,
+        visitor_q1,
+        visitor_q2,
+        visitor_q3,
+        visitor_q4,
+        visitor_ot1,
+        visitor_ot2,
+        visitor_ot3,
+        visitor_timeouts_remaining,
+        visitor_in_bonus,
+    ), {
+        "date": game_dt,
+        "hometeamid": home_id,
+        "awayteamid": away_id,
+        "season": str(season),
+        "home_score": home_score,
+        "visitor_score": visitor_score,
+        "status": status,
+        "period": period,
+    }
+
+
+def upsert_games(conn, games: list):
+    """
+    Insert or update the DimGames rows for a batch of /games objects in one
+    transaction, along with their calendar rows and teams.
+    """
+    if not games:
+        return
+    ingest_state.ensure_state_tables(conn)
     cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimgames
-            (gameid, date, hometeamid, awayteamid, season, gamenumber,
-             home_score, visitor_score, status, period,
-             datetime, "time", postseason,
-             home_q1, home_q2, home_q3, home_q4,
-             home_ot1, home_ot2, home_ot3,
-             home_timeouts_remaining, home_in_bonus,
-             visitor_q1, visitor_q2, visitor_q3, visitor_q4,
-             visitor_ot1, visitor_ot2, visitor_ot3,
-             visitor_timeouts_remaining, visitor_in_bonus)
-        VALUES
-            (%s,%s,%s,%s,%s,%s,
-             %s,%s,%s,%s,
-             %s,%s,%s,
-             %s,%s,%s,%s,
-             %s,%s,%s,
-             %s,%s,
-             %s,%s,%s,%s,
-             %s,%s,%s,
-             %s,%s)
-        ON CONFLICT (gameid) DO UPDATE
-        SET date          = EXCLUDED.date,
-            hometeamid    = EXCLUDED.hometeamid,
-            awayteamid    = EXCLUDED.awayteamid,
-            season        = EXCLUDED.season,
-            home_score    = EXCLUDED.home_score,
-            visitor_score = EXCLUDED.visitor_score,
-            status        = EXCLUDED.status,
-            period        = EXCLUDED.period,
-            datetime      = EXCLUDED.datetime,
-            "time"        = EXCLUDED."time",
-            postseason    = EXCLUDED.postseason,
-            home_q1       = EXCLUDED.home_q1,
-            home_q2       = EXCLUDED.home_q2,
-            home_q3       = EXCLUDED.home_q3,
-            home_q4       = EXCLUDED.home_q4,
-            home_ot1      = EXCLUDED.home_ot1,
-            home_ot2      = EXCLUDED.home_ot2,
-            home_ot3      = EXCLUDED.home_ot3,
-            home_timeouts_remaining = EXCLUDED.home_timeouts_remaining,
-            home_in_bonus = EXCLUDED.home_in_bonus,
-            visitor_q1    = EXCLUDED.visitor_q1,
-            visitor_q2    = EXCLUDED.visitor_q2,
-            visitor_q3    = EXCLUDED.visitor_q3,
-            visitor_q4    = EXCLUDED.visitor_q4,
-            visitor_ot1   = EXCLUDED.visitor_ot1,
-            visitor_ot2   = EXCLUDED.visitor_ot2,
-            visitor_ot3   = EXCLUDED.visitor_ot3,
-            visitor_timeouts_remaining = EXCLUDED.visitor_timeouts_remaining,
-            visitor_in_bonus          = EXCLUDED.visitor_in_bonus;
-        """,
-        (
-            game_id,
-            game_dt,
-            home_id,
-            away_id,
-            str(season),
-            None,  # gamenumber (optional / not used yet)
-            home_score,
-            visitor_score,
-            status,
-            period,
-            game_datetime,
-            time_str,
-            postseason,
-            home_q1,
-            home_q2,
-            home_q3,
-            home_q4,
-            home_ot1,
-            home_ot2,
-            home_ot3,
-            home_timeouts_remaining,
-            home_in_bonus,
-            visitor_q1,
-            visitor_q2,
-            visitor_q3,
-            visitor_q4,
-            visitor_ot1,
-            visitor_ot2,
-            visitor_ot3,
-            visitor_timeouts_remaining,
-            visitor_in_bonus,
-        ),
-    )
-    conn.commit()
-    cur.close()
+    try:
+        pending = dimensions.ensure_calendar(conn, games, commit=False)
+        pending += dimensions.upsert_teams(
+            conn, [t for g in games for t in (g["home_team"], g["visitor_team"])], commit=False
+        )
+        before = ingest_state.game_results(cur, [g["id"] for g in games])
+        statement = prepare_statement(conn, "upsert_game", UPSERT_GAME_SQL)
+        for g in games:
+            params, attrs = _game_row(g)
+            cur.execute(statement, params)
+            pending.append(("games", g["id"], attrs, False))
+        # scores / final status feed FactTeamGame's winflag and margin; only a
+        # change to them makes the game's FactTeamGame rows stale
+        ingest_state.mark_changed_games_dirty(cur, before)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    dimensions.get_cache(conn).remember_all(pending)
+
+
+def upsert_game(conn, game_obj: dict):
+    """Insert or update one DimGames row from a /games object."""
+    upsert_games(conn, [game_obj])
 
 
 # ------------- CLI date handling -----------------
@@ -299,7 +238,11 @@ def get_date_range_from_args():
     Parse --start-date / --end-date from CLI.
     - If both provided, use that range (inclusive).
     - If only one provided, use it for both (single day).
-    - If none provided, default to yesterday only (for daily job).
+    - If none provided, return (None, None): main resumes from the DimGames
+      watermark (yesterday only on the first run).
+
+    Returns (start_date_str, end_date_str, args) so callers can read the
+    other options (e.g. --concurrency).
     """
     parser = argparse.ArgumentParser(
         description="Ingest NBA games from balldontlie into DimGames"
@@ -307,13 +250,14 @@ def get_date_range_from_args():
     parser.add_argument(
         "--start-date",
         type=str,
-        help="Start date (YYYY-MM-DD). If omitted, defaults to yesterday.",
+        help="Start date (YYYY-MM-DD). If omitted, resumes from the DimGames watermark.",
     )
     parser.add_argument(
         "--end-date",
         type=str,
         help="End date (YYYY-MM-DD). If omitted, defaults to same as start-date.",
     )
+    fetch_engine.add_fetch_args(parser)
 
     args = parser.parse_args()
 
@@ -327,46 +271,87 @@ def get_date_range_from_args():
         start_date_str = args.end_date
         end_date_str = args.end_date
     else:
-        # Default: yesterday only
-        yday = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
-        start_date_str = yday
-        end_date_str = yday
+        # Default: resume from watermark (resolved in main once we have a connection)
+        start_date_str = None
+        end_date_str = None
 
-    return start_date_str, end_date_str
+    return start_date_str, end_date_str, args
 
 
-# ------------- Main -----------------
+def load_games_for_date(conn, target_date_str: str, games: list):
+    """Upsert one date's worth of fetched games into DimGames."""
+    print(f"\n===== Loading games for {target_date_str} =====")
+    print(f"Got {len(games)} games for {target_date_str}.")
 
+    # the date's calendar rows, teams and games go in one transaction
+    upsert_games(conn, games)
 
-def main():
-    # Get date range from CLI (or default to yesterday)
-    start_date_str, end_date_str = get_date_range_from_args()
-    print(f"Using game date range: {start_date_str} to {end_date_str}")
+    print(f"Finished upserting games for {target_date_str}.")
 
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
 
-    conn = get_connection()
+def load_games_for_dates(conn, date_batch: list, games: list):
+    """Split a multi-date games fetch back out by game date and load each date."""
+    by_date = split_rows_by_date(games, date_batch, lambda g: g.get("date"))
+    for target_date_str in date_batch:
+        load_games_for_date(conn, target_date_str, by_date[target_date_str])
+
 
-    current_date = start_date
-    while current_date <= end_date:
-        target_date_str = current_date.strftime("%Y-%m-%d")
-        print(f"\n===== Loading games for {target_date_str} =====")
+# ------------- Main -----------------
+
+
+def run_games_range(conn, start_date, end_date,
+                    concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+                    batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS):
+    """
+    Load DimGames for start_date..end_date (inclusive) without touching the
+    watermark. Returns the dates that failed.
+    """
+    print(f"Using game date range: {start_date} to {end_date}")
+
+    # pages stream from the fetchers straight into load_games_for_dates; each
+    # batch resumes from its pagination checkpoint if an earlier run failed
+    pages = ingest_state.ResumablePages(conn, f"{BASE_URL}/games", dates_params)
+    failed = pipeline.run(
+        chunk_dates(date_strings(start_date, end_date), batch_days),
+        pages.pages,
+        lambda batch, games: load_games_for_dates(conn, batch, games),
+        checkpoint_fn=pages.checkpoint,
+        concurrency=concurrency,
+        label="games",
+    )
+    return failed_batch_dates(failed)
 
-        try:
-            games = fetch_games_for_date(target_date_str)
-            print(f"Got {len(games)} games for {target_date_str}.")
 
-            for g in games:
-                upsert_game(conn, g)
+def run(conn, start_date: date | None = None, end_date: date | None = None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+        batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS):
+    """
+    run_games_range plus the DimGames watermark: with no dates, resume from
+    the watermark (yesterday only on the first run). Returns the failed dates.
+    """
+    if start_date is None:
+        yday = date.today() - timedelta(days=1)
+        start_date, end_date = ingest_state.resume_range(conn, "dimgames", yday, yday)
+
+    failed_dates = run_games_range(conn, start_date, end_date,
+                                   concurrency=concurrency, batch_days=batch_days)
+    ingest_state.advance_watermark(conn, "dimgames", start_date, end_date, failed_dates)
+    return failed_dates
 
-            print(f"Finished upserting games for {target_date_str}.")
-        except Exception as e:
-            print(f"Error while processing games for {target_date_str}: {e}")
 
-        current_date += timedelta(days=1)
+def main():
+    # Get date range from CLI (or resume from the watermark)
+    start_date_str, end_date_str, args = get_date_range_from_args()
+
+    start_date = end_date = None
+    if start_date_str is not None:
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
 
+    conn = get_connection()
+    run(conn, start_date, end_date, concurrency=args.concurrency, batch_days=args.batch_days)
     conn.close()
+    bdl_client.stats.print_summary()
     print("\nAll games upserted into DimGames for selected range.")
 
 
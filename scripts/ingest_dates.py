@@ -0,0 +1,127 @@
+from datetime import date, datetime, timedelta
+
+import bdl_client
+
+# Date helpers shared by the date-range ingest drivers.
+
+
+def date_strings(start_date: date, end_date: date):
+    """Return every date from start_date to end_date (inclusive) as 'YYYY-MM-DD' strings."""
+    out = []
+    current = start_date
+    while current <= end_date:
+        out.append(current.strftime("%Y-%m-%d"))
+        current += timedelta(days=1)
+    return out
+
+
+def chunk_dates(date_strs, batch_size: int):
+    """Split a list of date strings into consecutive batches of at most batch_size dates."""
+    batch_size = max(1, batch_size)
+    date_strs = list(date_strs)
+    return [date_strs[i:i + batch_size] for i in range(0, len(date_strs), batch_size)]
+
+
+def dates_params(date_strs):
+    """Query params for a multi-date dates[] request (?dates[]=YYYY-MM-DD&dates[]=...)."""
+    return {"dates[]": list(date_strs)}
+
+
+def game_date_str(raw_date):
+    """Normalize an API date ('2024-01-20' or '2024-01-20T00:00:00.000Z') to 'YYYY-MM-DD'."""
+    if not raw_date:
+        return None
+    return raw_date[:10]
+
+
+def split_rows_by_date(rows, date_batch, date_fn):
+    """
+    Split rows from a multi-date query back out by game date.
+
+    Returns {date_str: [rows]} with an entry (possibly empty) for every date
+    in date_batch. Rows whose date_fn(row) is missing or outside the batch
+    are kept under the batch's first date so nothing gets dropped.
+    """
+    by_date = {d: [] for d in date_batch}
+    for row in rows:
+        d = game_date_str(date_fn(row))
+        if d not in by_date:
+            d = date_batch[0]
+        by_date[d].append(row)
+    return by_date
+
+
+# ------------- Schedule-aware filtering -----------------
+
+
+def add_schedule_arg(parser):
+    """Add the standard --all-dates option (disables schedule filtering)."""
+    parser.add_argument(
+        "--all-dates",
+        action="store_true",
+        help="Query every date in the range instead of only dates with games on the schedule.",
+    )
+
+
+def game_dates_from_db(conn, start_date: date, end_date: date):
+    """
+    Return (set of 'YYYY-MM-DD' dates with games in DimGames within the range,
+    latest game date in DimGames overall or None).
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT date
+        FROM dimgames
+        WHERE date BETWEEN %s AND %s;
+    """, (start_date, end_date))
+    dates = {r[0].strftime("%Y-%m-%d") for r in cur.fetchall()}
+    cur.execute("SELECT MAX(date) FROM dimgames;")
+    max_date = cur.fetchone()[0]
+    cur.close()
+    return dates, max_date
+
+
+def fetch_game_dates(start_date: date, end_date: date):
+    """Fetch the set of dates with games from /games (one paginated range query)."""
+    params = {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+    }
+    print(f"Schedule lookup for {params['start_date']}..{params['end_date']}")
+    dates = set()
+    for g in bdl_client.iter_rows(f"{bdl_client.BASE_URL_V1}/games", params):
+        d = game_date_str(g.get("date"))
+        if d:
+            dates.add(d)
+    return dates
+
+
+def filter_to_game_dates(conn, date_strs):
+    """
+    Keep only the dates that have games on the schedule.
+
+    DimGames is the index for every date it covers. Dates after the latest
+    game date in DimGames (a fresh DB, or games_ingest hasn't run yet) are
+    looked up once from /games instead.
+    """
+    date_strs = list(date_strs)
+    if not date_strs:
+        return []
+
+    start_date = datetime.strptime(date_strs[0], "%Y-%m-%d").date()
+    end_date = datetime.strptime(date_strs[-1], "%Y-%m-%d").date()
+
+    game_dates, max_known = game_dates_from_db(conn, start_date, end_date)
+
+    if max_known is None or max_known < end_date:
+        tail_start = start_date if max_known is None else max(start_date, max_known + timedelta(days=1))
+        game_dates |= fetch_game_dates(tail_start, end_date)
+
+    kept = [d for d in date_strs if d in game_dates]
+    print(f"Schedule filter: {len(kept)} of {len(date_strs)} dates have games.")
+    return kept
+
+
+def failed_batch_dates(failed_batches):
+    """Flatten the failed date batches returned by pipeline.run into date objects."""
+    return [datetime.strptime(d, "%Y-%m-%d").date() for batch in failed_batches for d in batch]
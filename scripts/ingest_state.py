@@ -0,0 +1,381 @@
+import json
+import os
+from datetime import date, timedelta
+
+from psycopg2.extras import execute_values
+
+import bdl_client
+
+# Ingest bookkeeping tables.
+#
+# IngestWatermarks holds, for each target table, the last date that was fully
+# ingested (every date up to and including it loaded without error). Scripts
+# run with no date arguments resume from the day after their watermark, so
+# daily runs only touch new data. Tracked tables: factplayergame,
+# factplayeradvanced, dimgames, factodds, factplayerprops.
+#
+# DirtyGames is the queue of games whose FactTeamGame rows are stale: the
+# player-log and games ingests add every gameid they write, in the same
+# transaction as the rows themselves, and team_game_aggregate's incremental
+# mode re-aggregates exactly those games and clears them.
+#
+# PropWatermarks holds, per game and vendor, the newest prop updated_at
+# props_ingest has written, so intraday runs can skip props that haven't
+# moved since the last run.
+#
+# RebuildShards checkpoints full_rebuild's sharded mode: one row per
+# (stage, shard), where a shard is a season or month of history. A shard is
+# marked done only once its stage loaded every date without error, so a
+# resumed rebuild skips those and redoes the rest.
+#
+# PaginationCheckpoints holds, per endpoint and filter (the query params),
+# the next_cursor after the last page that was written, so a rerun after a
+# failure carries on from there instead of re-downloading from the first
+# page. A checkpoint is cleared once its pagination completes, and ignored
+# once it is older than CHECKPOINT_TTL_HOURS (the pages before it may have
+# changed since).
+
+CHECKPOINT_TTL_HOURS = float(os.getenv("NBA_CHECKPOINT_TTL_HOURS", "12"))
+
+_state_tables_ready = False
+
+
+def ensure_state_tables(conn):
+    global _state_tables_ready
+    if _state_tables_ready:
+        return
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingestwatermarks (
+            tablename  TEXT PRIMARY KEY,
+            lastdate   DATE,
+            lastcursor TEXT,
+            updatedat  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dirtygames (
+            gameid   BIGINT PRIMARY KEY,
+            markedat TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rebuildshards (
+            stage      TEXT        NOT NULL,
+            shard      TEXT        NOT NULL,
+            startdate  DATE,
+            enddate    DATE,
+            status     TEXT        NOT NULL DEFAULT 'pending',
+            attempts   INT         NOT NULL DEFAULT 0,
+            lasterror  TEXT,
+            startedat  TIMESTAMPTZ,
+            finishedat TIMESTAMPTZ,
+            PRIMARY KEY (stage, shard)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS paginationcheckpoints (
+            endpoint   TEXT        NOT NULL,
+            filterkey  TEXT        NOT NULL,
+            nextcursor TEXT        NOT NULL,
+            updatedat  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (endpoint, filterkey)
+        );
+    """)
+    conn.commit()
+    cur.close()
+    _state_tables_ready = True
+
+
+def get_watermark(conn, table_name: str):
+    """Return (last_date, last_cursor) for a table, or (None, None) if it has never been recorded."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT lastdate, lastcursor
+        FROM ingestwatermarks
+        WHERE tablename = %s;
+    """, (table_name,))
+    row = cur.fetchone()
+    cur.close()
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
+def set_watermark(conn, table_name: str, last_date: date, last_cursor: str | None = None):
+    """Record last_date for a table. The watermark never moves backwards."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO ingestwatermarks (tablename, lastdate, lastcursor, updatedat)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (tablename) DO UPDATE
+        SET lastdate   = GREATEST(ingestwatermarks.lastdate, EXCLUDED.lastdate),
+            lastcursor = EXCLUDED.lastcursor,
+            updatedat  = EXCLUDED.updatedat;
+    """, (table_name, last_date, last_cursor))
+    conn.commit()
+    cur.close()
+
+
+def resume_range(conn, table_name: str, default_start: date, default_end: date):
+    """
+    Date range for a run with no explicit dates: the day after the table's
+    watermark through yesterday, or (default_start, default_end) if the table
+    has no watermark yet. start > end means there is nothing new to load.
+    """
+    last_date, _ = get_watermark(conn, table_name)
+    if last_date is None:
+        print(f"No watermark for {table_name}; using default range {default_start} to {default_end}.")
+        return default_start, default_end
+
+    start_date = last_date + timedelta(days=1)
+    end_date = date.today() - timedelta(days=1)
+    print(f"Resuming {table_name} from watermark {last_date}: {start_date} to {end_date}.")
+    return start_date, end_date
+
+
+def advance_watermark(conn, table_name: str, start_date: date, end_date: date, failed_dates=()):
+    """
+    Move a table's watermark forward after a run over start_date..end_date.
+
+    The new watermark is the last date before the first failure, capped at
+    yesterday (today's games may still be in progress). It is only advanced
+    if the run picked up where the watermark left off, so an explicit run
+    over a later range never hides a gap.
+    """
+    cutoff = min(end_date, date.today() - timedelta(days=1))
+    failed = sorted(failed_dates)
+    if failed:
+        cutoff = min(cutoff, failed[0] - timedelta(days=1))
+    if cutoff < start_date:
+        return
+
+    last_date, _ = get_watermark(conn, table_name)
+    if last_date is not None and start_date > last_date + timedelta(days=1):
+        print(f"Not advancing {table_name} watermark: run started at {start_date}, "
+              f"watermark is {last_date}.")
+        return
+
+    set_watermark(conn, table_name, cutoff)
+    print(f"{table_name} watermark advanced to {cutoff}.")
+
+
+# ---------- Dirty-games queue ----------
+
+
+def mark_games_dirty(cur, game_ids):
+    """
+    Queue games for FactTeamGame re-aggregation. Runs on the caller's cursor
+    and does NOT commit, so the mark lands in the same transaction as the
+    rows that made the game stale (call ensure_state_tables first).
+    Re-marking a queued game bumps its markedat (see clear_dirty_games).
+    """
+    ids = sorted(set(game_ids))
+    if not ids:
+        return
+    execute_values(cur, """
+        INSERT INTO dirtygames (gameid, markedat)
+        VALUES %s
+        ON CONFLICT (gameid) DO UPDATE
+        SET markedat = EXCLUDED.markedat;
+    """, [(gid,) for gid in ids], template="(%s, NOW())")
+
+
+# DimGames columns FactTeamGame reads (opponent, winflag, margin, ranges)
+_GAME_RESULT_COLUMNS = "date, hometeamid, awayteamid, home_score, visitor_score, status"
+
+
+def game_results(cur, game_ids):
+    """{gameid: (date, teams, scores, status)} for the games already in DimGames."""
+    ids = sorted(set(game_ids))
+    if not ids:
+        return {}
+    cur.execute(f"""
+        SELECT gameid, {_GAME_RESULT_COLUMNS}
+        FROM dimgames
+        WHERE gameid = ANY(%s);
+    """, (ids,))
+    return {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+
+
+def mark_changed_games_dirty(cur, before: dict):
+    """
+    After a DimGames write, queue the games whose results differ from
+    `before` (game_results taken before the write, in the same transaction).
+    New games aren't queued: they have no player stats to aggregate yet, and
+    the stats writers queue them when those land. Returns the queued ids.
+    """
+    after = game_results(cur, before)
+    changed = [gid for gid, results in after.items() if before[gid] != results]
+    mark_games_dirty(cur, changed)
+    return changed
+
+
+def claim_dirty_games(cur):
+    """
+    Remove and return every queued gameid, inside the caller's transaction.
+    If the transaction rolls back the games stay queued; a game re-marked
+    while the claim is in flight waits for it and is queued again afterwards.
+    """
+    cur.execute("DELETE FROM dirtygames RETURNING gameid;")
+    return sorted(r[0] for r in cur.fetchall())
+
+
+def snapshot_dirty_games(cur):
+    """
+    Every queued (gameid, markedat), left in the queue. Pair with
+    clear_dirty_games once the work covering them has landed.
+    """
+    cur.execute("SELECT gameid, markedat FROM dirtygames;")
+    return cur.fetchall()
+
+
+def clear_dirty_games(cur, snapshot):
+    """
+    Remove the snapshot's games from the queue, inside the caller's
+    transaction, unless they were re-marked since (markedat moved on); those
+    stay queued for the next run.
+    """
+    if not snapshot:
+        return
+    execute_values(cur, """
+        DELETE FROM dirtygames d
+        USING (VALUES %s) AS s (gameid, markedat)
+        WHERE d.gameid = s.gameid
+          AND d.markedat = s.markedat;
+    """, snapshot, template="(%s::bigint, %s::timestamptz)")
+
+
+# ---------- Rebuild shard checkpoints ----------
+
+
+def plan_shards(conn, shards):
+    """
+    Record the (stage, shard, start_date, end_date) shards of a sharded
+    rebuild. Shards already recorded keep their status unless their date
+    range changed, in which case they start over as pending.
+    """
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    execute_values(cur, """
+        INSERT INTO rebuildshards (stage, shard, startdate, enddate)
+        VALUES %s
+        ON CONFLICT (stage, shard) DO UPDATE
+        SET startdate = EXCLUDED.startdate,
+            enddate   = EXCLUDED.enddate,
+            status    = 'pending'
+        WHERE (rebuildshards.startdate, rebuildshards.enddate)
+              IS DISTINCT FROM (EXCLUDED.startdate, EXCLUDED.enddate);
+    """, list(shards))
+    conn.commit()
+    cur.close()
+
+
+def done_shards(conn):
+    """Return the set of (stage, shard) pairs checkpointed as done."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT stage, shard FROM rebuildshards WHERE status = 'done';")
+    done = set(cur.fetchall())
+    cur.close()
+    return done
+
+
+def mark_shard(conn, stage: str, shard: str, status: str, error: str | None = None):
+    """Set a shard's status: 'running' (counts an attempt), 'done' or 'failed'."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE rebuildshards
+        SET status     = %(status)s,
+            attempts   = attempts + CASE WHEN %(status)s = 'running' THEN 1 ELSE 0 END,
+            lasterror  = %(error)s,
+            startedat  = CASE WHEN %(status)s = 'running' THEN NOW() ELSE startedat END,
+            finishedat = CASE WHEN %(status)s = 'running' THEN NULL ELSE NOW() END
+        WHERE stage = %(stage)s
+          AND shard = %(shard)s;
+    """, {"stage": stage, "shard": shard, "status": status, "error": error})
+    conn.commit()
+    cur.close()
+
+
+# ---------- Pagination checkpoints ----------
+
+
+def filter_key(params) -> str:
+    """Stable text key for a query's params (cursor and per_page excluded)."""
+    params = {k: v for k, v in (params or {}).items() if k not in ("cursor", "per_page")}
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def get_pagination_checkpoints(conn, endpoint: str):
+    """Return {filter key: next_cursor} for an endpoint's unexpired checkpoints."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT filterkey, nextcursor
+        FROM paginationcheckpoints
+        WHERE endpoint = %s
+          AND updatedat > NOW() - make_interval(secs => %s);
+    """, (endpoint, CHECKPOINT_TTL_HOURS * 3600))
+    checkpoints = dict(cur.fetchall())
+    cur.close()
+    return checkpoints
+
+
+def save_pagination_checkpoint(conn, endpoint: str, key: str, next_cursor):
+    """Record the cursor to resume (endpoint, key) from; None clears it (pagination complete)."""
+    ensure_state_tables(conn)
+    cur = conn.cursor()
+    try:
+        if next_cursor is None:
+            cur.execute("""
+                DELETE FROM paginationcheckpoints
+                WHERE endpoint = %s
+                  AND filterkey = %s;
+            """, (endpoint, key))
+        else:
+            cur.execute("""
+                INSERT INTO paginationcheckpoints (endpoint, filterkey, nextcursor, updatedat)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (endpoint, filterkey) DO UPDATE
+                SET nextcursor = EXCLUDED.nextcursor,
+                    updatedat  = EXCLUDED.updatedat;
+            """, (endpoint, key, str(next_cursor)))
+        conn.commit()
+    except Exception:
+        # the checkpoint shares the writer's connection: don't leave it in an
+        # aborted transaction for the next batch
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+class ResumablePages:
+    """
+    bdl_client.paginate for many keys of one endpoint (date batches, games,
+    ...), each resuming from its pagination checkpoint. Hand .pages and
+    .checkpoint to pipeline.run as pages_fn and checkpoint_fn; checkpoints
+    are read up front and written on the caller's (writer's) connection.
+    """
+
+    def __init__(self, conn, url: str, params_fn, allow_404: bool = False):
+        self.conn = conn
+        self.url = url
+        self.params_fn = params_fn
+        self.allow_404 = allow_404
+        self.endpoint = bdl_client.endpoint_for(url)
+        self.cursors = get_pagination_checkpoints(conn, self.endpoint)
+
+    def pages(self, key):
+        params = self.params_fn(key)
+        cursor = self.cursors.get(filter_key(params))
+        if cursor:
+            print(f"Resuming {self.endpoint} {params} from checkpoint cursor {cursor}")
+        return bdl_client.paginate(self.url, params, allow_404=self.allow_404, cursor=cursor)
+
+    def checkpoint(self, key, next_cursor):
+        save_pagination_checkpoint(self.conn, self.endpoint, filter_key(self.params_fn(key)), next_cursor)
@@ -1,192 +1,208 @@
-import requests
-from datetime import datetime
-from db_connection import get_connection
+from psycopg2.extras import execute_values
+from db_connection import get_connection, add_column_if_missing
+import bdl_client
+import dimensions
 
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-BASE_URL = "https://api.balldontlie.io/v1"
+BASE_URL = bdl_client.BASE_URL_V1
 INJURIES_URL = f"{BASE_URL}/player_injuries"
 
-HEADERS = {
-    "Authorization": API_KEY
-}
 
+# ---------- FactInjuries snapshot + history ----------
+#
+# FactInjuries holds the current injury list (one row per player):
+# pulledat is the last pull that saw the entry, changedat the last pull that
+# changed it.
+# FactInjuriesHistory keeps every version of every entry with the interval
+# it was current for: validto IS NULL marks the open (current) version.
+# "Who was out on date X" is a GiST lookup on tstzrange(validfrom, validto),
+# see injuries_as_of.
 
-# ---------- Helpers to keep DimPlayers up to date ----------
+_history_table_ready = False
 
-def parse_height(height_str: str):
-    if not height_str:
-        return None
-    try:
-        parts = height_str.split("-")
-        feet = int(parts[0])
-        inches = int(parts[1]) if len(parts) > 1 else 0
-        return feet * 12 + inches
-    except Exception:
-        return None
+
+def ensure_history_table(conn):
+    global _history_table_ready
+    if _history_table_ready:
+        return
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS factinjurieshistory (
+            playerid       BIGINT      NOT NULL,
+            teamid         BIGINT,
+            status         TEXT,
+            returndatetext TEXT,
+            description    TEXT,
+            validfrom      TIMESTAMPTZ NOT NULL,
+            validto        TIMESTAMPTZ,
+            PRIMARY KEY (playerid, validfrom)
+        );
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS factinjurieshistory_open_idx
+        ON factinjurieshistory (playerid)
+        WHERE validto IS NULL;
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS factinjurieshistory_valid_idx
+        ON factinjurieshistory USING gist (tstzrange(validfrom, validto));
+    """)
+    add_column_if_missing(cur, "factinjuries", "changedat", "TIMESTAMPTZ")
+    conn.commit()
+    cur.close()
+    _history_table_ready = True
 
 
-def to_int_or_none(v):
-    try:
-        return int(v) if v is not None else None
-    except Exception:
-        return None
+def fetch_injury_snapshot():
+    """
+    Fetch the full player_injuries list (cursor-based pagination).
+    Returns {playerid: injury object}; nothing is written.
+    """
+    snapshot = {}
+    for inj in bdl_client.iter_rows(INJURIES_URL):
+        snapshot[inj["player"]["id"]] = inj
+    return snapshot
 
 
-def ensure_player(conn, player_obj: dict):
+def refresh_injuries(conn):
     """
-    Upsert player into DimPlayers using the injury player's object.
-    Similar to what we did in advanced_stats_ingest.
+    Refresh FactInjuries / FactInjuriesHistory with the current
+    player_injuries snapshot.
+
+    The whole snapshot is fetched before anything is written, then diffed
+    against the open history rows in one transaction: entries that changed
+    or disappeared are closed, new and changed entries are opened, and
+    FactInjuries is brought in line. Readers keep seeing the previous list
+    until the commit, and if the API fails nothing changes at all.
     """
-    player_id = player_obj["id"]
-    first = player_obj.get("first_name") or ""
-    last = player_obj.get("last_name") or ""
-    name = f"{first} {last}".strip()
-
-    team_id = player_obj.get("team_id")
-    position = player_obj.get("position") or ""
-    height_in = parse_height(player_obj.get("height"))
-    weight_lb = to_int_or_none(player_obj.get("weight"))
-    jersey_number = player_obj.get("jersey_number")
-    college = player_obj.get("college")
-    country = player_obj.get("country")
-    draft_round = to_int_or_none(player_obj.get("draft_round"))
-    draft_number = to_int_or_none(player_obj.get("draft_number"))
-    draft_year = to_int_or_none(player_obj.get("draft_year"))
+    snapshot = fetch_injury_snapshot()
+    ensure_history_table(conn)
+
+    rows = []
+    for player_id, inj in sorted(snapshot.items()):
+        rows.append((
+            player_id,
+            inj["player"].get("team_id"),
+            inj.get("status"),
+            inj.get("return_date"),  # string like "Nov 17"
+            inj.get("description"),
+        ))
 
     cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dimplayers
-            (playerid, playername, teamid, position,
-             height, weight, birthdate, yearsexperience, activeflag,
-             country, college, draft_round, draft_number, draft_year, jersey_number)
-        VALUES
-            (%s,%s,%s,%s,
-             %s,%s,%s,%s,%s,
-             %s,%s,%s,%s,%s,%s)
-        ON CONFLICT (playerid) DO UPDATE
-        SET playername     = EXCLUDED.playername,
-            teamid         = COALESCE(EXCLUDED.teamid, dimplayers.teamid),
-            position       = EXCLUDED.position,
-            height         = COALESCE(EXCLUDED.height, dimplayers.height),
-            weight         = COALESCE(EXCLUDED.weight, dimplayers.weight),
-            country        = COALESCE(EXCLUDED.country, dimplayers.country),
-            college        = COALESCE(EXCLUDED.college, dimplayers.college),
-            draft_round    = COALESCE(EXCLUDED.draft_round, dimplayers.draft_round),
-            draft_number   = COALESCE(EXCLUDED.draft_number, dimplayers.draft_number),
-            draft_year     = COALESCE(EXCLUDED.draft_year, dimplayers.draft_year),
-            jersey_number  = COALESCE(EXCLUDED.jersey_number, dimplayers.jersey_number),
-            activeflag     = COALESCE(dimplayers.activeflag, TRUE);
-    """, (
-        player_id,
-        name,
-        team_id,
-        position,
-        height_in,
-        weight_lb,
-        None,   # birthdate
-        None,   # yearsexperience
-        True,
-        country,
-        college,
-        draft_round,
-        draft_number,
-        draft_year,
-        jersey_number,
-    ))
-    conn.commit()
-    cur.close()
-
-    return player_id, team_id
+    try:
+        # keep DimPlayers up to date in the same transaction
+        pending = dimensions.upsert_players(conn, [inj["player"] for inj in snapshot.values()],
+                                            commit=False)
+
+        cur.execute("""
+            CREATE TEMP TABLE injuries_snapshot (
+                playerid       BIGINT PRIMARY KEY,
+                teamid         BIGINT,
+                status         TEXT,
+                returndatetext TEXT,
+                description    TEXT
+            ) ON COMMIT DROP;
+        """)
+        if rows:
+            execute_values(cur, """
+                INSERT INTO injuries_snapshot
+                    (playerid, teamid, status, returndatetext, description)
+                VALUES %s;
+            """, rows, page_size=1000)
+
+        # close open versions that were removed or changed
+        cur.execute("""
+            UPDATE factinjurieshistory h
+            SET validto = NOW()
+            WHERE h.validto IS NULL
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM injuries_snapshot s
+                  WHERE s.playerid = h.playerid
+                    AND (s.teamid, s.status, s.returndatetext, s.description)
+                        IS NOT DISTINCT FROM
+                        (h.teamid, h.status, h.returndatetext, h.description)
+              );
+        """)
+        closed = cur.rowcount
+
+        # open a version for every entry without one (new or just closed)
+        cur.execute("""
+            INSERT INTO factinjurieshistory
+                (playerid, teamid, status, returndatetext, description, validfrom, validto)
+            SELECT s.playerid, s.teamid, s.status, s.returndatetext, s.description, NOW(), NULL
+            FROM injuries_snapshot s
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM factinjurieshistory h
+                WHERE h.playerid = s.playerid
+                  AND h.validto IS NULL
+            );
+        """)
+        opened = cur.rowcount
+
+        # current view: drop players who are off the list, upsert the rest
+        # (pulledat on every pull, changedat only when the entry changed)
+        cur.execute("""
+            DELETE FROM factinjuries f
+            WHERE NOT EXISTS (
+                SELECT 1 FROM injuries_snapshot s WHERE s.playerid = f.playerid
+            );
+        """)
+        cur.execute("""
+            INSERT INTO factinjuries
+                (playerid, teamid, status, returndatetext, description, pulledat, changedat)
+            SELECT playerid, teamid, status, returndatetext, description, NOW(), NOW()
+            FROM injuries_snapshot
+            ON CONFLICT (playerid) DO UPDATE
+            SET teamid         = EXCLUDED.teamid,
+                status         = EXCLUDED.status,
+                returndatetext = EXCLUDED.returndatetext,
+                description    = EXCLUDED.description,
+                pulledat       = EXCLUDED.pulledat,
+                changedat      = CASE
+                    WHEN (factinjuries.teamid, factinjuries.status,
+                          factinjuries.returndatetext, factinjuries.description)
+                         IS DISTINCT FROM
+                         (EXCLUDED.teamid, EXCLUDED.status,
+                          EXCLUDED.returndatetext, EXCLUDED.description)
+                    THEN EXCLUDED.changedat
+                    ELSE COALESCE(factinjuries.changedat, factinjuries.pulledat)
+                END;
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
 
+    dimensions.get_cache(conn).remember_all(pending)
+    print(f"Finished refreshing FactInjuries: {len(rows)} current entries, "
+          f"{opened} opened / {closed} closed in history.")
 
-# ---------- FactInjuries insert/refresh ----------
 
-def refresh_injuries(conn):
+def injuries_as_of(conn, when):
     """
-    Refresh FactInjuries with the current player_injuries snapshot.
-    Uses cursor-based pagination.
+    Injury entries that were current at `when` (a date or datetime), as
+    (playerid, teamid, status, returndatetext, description) rows.
     """
     cur = conn.cursor()
-    # Wipe out old snapshot
-    cur.execute("TRUNCATE TABLE factinjuries;")
-    conn.commit()
+    cur.execute("""
+        SELECT playerid, teamid, status, returndatetext, description
+        FROM factinjurieshistory
+        WHERE tstzrange(validfrom, validto) @> %s::timestamptz
+        ORDER BY playerid;
+    """, (when,))
+    rows = cur.fetchall()
     cur.close()
-
-    per_page = 100
-    cursor_val = None
-    page_idx = 1
-
-    total_rows = 0
-
-    while True:
-        params = {
-            "per_page": per_page,
-        }
-        if cursor_val is not None:
-            params["cursor"] = cursor_val
-
-        print(f"Calling {INJURIES_URL} with params={params}")
-        resp = requests.get(INJURIES_URL, headers=HEADERS, params=params, timeout=20)
-        print("Status:", resp.status_code)
-        if resp.status_code != 200:
-            print("Body:", resp.text[:300])
-            resp.raise_for_status()
-
-        data = resp.json()
-        injuries = data.get("data", [])
-        meta = data.get("meta", {})
-
-        print(f"Fetched {len(injuries)} injuries on cursor-page {page_idx}. Meta: {meta}")
-
-        if not injuries:
-            print("No injuries on this cursor page. Stopping pagination.")
-            break
-
-        for inj in injuries:
-            player_obj = inj["player"]
-            status = inj.get("status")
-            return_date = inj.get("return_date")  # string like "Nov 17"
-            description = inj.get("description")
-
-            player_id, team_id = ensure_player(conn, player_obj)
-
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO factinjuries
-                    (playerid, teamid, status, returndatetext, description, pulledat)
-                VALUES
-                    (%s,%s,%s,%s,%s, NOW())
-                ON CONFLICT (playerid) DO UPDATE
-                SET teamid         = EXCLUDED.teamid,
-                    status         = EXCLUDED.status,
-                    returndatetext = EXCLUDED.returndatetext,
-                    description    = EXCLUDED.description,
-                    pulledat       = EXCLUDED.pulledat;
-            """, (
-                player_id,
-                team_id,
-                status,
-                return_date,
-                description,
-            ))
-            conn.commit()
-            cur.close()
-            total_rows += 1
-
-        cursor_val = meta.get("next_cursor")
-        if not cursor_val:
-            print("No next_cursor. Reached end of injury list.")
-            break
-
-        page_idx += 1
-
-    print(f"Finished refreshing FactInjuries. Total rows upserted: {total_rows}")
+    return rows
 
 
 def main():
     conn = get_connection()
     refresh_injuries(conn)
     conn.close()
+    bdl_client.stats.print_summary()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,11 @@
-import requests
+import bdl_client
 from pprint import pprint
 
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-HEADERS = {"Authorization": API_KEY}
-
-BASE_URL = "https://api.balldontlie.io/v1"
+BASE_URL = bdl_client.BASE_URL_V1
 
 def get_json(endpoint, params=None):
     url = f"{BASE_URL}/{endpoint}"
-    resp = requests.get(url, headers=HEADERS, params=params or {}, timeout=20)
+    resp = bdl_client.get(url, params=params or {}, timeout=20)
     print(f"\n=== {endpoint} ===")
     print("Status:", resp.status_code)
     if resp.status_code != 200:
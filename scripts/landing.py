@@ -0,0 +1,90 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+from datetime import date, datetime, timezone
+
+# Raw-payload landing zone.
+#
+# Every successful balldontlie response that goes through bdl_client.get is
+# also appended, untouched, to a gzip'd JSONL file:
+#
+#   <NBA_LANDING_DIR>/<endpoint>/dt=<fetch date>/part-<pid>.jsonl.gz
+#
+# one line per page: {"endpoint", "params", "fetched_at", "body"}. Each line
+# is written as its own gzip member, so a file is readable up to the last
+# complete page even if the process dies mid-write, and each process writes
+# its own part file. replay.py rebuilds the warehouse from these files
+# without touching the API.
+#
+# Set NBA_LANDING=off to disable.
+
+LANDING_DIR = os.getenv(
+    "NBA_LANDING_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "landing"),
+)
+ENABLED = os.getenv("NBA_LANDING", "on").lower() not in ("0", "off", "false", "no")
+
+_write_lock = threading.Lock()
+_warned = False
+
+
+def endpoint_dir(endpoint: str) -> str:
+    """Directory for an endpoint, e.g. 'odds/player_props' -> <LANDING_DIR>/odds_player_props."""
+    return os.path.join(LANDING_DIR, endpoint.strip("/").replace("/", "_"))
+
+
+def record(endpoint: str, params, body: str):
+    """Append one raw response page for `endpoint`. Never raises: landing is best effort."""
+    global _warned
+    if not ENABLED:
+        return
+
+    fetched_at = datetime.now(timezone.utc)
+    header = json.dumps({"endpoint": endpoint, "params": params, "fetched_at": fetched_at.isoformat()}, default=str)
+    # JSON never has a raw newline inside a string, so flattening keeps the body intact
+    line = header[:-1] + ', "body": ' + body.replace("\r", " ").replace("\n", " ") + "}\n"
+    path = os.path.join(endpoint_dir(endpoint), f"dt={fetched_at.date()}", f"part-{os.getpid()}.jsonl.gz")
+
+    try:
+        data = gzip.compress(line.encode("utf-8"))
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(data)
+    except OSError as e:
+        if not _warned:
+            print(f"⚠ Could not write to landing zone {LANDING_DIR}: {e}")
+            _warned = True
+
+
+def _read_part(path: str):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        # a page cut off by a crash: everything before it is still good
+        print(f"⚠ Stopped reading {path} at a truncated page: {e}")
+
+
+def records(endpoint: str, start_date: date | None = None, end_date: date | None = None):
+    """
+    Yield the landed pages of `endpoint` in fetch order, optionally limited
+    to pages fetched between start_date and end_date (inclusive). Part files
+    of the same day are merged by fetched_at, one page at a time.
+    """
+    base = endpoint_dir(endpoint)
+    if not os.path.isdir(base):
+        return
+
+    for name in sorted(os.listdir(base)):
+        if not name.startswith("dt="):
+            continue
+        day = datetime.strptime(name[3:], "%Y-%m-%d").date()
+        if (start_date is not None and day < start_date) or (end_date is not None and day > end_date):
+            continue
+        day_dir = os.path.join(base, name)
+        parts = [os.path.join(day_dir, f) for f in sorted(os.listdir(day_dir)) if f.endswith(".jsonl.gz")]
+        yield from heapq.merge(*(_read_part(p) for p in parts), key=lambda r: r["fetched_at"])
@@ -1,16 +1,19 @@
-import requests
 from datetime import datetime, timedelta, date
+from psycopg2.extras import execute_values
 from db_connection import get_connection
+import bdl_client
+import fetch_engine
+import ingest_state
+import pipeline
+from ingest_dates import (
+    date_strings, chunk_dates, dates_params,
+    add_schedule_arg, filter_to_game_dates, failed_batch_dates,
+)
 import argparse
 
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-BASE_URL = "https://api.balldontlie.io/v2"
+BASE_URL = bdl_client.BASE_URL_V2
 ODDS_URL = f"{BASE_URL}/odds"
 
-HEADERS = {
-    "Authorization": API_KEY
-}
-
 
 def parse_float_or_none(val):
     if val is None:
@@ -34,141 +37,346 @@ def parse_timestamp(ts_str: str):
         return None
 
 
-def upsert_odds(conn, odds_obj: dict):
+# Value columns of an odds snapshot, in odds_row order after (gameid, vendor, oddsid).
+ODDS_VALUE_COLUMNS = [
+    "spreadhomevalue", "spreadhomeodds",
+    "spreadawayvalue", "spreadawayodds",
+    "moneylinehomeodds", "moneylineawayodds",
+    "totalvalue", "totaloverodds", "totalunderodds",
+]
+
+UPSERT_ODDS_SQL = """
+    INSERT INTO factodds
+        (gameid, vendor, oddsid,
+         spreadhomevalue, spreadhomeodds,
+         spreadawayvalue, spreadawayodds,
+         moneylinehomeodds, moneylineawayodds,
+         totalvalue, totaloverodds, totalunderodds,
+         updatedat)
+    VALUES %s
+    ON CONFLICT (gameid, vendor) DO UPDATE
+    SET oddsid            = EXCLUDED.oddsid,
+        spreadhomevalue   = EXCLUDED.spreadhomevalue,
+        spreadhomeodds    = EXCLUDED.spreadhomeodds,
+        spreadawayvalue   = EXCLUDED.spreadawayvalue,
+        spreadawayodds    = EXCLUDED.spreadawayodds,
+        moneylinehomeodds = EXCLUDED.moneylinehomeodds,
+        moneylineawayodds = EXCLUDED.moneylineawayodds,
+        totalvalue        = EXCLUDED.totalvalue,
+        totaloverodds     = EXCLUDED.totaloverodds,
+        totalunderodds    = EXCLUDED.totalunderodds,
+        updatedat         = EXCLUDED.updatedat;
+"""
+
+INSERT_ODDS_HISTORY_SQL = """
+    INSERT INTO factoddshistory
+        (gameid, vendor, oddsid,
+         spreadhomevalue, spreadhomeodds,
+         spreadawayvalue, spreadawayodds,
+         moneylinehomeodds, moneylineawayodds,
+         totalvalue, totaloverodds, totalunderodds,
+         updatedat, capturedat)
+    VALUES %s;
+"""
+
+# ---------- Odds history + opening/closing lines ----------
+#
+# FactOddsHistory is the de-duplicated time series per game and vendor: a
+# snapshot is appended only when some value differs from the vendor's
+# previous snapshot for that game. FactOddsLines holds each game/vendor's
+# first and last pre-tipoff snapshot (by the vendor's updated_at); a game's
+# lines are frozen by refresh_odds_lines once its tip-off time has passed,
+# so later (live) snapshots don't move the closing line.
+
+_odds_tables_ready = False
+
+
+def ensure_odds_tables(conn):
+    global _odds_tables_ready
+    if _odds_tables_ready:
+        return
+    value_defs = ",\n".join(
+        f"            {c} {'FLOAT' if c.endswith('value') else 'INTEGER'}" for c in ODDS_VALUE_COLUMNS
+    )
+    line_defs = ",\n".join(
+        f"            {side}{c} {'FLOAT' if c.endswith('value') else 'INTEGER'}"
+        for side in ("open", "close") for c in ODDS_VALUE_COLUMNS
+    )
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS factoddshistory (
+            gameid     BIGINT      NOT NULL,
+            vendor     TEXT        NOT NULL,
+            oddsid     BIGINT,
+{value_defs},
+            updatedat  TIMESTAMPTZ,
+            capturedat TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS factoddshistory_game_vendor_idx
+        ON factoddshistory (gameid, vendor, capturedat);
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS factoddslines (
+            gameid    BIGINT      NOT NULL,
+            vendor    TEXT        NOT NULL,
+{line_defs},
+            openedat  TIMESTAMPTZ,
+            closedat  TIMESTAMPTZ,
+            frozenat  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (gameid, vendor)
+        );
+    """)
+    conn.commit()
+    cur.close()
+    _odds_tables_ready = True
+
+
+def odds_row(odds_obj: dict):
     """
-    Insert/update one odds row into FactOdds.
+    (gameid, vendor, oddsid, <ODDS_VALUE_COLUMNS>, updatedat) for one odds object.
     """
-    odds_id = odds_obj["id"]
-    game_id = odds_obj["game_id"]
-    vendor = odds_obj["vendor"]
+    return (
+        odds_obj["game_id"],
+        odds_obj["vendor"],
+        odds_obj["id"],
+        # API sends spread/total values as strings like "-7.5" or "228.5"
+        parse_float_or_none(odds_obj.get("spread_home_value")),
+        odds_obj.get("spread_home_odds"),
+        parse_float_or_none(odds_obj.get("spread_away_value")),
+        odds_obj.get("spread_away_odds"),
+        odds_obj.get("moneyline_home_odds"),
+        odds_obj.get("moneyline_away_odds"),
+        parse_float_or_none(odds_obj.get("total_value")),
+        odds_obj.get("total_over_odds"),
+        odds_obj.get("total_under_odds"),
+        parse_timestamp(odds_obj.get("updated_at")),
+    )
 
-    spread_home_val = parse_float_or_none(odds_obj.get("spread_home_value"))
-    spread_home_odds = odds_obj.get("spread_home_odds")
-    spread_away_val = parse_float_or_none(odds_obj.get("spread_away_value"))
-    spread_away_odds = odds_obj.get("spread_away_odds")
 
-    ml_home = odds_obj.get("moneyline_home_odds")
-    ml_away = odds_obj.get("moneyline_away_odds")
+def _latest_values(cur, table: str, game_ids: list):
+    """{(gameid, vendor): value tuple} of the latest row per game/vendor in `table`."""
+    cur.execute(f"""
+        SELECT DISTINCT ON (gameid, vendor) gameid, vendor, {", ".join(ODDS_VALUE_COLUMNS)}
+        FROM {table}
+        WHERE gameid = ANY(%s)
+        ORDER BY gameid, vendor;
+    """, (game_ids,))
+    return {(r[0], r[1]): tuple(r[2:]) for r in cur.fetchall()}
 
-    total_val = parse_float_or_none(odds_obj.get("total_value"))
-    total_over_odds = odds_obj.get("total_over_odds")
-    total_under_odds = odds_obj.get("total_under_odds")
 
-    updated_at = parse_timestamp(odds_obj.get("updated_at"))
+def _snapshots_as_of(cur, rows: dict):
+    """
+    {(gameid, vendor): value tuple} of the last FactOddsHistory snapshot as
+    of each row's updated_at, so re-writing an older snapshot (replay)
+    doesn't append it a second time.
+    """
+    keys = sorted(rows)
+    cur.execute(f"""
+        SELECT DISTINCT ON (h.gameid, h.vendor) h.gameid, h.vendor,
+               {", ".join(f"h.{c}" for c in ODDS_VALUE_COLUMNS)}
+        FROM factoddshistory h
+        JOIN unnest(%s::bigint[], %s::text[], %s::timestamptz[]) AS c(gameid, vendor, updatedat)
+          ON h.gameid = c.gameid
+         AND h.vendor = c.vendor
+         AND COALESCE(h.updatedat, h.capturedat) <= COALESCE(c.updatedat, 'infinity')
+        ORDER BY h.gameid, h.vendor, COALESCE(h.updatedat, h.capturedat) DESC, h.capturedat DESC;
+    """, ([k[0] for k in keys], [k[1] for k in keys], [rows[k][-1] for k in keys]))
+    return {(r[0], r[1]): tuple(r[2:]) for r in cur.fetchall()}
+
+
+def write_odds(conn, odds_objs: list, captured_at=None):
+    """
+    Write a batch of odds objects in one transaction: FactOdds rows whose
+    values changed are upserted, and the snapshot is appended to
+    FactOddsHistory when it differs from the game/vendor's last snapshot as
+    of its updated_at.
+    captured_at (default now) is when the snapshot was fetched; replay.py
+    passes the original fetch time. Returns (written, appended).
+    """
+    ensure_odds_tables(conn)
+    rows = {}
+    for o in odds_objs:
+        row = odds_row(o)
+        rows[(row[0], row[1])] = row
+    if not rows:
+        return 0, 0
+    game_ids = sorted({gid for gid, _ in rows})
 
     cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO factodds
-            (gameid, vendor, oddsid,
-             spreadhomevalue, spreadhomeodds,
-             spreadawayvalue, spreadawayodds,
-             moneylinehomeodds, moneylineawayodds,
-             totalvalue, totaloverodds, totalunderodds,
-             updatedat)
-        VALUES
-            (%s,%s,%s,
-             %s,%s,
-             %s,%s,
-             %s,%s,
-             %s,%s,%s,
-             %s)
-        ON CONFLICT (gameid, vendor) DO UPDATE
-        SET oddsid            = EXCLUDED.oddsid,
-            spreadhomevalue   = EXCLUDED.spreadhomevalue,
-            spreadhomeodds    = EXCLUDED.spreadhomeodds,
-            spreadawayvalue   = EXCLUDED.spreadawayvalue,
-            spreadawayodds    = EXCLUDED.spreadawayodds,
-            moneylinehomeodds = EXCLUDED.moneylinehomeodds,
-            moneylineawayodds = EXCLUDED.moneylineawayodds,
-            totalvalue        = EXCLUDED.totalvalue,
-            totaloverodds     = EXCLUDED.totaloverodds,
-            totalunderodds    = EXCLUDED.totalunderodds,
-            updatedat         = EXCLUDED.updatedat;
-    """, (
-        game_id,
-        vendor,
-        odds_id,
-        spread_home_val,
-        spread_home_odds,
-        spread_away_val,
-        spread_away_odds,
-        ml_home,
-        ml_away,
-        total_val,
-        total_over_odds,
-        total_under_odds,
-        updated_at,
-    ))
-    conn.commit()
-    cur.close()
+    try:
+        current = _latest_values(cur, "factodds", game_ids)
+        last_snapshot = _snapshots_as_of(cur, rows)
+
+        upserts = []
+        history = []
+        for key, row in sorted(rows.items()):
+            values = row[3:-1]
+            if current.get(key) != values:
+                upserts.append(row)
+            if last_snapshot.get(key) != values:
+                history.append(row)
+
+        if upserts:
+            execute_values(cur, UPSERT_ODDS_SQL, upserts, page_size=1000)
+        if history:
+            execute_values(cur, INSERT_ODDS_HISTORY_SQL, [row + (captured_at,) for row in history],
+                           page_size=1000,
+                           template="(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,COALESCE(%s, NOW()))")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
 
+    return len(upserts), len(history)
 
-def fetch_odds_for_date(target_date_str: str):
+
+def refresh_odds_lines(conn):
     """
-    Fetch all odds for a given date using cursor-based pagination.
+    Freeze opening/closing lines into FactOddsLines for every game whose
+    tip-off (DimGames.datetime) has passed and isn't there yet. Goes by the
+    clock rather than period/status, since DimGames isn't refreshed intraday.
+    Opening = first snapshot in FactOddsHistory the vendor updated before
+    tip-off, closing = last one, so live lines never count; going by the
+    vendor's updated_at rather than capturedat lets backfills (captured after
+    the fact) freeze too. A vendor with no pre-tip-off snapshot gets a row
+    with empty lines, which still marks the game as done.
+    Returns the number of game/vendor rows added.
     """
-    per_page = 100
-    cursor_val = None
-    page_idx = 1
-    all_rows = []
+    ensure_odds_tables(conn)
+    cols = ", ".join(ODDS_VALUE_COLUMNS)
+    open_cols = ", ".join(f"o.{c}" for c in ODDS_VALUE_COLUMNS)
+    close_cols = ", ".join(f"c.{c}" for c in ODDS_VALUE_COLUMNS)
+    target_cols = ", ".join(f"{side}{c}" for side in ("open", "close") for c in ODDS_VALUE_COLUMNS)
 
-    while True:
-        params = {
-            "per_page": per_page,
-            "dates[]": target_date_str
-        }
-        if cursor_val is not None:
-            params["cursor"] = cursor_val
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            WITH started AS (
+                SELECT g.gameid, g.datetime AS tipoff
+                FROM dimgames g
+                WHERE g.datetime <= NOW()
+                  AND NOT EXISTS (SELECT 1 FROM factoddslines l WHERE l.gameid = g.gameid)
+            ),
+            snapshots AS (
+                SELECT h.gameid, h.vendor, {cols}, h.capturedat,
+                       COALESCE(h.updatedat, h.capturedat) AS at,
+                       COALESCE(h.updatedat, h.capturedat) <= s.tipoff AS pretip
+                FROM factoddshistory h
+                JOIN started s ON s.gameid = h.gameid
+            ),
+            opening AS (
+                SELECT DISTINCT ON (gameid, vendor) *
+                FROM snapshots
+                WHERE pretip
+                ORDER BY gameid, vendor, at, capturedat
+            ),
+            closing AS (
+                SELECT DISTINCT ON (gameid, vendor) *
+                FROM snapshots
+                WHERE pretip
+                ORDER BY gameid, vendor, at DESC, capturedat DESC
+            )
+            INSERT INTO factoddslines
+                (gameid, vendor, {target_cols}, openedat, closedat)
+            SELECT v.gameid, v.vendor, {open_cols}, {close_cols}, o.at, c.at
+            FROM (SELECT DISTINCT gameid, vendor FROM snapshots) v
+            LEFT JOIN opening o
+              ON o.gameid = v.gameid
+             AND o.vendor = v.vendor
+            LEFT JOIN closing c
+              ON c.gameid = v.gameid
+             AND c.vendor = v.vendor
+            ON CONFLICT (gameid, vendor) DO NOTHING;
+        """)
+        added = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
 
-        print(f"Calling {ODDS_URL} with params={params}")
-        resp = requests.get(ODDS_URL, headers=HEADERS, params=params, timeout=30)
-        print("Status:", resp.status_code)
-        if resp.status_code != 200:
-            print("Body:", resp.text[:300])
-            resp.raise_for_status()
+    if added:
+        print(f"Froze opening/closing lines for {added} game/vendor pair(s).")
+    return added
 
-        data = resp.json()
-        batch = data.get("data", [])
-        meta = data.get("meta", {}) or {}
 
-        print(f"Fetched {len(batch)} odds rows on cursor-page {page_idx}. Meta: {meta}")
+def fetch_odds_for_date(target_date_str: str):
+    """Fetch all odds for a single date (see fetch_odds_for_dates)."""
+    return fetch_odds_for_dates([target_date_str])
+
 
-        if not batch:
-            print("No odds on this cursor page. Stopping pagination for this date.")
-            break
+def odds_pages(date_strs: list):
+    """Yield pages of odds for one or more dates from a single cursor-paginated dates[] query."""
+    return bdl_client.paginate(ODDS_URL, dates_params(date_strs))
 
-        all_rows.extend(batch)
 
-        cursor_val = meta.get("next_cursor")
-        if not cursor_val:
-            print("No next_cursor for odds. Reached end for this date.")
-            break
+def fetch_odds_for_dates(date_strs: list):
+    """Fetch all odds for one or more dates as one list (see odds_pages)."""
+    return bdl_client.collect(odds_pages(date_strs))
 
-        page_idx += 1
 
-    return all_rows
+def load_odds_batch(conn, date_batch: list, rows: list):
+    """Write one batch of fetched odds rows (FactOdds + FactOddsHistory)."""
+    written, appended = write_odds(conn, rows)
+    print(f"Odds for {date_batch[0]}..{date_batch[-1]}: {len(rows)} rows, "
+          f"{written} written, {appended} new snapshot(s) in history.")
 
 
-def run_odds_range(conn, start_date, end_date):
+def run_odds_range(conn, start_date, end_date,
+                   concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+                   batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+                   all_dates: bool = False):
     """
     Core driver to load odds between start_date and end_date (inclusive).
+    Only dates with games on the schedule are queried (unless all_dates).
+    Dates are packed batch_days at a time into one dates[] query and the
+    batches are fetched concurrently; pages are written on `conn` as they
+    arrive. Returns the dates that failed.
     """
-    current = start_date
-    while current <= end_date:
-        target_str = current.strftime("%Y-%m-%d")
-        print(f"\n===== Loading odds for {target_str} =====")
-        try:
-            rows = fetch_odds_for_date(target_str)
-            print(f"Got {len(rows)} odds rows for {target_str}.")
-
-            for o in rows:
-                upsert_odds(conn, o)
+    dates = date_strings(start_date, end_date)
+    if not all_dates:
+        dates = filter_to_game_dates(conn, dates)
+
+    pages = ingest_state.ResumablePages(conn, ODDS_URL, dates_params)
+    failed = pipeline.run(
+        chunk_dates(dates, batch_days),
+        pages.pages,
+        lambda batch, rows: load_odds_batch(conn, batch, rows),
+        checkpoint_fn=pages.checkpoint,
+        concurrency=concurrency,
+        label="odds",
+    )
+    return failed_batch_dates(failed)
 
-            print(f"Finished inserting odds for {target_str}.")
-        except Exception as e:
-            print(f"Error while processing odds for {target_str}: {e}")
 
-        current += timedelta(days=1)
+def run(conn, start_date: date | None = None, end_date: date | None = None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+        batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+        all_dates: bool = False):
+    """
+    run_odds_range plus the FactOdds watermark: with no dates, resume from
+    the watermark (yesterday only on the first run). FactOddsLines is
+    refreshed before and after the load. Returns the failed dates.
+    """
+    if start_date is None:
+        yday = date.today() - timedelta(days=1)
+        start_date, end_date = ingest_state.resume_range(conn, "factodds", yday, yday)
+
+    # games that tipped off since the last run get their closing line from
+    # the pre-tipoff snapshots, before this run adds live ones
+    refresh_odds_lines(conn)
+    failed_dates = run_odds_range(conn, start_date, end_date,
+                                  concurrency=concurrency, batch_days=batch_days,
+                                  all_dates=all_dates)
+    ingest_state.advance_watermark(conn, "factodds", start_date, end_date, failed_dates)
+    # finished games loaded for the first time (backfills)
+    refresh_odds_lines(conn)
+    return failed_dates
 
 
 def main():
@@ -176,31 +384,31 @@ def main():
     parser.add_argument(
         "--start-date",
         type=str,
-        help="Start date (YYYY-MM-DD), inclusive. If omitted, defaults to yesterday."
+        help="Start date (YYYY-MM-DD), inclusive. If omitted, resumes from the FactOdds watermark."
     )
     parser.add_argument(
         "--end-date",
         type=str,
-        help="End date (YYYY-MM-DD), inclusive. If omitted, defaults to yesterday."
+        help="End date (YYYY-MM-DD), inclusive. If omitted, resumes from the FactOdds watermark."
     )
+    fetch_engine.add_fetch_args(parser)
+    add_schedule_arg(parser)
     args = parser.parse_args()
 
+    start_date = end_date = None
     if args.start_date and args.end_date:
         start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
         end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date()
+        if end_date < start_date:
+            raise ValueError("end_date cannot be before start_date.")
     elif args.start_date or args.end_date:
         raise ValueError("You must provide BOTH --start-date and --end-date, or neither.")
-    else:
-        # Default: load odds for yesterday only
-        today = date.today()
-        start_date = end_date = today - timedelta(days=1)
-
-    if end_date < start_date:
-        raise ValueError("end_date cannot be before start_date.")
 
     conn = get_connection()
-    run_odds_range(conn, start_date, end_date)
+    run(conn, start_date, end_date, concurrency=args.concurrency,
+        batch_days=args.batch_days, all_dates=args.all_dates)
     conn.close()
+    bdl_client.stats.print_summary()
     print("\nAll odds loaded into FactOdds for the selected range.")
 
 
@@ -0,0 +1,191 @@
+import contextvars
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+import bdl_client
+import db_connection
+
+# In-process DAG runner for the ingest jobs.
+#
+# Each stage is a function taking a DB connection (e.g. games_ingest.run).
+# A stage starts as soon as every stage it depends on has finished
+# successfully; independent stages run in parallel on a thread pool, each on
+# its own connection from db_connection's pool, all sharing the bdl_client
+# session and rate limiter. If a stage fails (raises, or returns a non-empty
+# list of failed dates), everything downstream of it is skipped and the rest
+# of the DAG keeps going.
+#
+# The ingest modules print() their progress. While the DAG runs, stdout is
+# routed to logging with each line prefixed by the stage that printed it, so
+# parallel stages don't interleave mid-line.
+
+DEFAULT_WORKERS = 4
+
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+class Stage:
+    def __init__(self, name: str, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class _StageStdout:
+    """sys.stdout stand-in: lines printed inside a stage go to logging as '[stage] line'."""
+
+    def __init__(self, passthrough):
+        self.passthrough = passthrough
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        stage = _current_stage.get()
+        if stage is None:
+            return self.passthrough.write(text)
+
+        key = (stage, threading.get_ident())
+        with self._lock:
+            lines = (self._buffers.pop(key, "") + text).split("\n")
+            if lines[-1]:
+                self._buffers[key] = lines[-1]
+        for line in lines[:-1]:
+            logging.info(f"[{stage}] {line}")
+        return len(text)
+
+    def flush_stage(self, stage: str):
+        """Log a trailing line the stage printed without a newline."""
+        with self._lock:
+            rest = self._buffers.pop((stage, threading.get_ident()), "")
+        if rest:
+            logging.info(f"[{stage}] {rest}")
+
+    def flush(self):
+        self.passthrough.flush()
+
+
+@contextmanager
+def stage_output(name: str):
+    """Attribute everything printed inside the block to `name`."""
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        if isinstance(sys.stdout, _StageStdout):
+            sys.stdout.flush_stage(name)
+        _current_stage.reset(token)
+
+
+@contextmanager
+def stage_stdout():
+    """
+    Set up logging and route stdout through _StageStdout for the block, so
+    lines printed inside stage_output() are logged with their stage name.
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            stream=sys.stdout,
+            format="%(asctime)s [%(levelname)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+    original_stdout = sys.stdout
+    sys.stdout = _StageStdout(original_stdout)
+    try:
+        yield
+    finally:
+        sys.stdout = original_stdout
+
+
+def _run_stage(stage: Stage):
+    with stage_output(stage.name):
+        with db_connection.pooled_connection(f"nba-{stage.name}") as conn:
+            return stage.fn(conn)
+
+
+def _check_dag(stages):
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names: {names}")
+    known = set(names)
+    for s in stages:
+        missing = [d for d in s.deps if d not in known]
+        if missing:
+            raise ValueError(f"Stage {s.name} depends on unknown stage(s) {missing}")
+
+    # Kahn's algorithm: every stage must be reachable without a cycle
+    remaining = {s.name: set(s.deps) for s in stages}
+    while remaining:
+        ready = [n for n, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle among stages: {sorted(remaining)}")
+        for n in ready:
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def run_dag(stages, max_workers: int = DEFAULT_WORKERS):
+    """
+    Run the stages respecting their dependencies.
+    Returns {"done": [...], "failed": [...], "skipped": [...]} (stage names).
+    """
+    stages = list(stages)
+    _check_dag(stages)
+
+    pending = {s.name: s for s in stages}
+    done, failed, skipped = [], [], []
+    running = {}
+    started_at = {}
+
+    try:
+        with stage_stdout():
+            with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="stage") as executor:
+                while pending or running:
+                    for name, stage in list(pending.items()):
+                        blocked = [d for d in stage.deps if d in failed or d in skipped]
+                        if blocked:
+                            logging.warning(f"Skipping {name}: upstream stage(s) {blocked} did not succeed.")
+                            skipped.append(name)
+                            del pending[name]
+                        elif all(d in done for d in stage.deps):
+                            logging.info(f"=== Starting {name} ===")
+                            started_at[name] = time.perf_counter()
+                            running[executor.submit(_run_stage, stage)] = stage
+                            del pending[name]
+
+                    if not running:
+                        # everything left was skipped on this pass; go round again to cascade
+                        continue
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        stage = running.pop(future)
+                        elapsed = time.perf_counter() - started_at[stage.name]
+                        error = future.exception()
+                        if error is not None:
+                            logging.error(f"❌ {stage.name} failed after {elapsed:.1f}s: {error!r}", exc_info=error)
+                            failed.append(stage.name)
+                            continue
+
+                        result = future.result()
+                        if isinstance(result, list) and result:
+                            # same rule as full_rebuild.run_sharded: dependents
+                            # mustn't build on the dates that didn't load
+                            logging.error(f"❌ {stage.name} failed after {elapsed:.1f}s: {len(result)} failed "
+                                          f"date(s): {', '.join(str(d) for d in result)}")
+                            failed.append(stage.name)
+                            continue
+                        logging.info(f"=== {stage.name} completed in {elapsed:.1f}s ===")
+                        done.append(stage.name)
+
+            with stage_output("bdl_client"):
+                bdl_client.stats.print_summary()
+    finally:
+        db_connection.close_pool()
+
+    return {"done": done, "failed": failed, "skipped": skipped}
@@ -0,0 +1,144 @@
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fetch_engine
+
+# Producer/consumer pipeline between paginated API fetches and the DB writer.
+#
+# Fetcher threads walk one key's pages each (a date batch, a game, ...) and
+# put every page on a bounded queue as soon as it arrives. The calling thread
+# is the single writer: it drains the queue, coalesces pages of the same key
+# into batches of up to batch_rows and hands them to write_fn on its own DB
+# connection. The network keeps fetching while the database writes, and at
+# most queue_pages pages (plus the batches being written) are in memory no
+# matter how big the range is: when the writer falls behind, the fetchers
+# block on the full queue.
+
+DEFAULT_QUEUE_PAGES = int(os.getenv("BDL_PIPELINE_QUEUE_PAGES", "32"))
+DEFAULT_BATCH_ROWS = int(os.getenv("BDL_PIPELINE_BATCH_ROWS", "1000"))
+
+_PUT_TIMEOUT = 0.5
+
+
+class _KeyDone:
+    """Queue marker: a key's pages are exhausted (error is None) or its fetch raised."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+def run(keys, pages_fn, write_fn, done_fn=None, checkpoint_fn=None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+        queue_pages: int = DEFAULT_QUEUE_PAGES,
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+        label: str = "rows"):
+    """
+    Fetch pages_fn(key) (an iterator of row lists, e.g. bdl_client.paginate)
+    for every key with at most `concurrency` keys in flight, and call
+    write_fn(key, rows) on the calling thread with batches of those rows.
+    done_fn(key, total_rows), if given, runs once all of a key's rows are
+    written.
+
+    checkpoint_fn(key, next_cursor), if given, runs after every batch that
+    ends on a page carrying a next_cursor (bdl_client.Page), so a rerun can
+    resume there, and with next_cursor None once the key is done.
+
+    Errors are reported per key: a failed fetch or write marks the key
+    failed (its remaining pages are dropped; batches already written stay)
+    and the other keys carry on. Returns the list of failed keys, in
+    completion order.
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+    concurrency = max(1, min(concurrency, len(keys)))
+
+    pages = queue.Queue(maxsize=max(1, queue_pages))
+    stop = threading.Event()
+    cancelled = set()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # keys can be unhashable (date batches are lists), so track them by index
+    def produce(i):
+        try:
+            for rows in pages_fn(keys[i]):
+                if i in cancelled:
+                    # the writer gave up on this key; still report it done
+                    break
+                if not put((i, rows)):
+                    return
+            put((i, _KeyDone()))
+        except Exception as e:
+            put((i, _KeyDone(e)))
+
+    buffers = {}
+    cursors = {}
+    totals = {}
+    failed = []
+    remaining = len(keys)
+
+    def flush(i):
+        rows = buffers.pop(i, None)
+        if rows:
+            write_fn(keys[i], rows)
+            totals[i] = totals.get(i, 0) + len(rows)
+            cursor = cursors.pop(i, None)
+            if checkpoint_fn is not None and cursor:
+                checkpoint_fn(keys[i], cursor)
+
+    def fail(i, stage, error):
+        print(f"Error while {stage} {label} for {keys[i]}: {error}")
+        buffers.pop(i, None)
+        cancelled.add(i)
+        failed.append(keys[i])
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch") as executor:
+        try:
+            for i in range(len(keys)):
+                # carry the caller's context (e.g. the orchestrator's stage name) into the fetcher
+                executor.submit(contextvars.copy_context().run, produce, i)
+
+            while remaining:
+                i, item = pages.get()
+                if isinstance(item, _KeyDone):
+                    remaining -= 1
+                    if i in cancelled:
+                        continue
+                    if item.error is not None:
+                        fail(i, "fetching", item.error)
+                        continue
+                    try:
+                        flush(i)
+                        if done_fn is not None:
+                            done_fn(keys[i], totals.get(i, 0))
+                        if checkpoint_fn is not None:
+                            checkpoint_fn(keys[i], None)
+                    except Exception as e:
+                        fail(i, "processing", e)
+                    continue
+
+                if i in cancelled:
+                    continue
+                buffers.setdefault(i, []).extend(item)
+                cursors[i] = getattr(item, "next_cursor", None)
+                if len(buffers[i]) >= batch_rows:
+                    try:
+                        flush(i)
+                    except Exception as e:
+                        fail(i, "processing", e)
+        finally:
+            # unblock fetchers stuck on a full queue if the writer bailed out
+            stop.set()
+
+    return failed
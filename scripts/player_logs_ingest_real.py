@@ -1,15 +1,18 @@
-import requests
 from datetime import datetime, date, timedelta
 import argparse
+from psycopg2.extras import execute_values
 from db_connection import get_connection
-
-API_URL = "https://api.balldontlie.io/v1/stats"
-
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-
-HEADERS = {
-    "Authorization": API_KEY
-}
+import bdl_client
+import dimensions
+import fetch_engine
+import ingest_state
+import pipeline
+from ingest_dates import (
+    date_strings, chunk_dates, dates_params,
+    add_schedule_arg, filter_to_game_dates, failed_batch_dates,
+)
+
+API_URL = f"{bdl_client.BASE_URL_V1}/stats"
 
 # ------------- Helpers -----------------
 
@@ -60,164 +63,8 @@ def fd_fantasy_points(pts, reb, ast, stl, blk, tov):
 # ------------- DB upsert helpers -----------------
 
 
-def ensure_calendar(conn, game_dt: date, season: int, postseason: bool):
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimcalendar (date, year, month, day, week, dayofweek, season, isplayoffs)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (date) DO NOTHING;
-        """,
-        (
-            game_dt,
-            game_dt.year,
-            game_dt.month,
-            game_dt.day,
-            game_dt.isocalendar()[1],
-            game_dt.isoweekday(),
-            str(season),
-            postseason,
-        ),
-    )
-    conn.commit()
-    cur.close()
-
-
-def ensure_team(conn, team_obj: dict):
-    """
-    Make sure the team exists in DimTeams.
-    Note: we now also fill city/shortname so it stays consistent with other scripts.
-    """
-    team_id = team_obj["id"]
-    full_name = team_obj.get("full_name") or team_obj.get("name") or f"Team {team_id}"
-    shortname = team_obj.get("name") or ""
-    abbr = team_obj.get("abbreviation") or ""
-    conference = team_obj.get("conference") or ""
-    division = team_obj.get("division") or ""
-    city = team_obj.get("city") or ""
-
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimteams
-            (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
-        VALUES
-            (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (teamid) DO UPDATE
-        SET teamname    = EXCLUDED.teamname,
-            abbreviation= EXCLUDED.abbreviation,
-            conference  = EXCLUDED.conference,
-            division    = EXCLUDED.division,
-            city        = COALESCE(EXCLUDED.city, dimteams.city),
-            shortname   = COALESCE(EXCLUDED.shortname, dimteams.shortname);
-        """,
-        (team_id, full_name, abbr, conference, division, "", city, shortname),
-    )
-    conn.commit()
-    cur.close()
-
-
-def ensure_player(conn, player_obj: dict, team_id: int):
-    """
-    Lightweight ensure_player for the stats ingest.
-    (DimPlayers also gets fuller data from the dedicated players_ingest script.)
-    """
-    name = f'{player_obj["first_name"]} {player_obj["last_name"]}'
-    position = player_obj.get("position") or ""
-
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimplayers
-            (playerid, playername, teamid, position,
-             height, weight, birthdate, yearsexperience, activeflag)
-        VALUES
-            (%s,%s,%s,%s,
-             %s,%s,%s,%s,%s)
-        ON CONFLICT (playerid) DO UPDATE
-        SET playername = EXCLUDED.playername,
-            teamid     = EXCLUDED.teamid,
-            position   = EXCLUDED.position;
-        """,
-        (
-            player_obj["id"],
-            name,
-            team_id,
-            position,
-            None,
-            None,
-            None,
-            None,
-            True,
-        ),
-    )
-    conn.commit()
-    cur.close()
-
-
-def ensure_game(conn, game_obj: dict):
-    """
-    Ensure DimCalendar + DimTeams + DimGames are populated for this game.
-    (Games_ingest.py will later enrich DimGames with quarter scores, etc.)
-    """
-    game_id = game_obj["id"]
-    # parse ISO date like "2024-01-20" or "2024-01-20T00:00:00.000Z"
-    raw_date = game_obj["date"]
-    if "T" in raw_date:
-        game_dt = datetime.fromisoformat(raw_date.replace("Z", "+00:00")).date()
-    else:
-        game_dt = datetime.strptime(raw_date, "%Y-%m-%d").date()
-
-    ensure_calendar(conn, game_dt, game_obj["season"], game_obj.get("postseason", False))
-
-    home_id = game_obj["home_team_id"]
-    away_id = game_obj["visitor_team_id"]
-
-    # Ensure teams exist (placeholder if needed)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimteams (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (teamid) DO NOTHING;
-        """,
-        (home_id, f"Team {home_id}", "", "", "", "", "", ""),
-    )
-    cur.execute(
-        """
-        INSERT INTO dimteams (teamid, teamname, abbreviation, conference, division, venue, city, shortname)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (teamid) DO NOTHING;
-        """,
-        (away_id, f"Team {away_id}", "", "", "", "", "", ""),
-    )
-    conn.commit()
-    cur.close()
-
-    # Insert game row (if not already enriched by games_ingest.py)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO dimgames (gameid, date, hometeamid, awayteamid, season, gamenumber)
-        VALUES (%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (gameid) DO NOTHING;
-        """,
-        (
-            game_id,
-            game_dt,
-            home_id,
-            away_id,
-            str(game_obj["season"]),
-            None,
-        ),
-    )
-    conn.commit()
-    cur.close()
-    return game_id, game_dt
-
-
-def insert_fact_player_game(conn, stat: dict):
-    """Insert one row into FactPlayerGame from a balldontlie stat object."""
+def fact_player_game_row(stat: dict):
+    """Build the FactPlayerGame column tuple from a balldontlie stat object."""
     player = stat["player"]
     team = stat["team"]
     game = stat["game"]
@@ -259,101 +106,115 @@ def insert_fact_player_game(conn, stat: dict):
     dk = dk_fantasy_points(pts, reb, ast, stl, blk, tov)
     fd = fd_fantasy_points(pts, reb, ast, stl, blk, tov)
 
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO factplayergame
-        (playerid, gameid, teamid, opponentid, minutes,
-         pts, reb, oreb, dreb, ast, stl, blk, pf, tov,
-         fgm, fga, threepm, threepa, ftm, fta,
-         fg_pct, fg3_pct, ft_pct,
-         fantasypointsdk, fantasypointsfd)
-        VALUES (%s,%s,%s,%s,%s,
-                %s,%s,%s,%s,%s,%s,%s,%s,%s,
-                %s,%s,%s,%s,%s,%s,
-                %s,%s,%s,
-                %s,%s)
-        ON CONFLICT (playerid, gameid) DO NOTHING;
-        """,
-        (
-            player_id,
-            game_id,
-            team_id,
-            opponent_id,
-            mins,
-            pts,
-            reb,
-            oreb,
-            dreb,
-            ast,
-            stl,
-            blk,
-            pf,
-            tov,
-            fgm,
-            fga,
-            threepm,
-            threepa,
-            ftm,
-            fta,
-            fg_pct,
-            fg3_pct,
-            ft_pct,
-            dk,
-            fd,
-        ),
+    return (
+        player_id,
+        game_id,
+        team_id,
+        opponent_id,
+        mins,
+        pts,
+        reb,
+        oreb,
+        dreb,
+        ast,
+        stl,
+        blk,
+        pf,
+        tov,
+        fgm,
+        fga,
+        threepm,
+        threepa,
+        ftm,
+        fta,
+        fg_pct,
+        fg3_pct,
+        ft_pct,
+        dk,
+        fd,
     )
+
+
+FACT_PLAYER_GAME_INSERT = """
+    INSERT INTO factplayergame
+    (playerid, gameid, teamid, opponentid, minutes,
+     pts, reb, oreb, dreb, ast, stl, blk, pf, tov,
+     fgm, fga, threepm, threepa, ftm, fta,
+     fg_pct, fg3_pct, ft_pct,
+     fantasypointsdk, fantasypointsfd)
+    VALUES %s
+    ON CONFLICT (playerid, gameid) DO NOTHING;
+"""
+
+
+def insert_fact_player_game(conn, stat: dict):
+    """Insert one row into FactPlayerGame from a balldontlie stat object."""
+    cur = conn.cursor()
+    execute_values(cur, FACT_PLAYER_GAME_INSERT, [fact_player_game_row(stat)])
     conn.commit()
     cur.close()
 
-# ------------- API fetch -----------------
-
 
-def fetch_stats_for_date(target_date_str: str):
+def write_stats_batch(conn, stats: list):
     """
-    Fetch all stats for a given date using cursor-based pagination.
+    Bulk-load a page or a whole date of stat dicts in ONE transaction.
 
-    Uses:
-      ?dates[]=YYYY-MM-DD
-      meta.next_cursor for paging
+    The dimension rows (calendar, game stubs, teams, players) go through the
+    batch writers in dimensions.py and the facts through a single
+    execute_values statement, with one commit instead of ~6 per stat row.
+    Fact rows are de-duplicated by (playerid, gameid) first. The games are
+    queued in DirtyGames for team_game_aggregate.
     """
-    all_stats = []
-    cursor = None
-    page_num = 1
+    if not stats:
+        return
 
-    while True:
-        params = {
-            "per_page": 100,
-            "dates[]": target_date_str,
-        }
-        if cursor is not None:
-            params["cursor"] = cursor
+    fact_rows = {}
+    for stat in stats:
+        row = fact_player_game_row(stat)
+        fact_rows[(row[0], row[1])] = row
 
-        print(f"Calling {API_URL} with params={params}")
-        resp = requests.get(API_URL, params=params, headers=HEADERS, timeout=30)
-        print("Status code:", resp.status_code)
-        print("Raw response (first 300 chars):", resp.text[:300])
+    # the player's team for this game is the stat's team, not player.team_id
+    players = [dict(s["player"], team_id=s["team"]["id"]) for s in stats]
 
-        resp.raise_for_status()
-        data = resp.json()
+    ingest_state.ensure_state_tables(conn)
+    cur = conn.cursor()
+    try:
+        pending = dimensions.ensure_games(conn, [s["game"] for s in stats], commit=False)
+        pending += dimensions.upsert_teams(conn, [s["team"] for s in stats], commit=False)
+        pending += dimensions.upsert_players(conn, players, commit=False)
 
-        stats_batch = data.get("data", [])
-        meta = data.get("meta", {}) or {}
+        execute_values(cur, FACT_PLAYER_GAME_INSERT, list(fact_rows.values()), page_size=1000)
+        # FactTeamGame for these games is now stale
+        ingest_state.mark_games_dirty(cur, [s["game"]["id"] for s in stats])
 
-        batch_count = len(stats_batch)
-        print(f"Fetched {batch_count} rows on cursor-page {page_num}. Meta: {meta}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
 
-        all_stats.extend(stats_batch)
+    dimensions.get_cache(conn).remember_all(pending)
 
-        # Pagination: balldontlie v1 now uses 'next_cursor'
-        cursor = meta.get("next_cursor")
-        if not cursor:
-            print("No next_cursor returned. Reached end of pages for this date.")
-            break
+# ------------- API fetch -----------------
 
-        page_num += 1
 
-    return all_stats
+def fetch_stats_for_date(target_date_str: str):
+    """Fetch all stats for a single date (see fetch_stats_for_dates)."""
+    return fetch_stats_for_dates([target_date_str])
+
+
+def stats_pages(date_strs: list):
+    """
+    Yield pages of stats for one or more dates from a single cursor-paginated
+    dates[] query (?dates[]=YYYY-MM-DD&dates[]=..., meta.next_cursor).
+    """
+    return bdl_client.paginate(API_URL, dates_params(date_strs))
+
+
+def fetch_stats_for_dates(date_strs: list):
+    """Fetch all stats for one or more dates as one list (see stats_pages)."""
+    return bdl_client.collect(stats_pages(date_strs))
 
 # ------------- CLI date handling -----------------
 
@@ -363,7 +224,11 @@ def get_date_range_from_args():
     Parse --start-date / --end-date from CLI.
     - If both provided, use that range (inclusive).
     - If only one provided, use it for both (single day).
-    - If none provided, default to yesterday only (for daily job).
+    - If none provided, return (None, None): main resumes from the
+      FactPlayerGame watermark (yesterday only on the first run).
+
+    Returns (start_date_str, end_date_str, args) so callers can read the
+    other options (e.g. --concurrency).
     """
     parser = argparse.ArgumentParser(
         description="Ingest NBA player game stats from balldontlie into FactPlayerGame"
@@ -371,13 +236,15 @@ def get_date_range_from_args():
     parser.add_argument(
         "--start-date",
         type=str,
-        help="Start date (YYYY-MM-DD). If omitted, defaults to yesterday.",
+        help="Start date (YYYY-MM-DD). If omitted, resumes from the FactPlayerGame watermark.",
     )
     parser.add_argument(
         "--end-date",
         type=str,
         help="End date (YYYY-MM-DD). If omitted, defaults to same as start-date.",
     )
+    fetch_engine.add_fetch_args(parser)
+    add_schedule_arg(parser)
 
     args = parser.parse_args()
 
@@ -391,58 +258,83 @@ def get_date_range_from_args():
         start_date_str = args.end_date
         end_date_str = args.end_date
     else:
-        # Default: yesterday only
-        yday = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
-        start_date_str = yday
-        end_date_str = yday
+        # Default: resume from watermark (resolved in main once we have a connection)
+        start_date_str = None
+        end_date_str = None
 
-    return start_date_str, end_date_str
-
-# ------------- Main -----------------
+    return start_date_str, end_date_str, args
 
 
-def main():
-    # Get date range from CLI (or default to yesterday)
-    start_date_str, end_date_str = get_date_range_from_args()
-    print(f"Using stats date range: {start_date_str} to {end_date_str}")
+def stats_batch_done(date_batch: list, total: int):
+    print(f"Finished inserting stats for {date_batch[0]}..{date_batch[-1]}: {total} player stat rows.")
 
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+# ------------- Main -----------------
 
-    conn = get_connection()
 
-    current_date = start_date
-    while current_date <= end_date:
-        target_date_str = current_date.strftime("%Y-%m-%d")
-        print(f"\n===== Loading stats for {target_date_str} =====")
+def run_stats_range(conn, start_date, end_date,
+                    concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+                    batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+                    all_dates: bool = False):
+    """
+    Load FactPlayerGame for start_date..end_date (inclusive) without
+    touching the watermark. Only dates with games on the schedule are
+    queried (unless all_dates). Returns the dates that failed.
+    """
+    print(f"Using stats date range: {start_date} to {end_date}")
+
+    dates = date_strings(start_date, end_date)
+    if not all_dates:
+        dates = filter_to_game_dates(conn, dates)
+
+    # pages stream from the fetchers straight into write_stats_batch; each
+    # batch resumes from its pagination checkpoint if an earlier run failed
+    pages = ingest_state.ResumablePages(conn, API_URL, dates_params)
+    failed = pipeline.run(
+        chunk_dates(dates, batch_days),
+        pages.pages,
+        lambda batch, stats: write_stats_batch(conn, stats),
+        done_fn=stats_batch_done,
+        checkpoint_fn=pages.checkpoint,
+        concurrency=concurrency,
+        label="stats",
+    )
+    return failed_batch_dates(failed)
 
-        try:
-            stats = fetch_stats_for_date(target_date_str)
-            print(f"Got {len(stats)} player stat rows for {target_date_str}.")
 
-            if not stats:
-                print(f"No stats returned for {target_date_str} (maybe no games).")
-            else:
-                for stat in stats:
-                    game = stat["game"]
-                    team = stat["team"]
-                    player = stat["player"]
+def run(conn, start_date: date | None = None, end_date: date | None = None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY,
+        batch_days: int = fetch_engine.DEFAULT_BATCH_DAYS,
+        all_dates: bool = False):
+    """
+    run_stats_range plus the FactPlayerGame watermark: with no dates, resume
+    from the watermark (yesterday only on the first run). Returns the failed
+    dates.
+    """
+    if start_date is None:
+        yday = date.today() - timedelta(days=1)
+        start_date, end_date = ingest_state.resume_range(conn, "factplayergame", yday, yday)
 
-                    # ensure dimensions
-                    game_id, game_dt = ensure_game(conn, game)
-                    ensure_team(conn, team)
-                    ensure_player(conn, player, team["id"])
+    failed_dates = run_stats_range(conn, start_date, end_date,
+                                   concurrency=concurrency, batch_days=batch_days,
+                                   all_dates=all_dates)
+    ingest_state.advance_watermark(conn, "factplayergame", start_date, end_date, failed_dates)
+    return failed_dates
 
-                    # insert fact row
-                    insert_fact_player_game(conn, stat)
 
-                print(f"Finished inserting stats for {target_date_str}.")
-        except Exception as e:
-            print(f"Error while processing {target_date_str}: {e}")
+def main():
+    # Get date range from CLI (or resume from the watermark)
+    start_date_str, end_date_str, args = get_date_range_from_args()
 
-        current_date += timedelta(days=1)
+    start_date = end_date = None
+    if start_date_str is not None:
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
 
+    conn = get_connection()
+    run(conn, start_date, end_date, concurrency=args.concurrency,
+        batch_days=args.batch_days, all_dates=args.all_dates)
     conn.close()
+    bdl_client.stats.print_summary()
     print("\nAll dates loaded into FactPlayerGame.")
 
 
@@ -1,16 +1,17 @@
-import requests
 from datetime import datetime, date, timedelta
-from db_connection import get_connection
+import hashlib
+from psycopg2.extras import execute_values
+from db_connection import get_connection, add_column_if_missing
+import bdl_client
+import dimensions
+import fetch_engine
+import ingest_state
+import pipeline
 import argparse
 
-API_KEY = "3b13604b-63be-47ce-a594-bca471752359"
-BASE_URL_V2 = "https://api.balldontlie.io/v2"
+BASE_URL_V2 = bdl_client.BASE_URL_V2
 PROPS_URL = f"{BASE_URL_V2}/odds/player_props"
 
-HEADERS = {
-    "Authorization": API_KEY
-}
-
 
 def parse_float_or_none(val):
     if val is None:
@@ -33,36 +34,100 @@ def parse_timestamp(ts_str: str):
         return None
 
 
-def ensure_player_stub(conn, player_id: int):
+UPSERT_PROPS_SQL = """
+    INSERT INTO factplayerprops
+        (propid, gameid, playerid, vendor,
+         proptype, linevalue, markettype,
+         overodds, underodds, milestoneodds,
+         updatedat, rowhash)
+    VALUES %s
+    ON CONFLICT (propid) DO UPDATE
+    SET gameid        = EXCLUDED.gameid,
+        playerid      = EXCLUDED.playerid,
+        vendor        = EXCLUDED.vendor,
+        proptype      = EXCLUDED.proptype,
+        linevalue     = EXCLUDED.linevalue,
+        markettype    = EXCLUDED.markettype,
+        overodds      = EXCLUDED.overodds,
+        underodds     = EXCLUDED.underodds,
+        milestoneodds = EXCLUDED.milestoneodds,
+        updatedat     = EXCLUDED.updatedat,
+        rowhash       = EXCLUDED.rowhash;
+"""
+
+# Append-only line movement: one row per prop each time its line or odds
+# change (plus one when it first appears). Range-partitioned by game date,
+# one partition per month, created on demand.
+INSERT_PROP_HISTORY_SQL = """
+    INSERT INTO factplayerpropshistory
+        (gamedate, propid, gameid, playerid, vendor,
+         proptype, linevalue, markettype,
+         overodds, underodds, milestoneodds,
+         updatedat, capturedat)
+    VALUES %s;
+"""
+
+_props_tables_ready = False
+_history_partitions = set()
+
+
+def ensure_props_tables(conn):
     """
-    Make sure a PlayerID exists in DimPlayers so the FK doesn't fail.
-    If the player is already present from players_ingest.py, this is a no-op.
+    FactPlayerProps.rowhash (md5 of the prop's content, to skip rewriting
+    unchanged props) and the partitioned FactPlayerPropsHistory parent.
     """
+    global _props_tables_ready
+    if _props_tables_ready:
+        return
     cur = conn.cursor()
+    add_column_if_missing(cur, "factplayerprops", "rowhash", "TEXT")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS factplayerpropshistory (
+            gamedate      DATE        NOT NULL,
+            propid        BIGINT      NOT NULL,
+            gameid        BIGINT      NOT NULL,
+            playerid      BIGINT      NOT NULL,
+            vendor        TEXT,
+            proptype      TEXT,
+            linevalue     FLOAT,
+            markettype    TEXT,
+            overodds      INTEGER,
+            underodds     INTEGER,
+            milestoneodds INTEGER,
+            updatedat     TIMESTAMPTZ NOT NULL,
+            capturedat    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        ) PARTITION BY RANGE (gamedate);
+    """)
     cur.execute("""
-        INSERT INTO dimplayers (playerid, playername, activeflag)
-        VALUES (%s, %s, TRUE)
-        ON CONFLICT (playerid) DO NOTHING;
-    """, (
-        player_id,
-        f"Player {player_id}",
-    ))
+        CREATE INDEX IF NOT EXISTS factplayerpropshistory_line_idx
+        ON factplayerpropshistory (gameid, playerid, proptype, updatedat);
+    """)
+    conn.commit()
+    cur.close()
+    _props_tables_ready = True
+
+
+def ensure_history_partition(conn, game_date: date):
+    """Create the month partition of FactPlayerPropsHistory holding game_date, if missing."""
+    month_start = game_date.replace(day=1)
+    if month_start in _history_partitions:
+        return
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS factplayerpropshistory_{month_start:%Y%m}
+        PARTITION OF factplayerpropshistory
+        FOR VALUES FROM ('{month_start}') TO ('{next_month}');
+    """)
     conn.commit()
     cur.close()
+    _history_partitions.add(month_start)
 
 
-def upsert_prop(conn, prop: dict):
+def prop_row(prop: dict):
     """
-    Insert/update one row in FactPlayerProps from a player_props entry.
+    FactPlayerProps column values (without rowhash) for a player_props entry.
     """
-    prop_id = prop["id"]
-    game_id = prop["game_id"]
-    player_id = prop["player_id"]
-    vendor = prop.get("vendor")
-    prop_type = prop.get("prop_type")
-    line_value = parse_float_or_none(prop.get("line_value"))
-    updated_at = parse_timestamp(prop.get("updated_at"))
-
     market = prop.get("market") or {}
     market_type = market.get("type")
 
@@ -76,137 +141,223 @@ def upsert_prop(conn, prop: dict):
     elif market_type == "milestone":
         milestone_odds = market.get("odds")
 
-    # ensure player exists so FK doesn't break
-    ensure_player_stub(conn, player_id)
-
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO factplayerprops
-            (propid, gameid, playerid, vendor,
-             proptype, linevalue, markettype,
-             overodds, underodds, milestoneodds,
-             updatedat)
-        VALUES
-            (%s,%s,%s,%s,
-             %s,%s,%s,
-             %s,%s,%s,
-             %s)
-        ON CONFLICT (propid) DO UPDATE
-        SET gameid        = EXCLUDED.gameid,
-            playerid      = EXCLUDED.playerid,
-            vendor        = EXCLUDED.vendor,
-            proptype      = EXCLUDED.proptype,
-            linevalue     = EXCLUDED.linevalue,
-            markettype    = EXCLUDED.markettype,
-            overodds      = EXCLUDED.overodds,
-            underodds     = EXCLUDED.underodds,
-            milestoneodds = EXCLUDED.milestoneodds,
-            updatedat     = EXCLUDED.updatedat;
-    """, (
-        prop_id,
-        game_id,
-        player_id,
-        vendor,
-        prop_type,
-        line_value,
+    return (
+        prop["id"],
+        prop["game_id"],
+        prop["player_id"],
+        prop.get("vendor"),
+        prop.get("prop_type"),
+        parse_float_or_none(prop.get("line_value")),
         market_type,
         over_odds,
         under_odds,
         milestone_odds,
-        updated_at,
-    ))
-    conn.commit()
-    cur.close()
-
-
-def fetch_props_for_game(game_id: int):
-    """
-    Fetch all player props for a given game_id using cursor-based pagination.
-    """
-    per_page = 100
-    cursor_val = None
-    page_idx = 1
-    all_props = []
-
-    while True:
-        params = {
-            "game_id": game_id,
-            "per_page": per_page,
-        }
-        if cursor_val is not None:
-            params["cursor"] = cursor_val
-
-        print(f"  Calling {PROPS_URL} with params={params}")
-        resp = requests.get(PROPS_URL, headers=HEADERS, params=params, timeout=30)
-        print("  Status:", resp.status_code)
+        parse_timestamp(prop.get("updated_at")),
+    )
 
-        if resp.status_code == 404:
-            # No props for this game
-            print("  No props for this game (404).")
-            break
 
-        if resp.status_code != 200:
-            print("  Body:", resp.text[:300])
-            resp.raise_for_status()
+def prop_hash(row) -> str:
+    """md5 of everything in a prop_row except updated_at."""
+    return hashlib.md5(repr(row[:-1]).encode()).hexdigest()
 
-        data = resp.json()
-        batch = data.get("data", [])
-        meta = data.get("meta", {}) or {}
 
-        print(f"  Fetched {len(batch)} props on cursor-page {page_idx}. Meta: {meta}")
+class GamePropsWriter:
+    """
+    Writes one game's props batch by batch, skipping what hasn't changed:
+    every prop is compared against FactPlayerProps.rowhash and only new or
+    changed props are upserted (one batched statement per batch). Props
+    whose line or odds differ from their last FactPlayerPropsHistory row as
+    of their updated_at (or that have none) are also appended there in the
+    same transaction.
+
+    replay.py replays archived pages in fetch order with each page's
+    original fetch time as captured_at.
+    """
 
-        if not batch:
-            print("  No props on this cursor page. Stopping pagination for this game.")
-            break
+    def __init__(self, conn, game_id: int, game_date: date):
+        ensure_props_tables(conn)
+        ensure_history_partition(conn, game_date)
+        self.conn = conn
+        self.game_id = game_id
+        self.game_date = game_date
+        self.written = 0
+        self.unchanged = 0
+
+    def write(self, props: list, captured_at=None):
+        candidates = {}
+        for prop in props:
+            row = prop_row(prop)
+            candidates[row[0]] = row
+
+        conn = self.conn
+        cur = conn.cursor()
+        try:
+            prop_ids = sorted(candidates)
+            cur.execute("""
+                SELECT propid, rowhash
+                FROM factplayerprops
+                WHERE gameid = %s
+                  AND propid = ANY(%s);
+            """, (self.game_id, prop_ids))
+            stored = dict(cur.fetchall())
+
+            rows = []
+            for prop_id, row in sorted(candidates.items()):
+                h = prop_hash(row)
+                if stored.get(prop_id) != h:
+                    rows.append(row + (h,))
+
+            history = []
+            if rows:
+                # last line as of each prop's updated_at, so re-writing an
+                # older snapshot (replay) doesn't append it a second time
+                cur.execute("""
+                    SELECT DISTINCT ON (h.propid) h.propid, h.linevalue, h.overodds, h.underodds, h.milestoneodds
+                    FROM factplayerpropshistory h
+                    JOIN unnest(%s::bigint[], %s::timestamptz[]) AS c(propid, updatedat)
+                      ON h.propid = c.propid
+                     AND h.updatedat <= COALESCE(c.updatedat, 'infinity')
+                    WHERE h.gamedate = %s
+                      AND h.gameid = %s
+                    ORDER BY h.propid, h.updatedat DESC, h.capturedat DESC;
+                """, ([r[0] for r in rows], [r[10] for r in rows], self.game_date, self.game_id))
+                last_line = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+                for row in rows:
+                    if last_line.get(row[0]) != (row[5], row[7], row[8], row[9]):
+                        history.append((self.game_date,) + row[:-1] + (captured_at,))
+
+            pending = []
+            if rows:
+                # ensure players exist so the FK doesn't break
+                pending = dimensions.ensure_player_stubs(conn, sorted({r[2] for r in rows}), commit=False)
+                execute_values(cur, UPSERT_PROPS_SQL, rows, page_size=1000)
+            if history:
+                execute_values(cur, INSERT_PROP_HISTORY_SQL, history, page_size=1000,
+                               template="(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,COALESCE(%s, NOW()),COALESCE(%s, NOW()))")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+        dimensions.get_cache(conn).remember_all(pending)
+        self.written += len(rows)
+        self.unchanged += len(props) - len(rows)
+
+
+def write_props_for_game(conn, game_id: int, game_date: date, props: list):
+    """Write a complete list of one game's props (see GamePropsWriter). Returns (written, unchanged)."""
+    writer = GamePropsWriter(conn, game_id, game_date)
+    writer.write(props)
+    return writer.written, writer.unchanged
+
+
+def line_movement(conn, game_id: int, player_id: int, prop_type: str):
+    """
+    Every recorded (vendor, linevalue, overodds, underodds, milestoneodds,
+    updatedat) for one player prop in a game, oldest first. The last row per
+    vendor is the closing line.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT vendor, linevalue, overodds, underodds, milestoneodds, updatedat
+        FROM factplayerpropshistory
+        WHERE gameid = %s
+          AND playerid = %s
+          AND proptype = %s
+        ORDER BY updatedat, vendor;
+    """, (game_id, player_id, prop_type))
+    rows = cur.fetchall()
+    cur.close()
+    return rows
 
-        all_props.extend(batch)
 
-        cursor_val = meta.get("next_cursor")
-        if not cursor_val:
-            print("  No next_cursor for props. Reached end for this game.")
-            break
+def props_pages(game_id: int):
+    """Yield pages of player props for a game (cursor-based pagination; 404 = no props)."""
+    return bdl_client.paginate(PROPS_URL, {"game_id": game_id}, allow_404=True)
 
-        page_idx += 1
 
-    return all_props
+def fetch_props_for_game(game_id: int):
+    """Fetch all player props for a given game_id as one list (see props_pages)."""
+    return bdl_client.collect(props_pages(game_id))
 
 
-def get_game_ids_for_date_range(conn, start_date: date, end_date: date):
+def get_games_for_date_range(conn, start_date: date, end_date: date):
     """
-    Pull all GameID values from DimGames in the given date range.
+    Pull all (GameID, date) pairs from DimGames in the given date range.
     """
     cur = conn.cursor()
     cur.execute("""
-        SELECT gameid
+        SELECT gameid, date
         FROM dimgames
         WHERE date BETWEEN %s AND %s
         ORDER BY date, gameid;
     """, (start_date, end_date))
     rows = cur.fetchall()
     cur.close()
-    return [r[0] for r in rows]
+    return rows
 
 
-def run_props_for_range(conn, start_date: date, end_date: date):
+def get_game_ids_for_date_range(conn, start_date: date, end_date: date):
     """
-    Core driver: find games in DimGames between start_date and end_date,
-    then load props for each game.
+    Pull all GameID values from DimGames in the given date range.
     """
-    game_ids = get_game_ids_for_date_range(conn, start_date, end_date)
-    print(f"Found {len(game_ids)} games in DimGames for {start_date} to {end_date}.")
+    return [r[0] for r in get_games_for_date_range(conn, start_date, end_date)]
 
-    for game_id in game_ids:
-        print(f"\n===== Loading props for GameID {game_id} =====")
-        try:
-            props = fetch_props_for_game(game_id)
-            print(f"Got {len(props)} props for game {game_id}.")
 
-            for prop in props:
-                upsert_prop(conn, prop)
+def run_props_for_range(conn, start_date: date, end_date: date,
+                        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY):
+    """
+    Core driver: find games in DimGames between start_date and end_date,
+    then load props for each game. Up to `concurrency` games' cursor chains
+    are fetched in parallel (paced by the shared rate limiter) and their
+    pages are written on `conn` as they arrive. Returns the dates of games
+    that failed.
+    """
+    games = get_games_for_date_range(conn, start_date, end_date)
+    print(f"Found {len(games)} games in DimGames for {start_date} to {end_date}.")
+
+    writers = {}
+
+    def write_batch(game, props):
+        game_id, game_dt = game
+        if game not in writers:
+            writers[game] = GamePropsWriter(conn, game_id, game_dt)
+        writers[game].write(props)
+
+    def finish_game(game, total):
+        game_id, _ = game
+        writer = writers.pop(game, None)
+        if writer is None:
+            print(f"No props for game {game_id}.")
+            return
+        print(f"Finished props for game {game_id}: {total} props, "
+              f"{writer.written} written, {writer.unchanged} unchanged.")
+
+    # a game whose pages failed part-way resumes from its pagination checkpoint
+    pages = ingest_state.ResumablePages(conn, PROPS_URL, lambda game: {"game_id": game[0]}, allow_404=True)
+    failed = pipeline.run(games, pages.pages, write_batch, done_fn=finish_game,
+                          checkpoint_fn=pages.checkpoint, concurrency=concurrency, label="props")
+    for game in failed:
+        writers.pop(game, None)
+    return sorted({game_dt for _, game_dt in failed})
+
+
+def run(conn, start_date: date | None = None, end_date: date | None = None,
+        concurrency: int = fetch_engine.DEFAULT_CONCURRENCY):
+    """
+    run_props_for_range plus the FactPlayerProps watermark: with no dates,
+    resume from the watermark (yesterday only on the first run).
+    Returns the failed dates.
+    """
+    if start_date is None:
+        yday = date.today() - timedelta(days=1)
+        start_date, end_date = ingest_state.resume_range(conn, "factplayerprops", yday, yday)
 
-            print(f"Finished inserting props for game {game_id}.")
-        except Exception as e:
-            print(f"Error while processing props for game {game_id}: {e}")
+    failed_dates = run_props_for_range(conn, start_date, end_date, concurrency=concurrency)
+    ingest_state.advance_watermark(conn, "factplayerprops", start_date, end_date, failed_dates)
+    return failed_dates
 
 
 def main():
@@ -214,31 +365,34 @@ def main():
     parser.add_argument(
         "--start-date",
         type=str,
-        help="Start date (YYYY-MM-DD), inclusive. If omitted, defaults to yesterday."
+        help="Start date (YYYY-MM-DD), inclusive. If omitted, resumes from the FactPlayerProps watermark."
     )
     parser.add_argument(
         "--end-date",
         type=str,
-        help="End date (YYYY-MM-DD), inclusive. If omitted, defaults to yesterday."
+        help="End date (YYYY-MM-DD), inclusive. If omitted, resumes from the FactPlayerProps watermark."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=fetch_engine.DEFAULT_CONCURRENCY,
+        help=f"Number of games whose props are fetched in parallel (default {fetch_engine.DEFAULT_CONCURRENCY}).",
     )
     args = parser.parse_args()
 
+    start_date = end_date = None
     if args.start_date and args.end_date:
         start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
         end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date()
+        if end_date < start_date:
+            raise ValueError("end_date cannot be before start_date.")
     elif args.start_date or args.end_date:
         raise ValueError("You must provide BOTH --start-date and --end-date, or neither.")
-    else:
-        # Default: yesterday only
-        today = date.today()
-        start_date = end_date = today - timedelta(days=1)
-
-    if end_date < start_date:
-        raise ValueError("end_date cannot be before start_date.")
 
     conn = get_connection()
-    run_props_for_range(conn, start_date, end_date)
+    run(conn, start_date, end_date, concurrency=args.concurrency)
     conn.close()
+    bdl_client.stats.print_summary()
     print("\nAll props loaded into FactPlayerProps for the selected games/date range.")
 
 
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cross-process token bucket for the balldontlie API.
+# The bucket state lives in a small JSON file next to a lock file, both keyed
+# by a hash of the API key, so every ingest process on this machine that uses
+# the same key (daily_ingest, betting_ingest, ad-hoc backfills) draws from the
+# same quota.
+
+# Requests per minute to pace at. Keep this a little under the plan's limit
+# (GOAT tier is 600/min) so bursts from several processes don't trip 429s.
+RATE_PER_MINUTE = float(os.getenv("BDL_RATE_PER_MINUTE", "540"))
+# Max tokens that can build up while idle.
+BURST = float(os.getenv("BDL_RATE_BURST", "10"))
+STATE_DIR = os.getenv("BDL_RATE_STATE_DIR", tempfile.gettempdir())
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive OS-level lock on `path` (flock on POSIX, msvcrt on Windows)."""
+    fh = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting.
+                    continue
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        fh.close()
+
+
+class TokenBucket:
+    """
+    Token bucket shared across threads and processes through a lock file.
+
+    acquire() blocks until a request may be sent. block_for() is called when
+    the API answers 429 so every process backs off until Retry-After expires.
+    """
+
+    def __init__(self, key: str, rate_per_minute: float = RATE_PER_MINUTE,
+                 burst: float = BURST, state_dir: str = STATE_DIR):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_path = os.path.join(state_dir, f"bdl_ratelimit_{digest}.json")
+        self.lock_path = self.state_path + ".lock"
+        self.rate_per_sec = rate_per_minute / 60.0
+        self.burst = max(burst, 1.0)
+        self._thread_lock = threading.Lock()
+
+    def _read_state(self, now: float):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            state = {}
+        return {
+            "tokens": float(state.get("tokens", self.burst)),
+            "updated": float(state.get("updated", now)),
+            "blocked_until": float(state.get("blocked_until", 0.0)),
+        }
+
+    def _write_state(self, state: dict):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, self.state_path)
+
+    def _try_take(self) -> float:
+        """Take one token if available. Returns 0, or the seconds to wait before retrying."""
+        with self._thread_lock, _file_lock(self.lock_path):
+            now = time.time()
+            state = self._read_state(now)
+
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+
+            elapsed = max(0.0, now - state["updated"])
+            tokens = min(self.burst, state["tokens"] + elapsed * self.rate_per_sec)
+            state["updated"] = now
+
+            if tokens >= 1.0:
+                state["tokens"] = tokens - 1.0
+                self._write_state(state)
+                return 0.0
+
+            state["tokens"] = tokens
+            self._write_state(state)
+            return (1.0 - tokens) / self.rate_per_sec
+
+    def acquire(self):
+        """Block until one request is allowed."""
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def block_for(self, seconds: float):
+        """Stop all processes sharing this bucket from sending for `seconds`."""
+        with self._thread_lock, _file_lock(self.lock_path):
+            now = time.time()
+            state = self._read_state(now)
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["tokens"] = 0.0
+            state["updated"] = now
+            self._write_state(state)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(key: str) -> TokenBucket:
+    """Return the process-wide TokenBucket for an API key."""
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(key)
+        return _buckets[key]
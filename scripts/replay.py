@@ -0,0 +1,156 @@
+from datetime import datetime, date
+import argparse
+from db_connection import get_connection
+import advanced_stats_ingest
+import games_ingest
+import odds_ingest
+import pipeline
+import player_logs_ingest_real
+import props_ingest
+import landing
+
+# Offline replay of the raw landing zone (see landing.py) into the warehouse.
+#
+# Pages are read back in the order they were fetched and pushed through the
+# same batch writers the live ingests use, so the result matches what the
+# original runs wrote, with no API calls and no rate limit. Decompressing
+# and parsing run on a reader thread while this thread writes (pipeline.py).
+#
+# Replayed endpoints, in dependency order:
+#   games              -> DimGames (+ DimTeams / DimCalendar)
+#   stats              -> FactPlayerGame (+ DirtyGames)
+#   stats/advanced     -> FactPlayerAdvanced
+#   odds               -> FactOdds, FactOddsHistory, FactOddsLines
+#   odds/player_props  -> FactPlayerProps, FactPlayerPropsHistory
+
+# Landed pages per write: ~1000 rows for the bulk endpoints. Odds and props
+# go one page at a time so every snapshot keeps its own fetch time.
+_BULK_PAGES = 10
+
+
+def _pages(endpoint: str, start_date: date | None, end_date: date | None):
+    # each landed page becomes one pipeline "row"
+    for rec in landing.records(endpoint, start_date, end_date):
+        yield [rec]
+
+
+def _data(records):
+    return [row for rec in records for row in rec["body"].get("data", [])]
+
+
+def _fetched_at(rec):
+    return datetime.fromisoformat(rec["fetched_at"])
+
+
+def replay_games(conn, records):
+    games_ingest.upsert_games(conn, _data(records))
+
+
+def replay_stats(conn, records):
+    player_logs_ingest_real.write_stats_batch(conn, _data(records))
+
+
+def replay_advanced(conn, records):
+    advanced_stats_ingest.write_advanced_batch(conn, _data(records))
+
+
+def replay_odds(conn, records):
+    for rec in records:
+        odds_ingest.write_odds(conn, rec["body"].get("data", []), captured_at=_fetched_at(rec))
+
+
+class _PropsReplayer:
+    """One GamePropsWriter per game for the whole replay."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.writers = {}
+        self.game_dates = {}
+
+    def _writer(self, game_id):
+        if game_id not in self.writers:
+            if game_id not in self.game_dates:
+                cur = self.conn.cursor()
+                cur.execute("SELECT date FROM dimgames WHERE gameid = %s;", (game_id,))
+                row = cur.fetchone()
+                cur.close()
+                if row is None:
+                    raise ValueError(f"Game {game_id} is not in DimGames; replay games first.")
+                self.game_dates[game_id] = row[0]
+            self.writers[game_id] = props_ingest.GamePropsWriter(
+                self.conn, game_id, self.game_dates[game_id]
+            )
+        return self.writers[game_id]
+
+    def write(self, records):
+        for rec in records:
+            by_game = {}
+            for prop in rec["body"].get("data", []):
+                by_game.setdefault(prop["game_id"], []).append(prop)
+            for game_id, props in sorted(by_game.items()):
+                self._writer(game_id).write(props, captured_at=_fetched_at(rec))
+
+
+def replay_endpoint(conn, endpoint: str, start_date: date | None = None, end_date: date | None = None):
+    """
+    Replay one endpoint's landed pages (optionally only those fetched
+    between start_date and end_date). Returns the number of pages replayed.
+    """
+    props = _PropsReplayer(conn)
+    writers = {
+        "games": (replay_games, _BULK_PAGES),
+        "stats": (replay_stats, _BULK_PAGES),
+        "stats/advanced": (replay_advanced, _BULK_PAGES),
+        "odds": (replay_odds, 1),
+        "odds/player_props": (lambda _, records: props.write(records), 1),
+    }
+    if endpoint not in writers:
+        raise ValueError(f"Don't know how to replay {endpoint!r}; choose from {sorted(writers)}.")
+    write_fn, batch_pages = writers[endpoint]
+
+    print(f"Replaying {endpoint} from {landing.endpoint_dir(endpoint)}")
+    replayed = {}
+    failed = pipeline.run(
+        [endpoint],
+        lambda ep: _pages(ep, start_date, end_date),
+        lambda _, records: write_fn(conn, records),
+        done_fn=replayed.__setitem__,
+        batch_rows=batch_pages,
+        label="replay",
+    )
+    if failed:
+        raise RuntimeError(f"Replay of {endpoint} failed.")
+
+    if endpoint == "odds":
+        odds_ingest.refresh_odds_lines(conn)
+    pages = replayed.get(endpoint, 0)
+    print(f"Replayed {pages} {endpoint} page(s).")
+    return pages
+
+
+REPLAY_ORDER = ["games", "stats", "stats/advanced", "odds", "odds/player_props"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild warehouse tables from the raw landing zone (no API calls).")
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        default=REPLAY_ORDER,
+        help=f"Endpoints to replay, in order (default: {' '.join(REPLAY_ORDER)}).",
+    )
+    parser.add_argument("--start-date", type=str, help="Only pages fetched on/after this date (YYYY-MM-DD).")
+    parser.add_argument("--end-date", type=str, help="Only pages fetched on/before this date (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date() if args.start_date else None
+    end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else None
+
+    conn = get_connection()
+    for endpoint in args.endpoints:
+        replay_endpoint(conn, endpoint, start_date, end_date)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,369 @@
 from datetime import datetime, date
 import argparse
+import re
+from psycopg2 import sql
 from db_connection import get_connection
+import ingest_state
 
 
-def aggregate_team_games(conn, start_date: date | None = None, end_date: date | None = None):
-    cur = conn.cursor()
+def aggregate_team_games(conn, start_date: date | None = None, end_date: date | None = None,
+                         full: bool = False):
+    """
+    Three modes:
+      - full=True: rebuild every game into a shadow table and swap it in
+        (see rebuild_via_shadow).
+      - start_date / end_date: re-aggregate the games in that date range.
+      - neither (default): incremental, re-aggregate only the games queued in
+        DirtyGames by the player-log / games ingests.
 
-    # If no date range provided -> full rebuild
+    The range and incremental modes upsert in place inside one transaction,
+    so readers see either the old or the new rows for a game, never neither.
+    Every mode holds the AGGREGATE_LOCK advisory lock, so an in-place upsert
+    waits for a full rebuild's swap instead of landing in the table it is
+    about to replace.
+    """
+    if full:
+        return rebuild_via_shadow(conn)
     if start_date is None and end_date is None:
-        print("No date range provided. Performing FULL rebuild of FactTeamGame (TRUNCATE + recompute).")
-        cur.execute("TRUNCATE TABLE factteamgame;")
+        return aggregate_dirty_games(conn)
+
+    print(f"Rebuilding FactTeamGame for games between {start_date} and {end_date} (inclusive).")
+    params = {"start_date": start_date, "end_date": end_date, "game_ids": None}
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (AGGREGATE_LOCK,))
+        cur.execute(AGGREGATE_SQL, params)
+        cur.execute(PRUNE_SQL, params)
         conn.commit()
-    else:
-        # Partial rebuild: delete existing rows only for games within the date range
-        print(f"Rebuilding FactTeamGame for games between {start_date} and {end_date} (inclusive).")
-        cur.execute(
-            """
-            DELETE FROM factteamgame
-            WHERE gameid IN (
-                SELECT gameid
-                FROM dimgames
-                WHERE (%s IS NULL OR date >= %s)
-                  AND (%s IS NULL OR date <= %s)
-            );
-            """,
-            (start_date, start_date, end_date, end_date),
-        )
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    print("FactTeamGame aggregated successfully from FactPlayerGame + DimGames.")
+
+
+def aggregate_dirty_games(conn):
+    """
+    Incremental mode: claim every gameid queued in DirtyGames and
+    re-aggregate just those games, all in one transaction (if it fails the
+    games stay queued for the next run). Returns the number of games.
+    """
+    ingest_state.ensure_state_tables(conn)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (AGGREGATE_LOCK,))
+        game_ids = ingest_state.claim_dirty_games(cur)
+        if not game_ids:
+            conn.commit()
+            print("No dirty games queued. FactTeamGame is up to date.")
+            return 0
+
+        print(f"Re-aggregating FactTeamGame for {len(game_ids)} dirty game(s).")
+        params = {"start_date": None, "end_date": None, "game_ids": game_ids}
+        cur.execute(AGGREGATE_SQL, params)
+        cur.execute(PRUNE_SQL, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    print("FactTeamGame aggregated successfully from FactPlayerGame + DimGames.")
+    return len(game_ids)
+
+
+# ---------- Full rebuild: shadow table + atomic swap ----------
+
+SHADOW_TABLE = "factteamgame_shadow"
+OLD_TABLE = "factteamgame_old"
+SHADOW_SUFFIX = "_shadow"
+# Advisory lock (hashtext of this key) serializing every FactTeamGame writer
+# here: held for a whole full rebuild, per transaction by the in-place modes.
+AGGREGATE_LOCK = "factteamgame"
+
+
+def rebuild_via_shadow(conn):
+    """
+    Full rebuild without readers ever seeing an empty or half-filled table.
+
+      1. Aggregate every game into an UNLOGGED copy of FactTeamGame (no WAL
+         for the bulk insert), noting which DirtyGames entries it covers.
+      2. Build FactTeamGame's constraints and indexes on the filled shadow,
+         then SET LOGGED so it survives a crash once it is live.
+      3. In one short transaction: drop the foreign keys pointing at
+         FactTeamGame and the views that read it, rename the live table away
+         and the shadow into place, drop the old table (no CASCADE, so any
+         other dependent makes the swap fail instead of vanishing), recreate
+         the views, foreign keys (NOT VALID, validated after the swap) and
+         grants, and clear the DirtyGames entries the shadow covers.
+
+    Only step 3 takes an exclusive lock on FactTeamGame; queries running on
+    the old table finish first, queries after the swap see the new one.
+    Incremental / range runs started meanwhile wait on AGGREGATE_LOCK (taken
+    before the DirtyGames snapshot) and then update the new table.
+    Games marked dirty during the rebuild, or a failed rebuild's games, stay
+    queued for the next incremental run. Returns the number of rows built.
+    """
+    ingest_state.ensure_state_tables(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(hashtext(%s));", (AGGREGATE_LOCK,))
+    conn.commit()
+    try:
+        print("Performing FULL rebuild of FactTeamGame into a shadow table.")
+        cur.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE};")
+        cur.execute(f"""
+            CREATE UNLOGGED TABLE {SHADOW_TABLE}
+            (LIKE factteamgame INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING GENERATED);
+        """)
+        dirty = ingest_state.snapshot_dirty_games(cur)
+        cur.execute(aggregate_sql(SHADOW_TABLE, upsert=False),
+                    {"start_date": None, "end_date": None, "game_ids": None})
+        n_rows = cur.rowcount
+        conn.commit()
+        print(f"Shadow table built with {n_rows} rows.")
+
+        renames = _copy_constraints_and_indexes(cur, "factteamgame", SHADOW_TABLE)
+        cur.execute(f"ANALYZE {SHADOW_TABLE};")
+        cur.execute(f"ALTER TABLE {SHADOW_TABLE} SET LOGGED;")
         conn.commit()
+        print(f"Shadow table indexed ({len(renames)} constraints/indexes).")
+
+        cur.execute("LOCK TABLE factteamgame IN ACCESS EXCLUSIVE MODE;")
+        views = _dependent_views(cur, "factteamgame")
+        foreign_keys = _incoming_foreign_keys(cur, "factteamgame")
+        grants = _grants(cur, "factteamgame", sql.Identifier("factteamgame"))
+        for oid, ident, _, _, _ in views:
+            grants += _grants(cur, oid, ident)
+        view_indexes = _view_indexes(cur, [oid for oid, _, _, kind, _ in views if kind == "m"])
+
+        for table, _, name, _, _ in foreign_keys:
+            cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {};").format(table, sql.Identifier(name)))
+        for _, ident, _, kind, _ in reversed(views):
+            cur.execute(sql.SQL("DROP {} {};").format(sql.SQL(_VIEW_KINDS[kind]), ident))
+        _reown_sequences(cur, "factteamgame", SHADOW_TABLE)
+        cur.execute(f"ALTER TABLE factteamgame RENAME TO {OLD_TABLE};")
+        cur.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO factteamgame;")
+        cur.execute(f"DROP TABLE {OLD_TABLE};")
+        for rename_sql in renames:
+            cur.execute(rename_sql)
+        for _, ident, _, kind, definition in views:
+            cur.execute(sql.SQL("CREATE {} {} AS ").format(sql.SQL(_VIEW_KINDS[kind]), ident)
+                        + sql.SQL(definition))
+        for index_sql in view_indexes:
+            cur.execute(index_sql)
+        for table, _, name, definition, _ in foreign_keys:
+            not_valid = "" if definition.endswith("NOT VALID") else " NOT VALID"
+            cur.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(table, sql.Identifier(name))
+                        + sql.SQL(definition + not_valid + ";"))
+        for grant_sql in grants:
+            cur.execute(grant_sql)
+        ingest_state.clear_dirty_games(cur, dirty)
+        conn.commit()
+
+        # after the swap: validating scans the referencing tables, but only
+        # takes a SHARE UPDATE EXCLUSIVE lock on them
+        for table, _, name, _, validated in foreign_keys:
+            if validated:
+                cur.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {};").format(table, sql.Identifier(name)))
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        cur.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE};")
+        conn.commit()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s));", (AGGREGATE_LOCK,))
+        conn.commit()
+        cur.close()
+
+    if views:
+        print(f"Recreated dependent view(s): {', '.join(v[2] for v in views)}.")
+    if foreign_keys:
+        print(f"Recreated foreign key(s): {', '.join(f'{fk[1]}.{fk[2]}' for fk in foreign_keys)}.")
+    print("FactTeamGame swapped in from shadow table.")
+    return n_rows
+
+
+def _copy_constraints_and_indexes(cur, source: str, target: str):
+    """
+    Recreate source's constraints and indexes on target under temporary
+    '<name>_shadow' names (index names are schema-wide, so the live ones
+    can't be reused yet). Returns the statements that rename them back,
+    to run once source is gone.
+    """
+    renames = []
+
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid), conindid
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass
+          AND contype IN ('p', 'u', 'x', 'c', 'f')
+        ORDER BY contype = 'f', conname;
+    """, (source,))
+    constraints = cur.fetchall()
+    constraint_indexes = {indid for _, _, indid in constraints if indid}
+    for name, definition, _ in constraints:
+        tmp = _shadow_name(name)
+        cur.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(sql.Identifier(target), sql.Identifier(tmp))
+                    + sql.SQL(definition + ";"))
+        renames.append(sql.SQL("ALTER TABLE factteamgame RENAME CONSTRAINT {} TO {};").format(
+            sql.Identifier(tmp), sql.Identifier(name)))
 
-    # Now (re)aggregate only games in the desired range
-    cur.execute(
-        """
+    cur.execute("""
+        SELECT i.indexrelid, c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+        ORDER BY c.relname;
+    """, (source,))
+    for index_oid, name, definition in cur.fetchall():
+        if index_oid in constraint_indexes:
+            continue
+        tmp = _shadow_name(name)
+        # "CREATE [UNIQUE] INDEX name ON [ONLY] schema.source USING ..."
+        tmp_sql = sql.Identifier(tmp).as_string(cur)
+        target_sql = sql.Identifier(target).as_string(cur)
+        definition = re.sub(
+            r"^(CREATE (?:UNIQUE )?INDEX )(?:\S+|\"(?:[^\"]|\"\")*\")( ON (?:ONLY )?)\S+",
+            lambda m: f"{m.group(1)}{tmp_sql}{m.group(2)}{target_sql}",
+            definition,
+        )
+        cur.execute(definition)
+        renames.append(sql.SQL("ALTER INDEX {} RENAME TO {};").format(sql.Identifier(tmp), sql.Identifier(name)))
+
+    return renames
+
+
+def _shadow_name(name: str) -> str:
+    # identifiers are capped at 63 bytes
+    return name[:63 - len(SHADOW_SUFFIX)] + SHADOW_SUFFIX
+
+
+def _dependent_views(cur, table: str):
+    """
+    (oid, identifier, display name, relkind, definition) for every view /
+    materialized view that reads `table`, directly or through other views,
+    in creation order.
+    """
+    cur.execute("""
+        WITH RECURSIVE deps AS (
+            SELECT DISTINCT r.ev_class AS viewid, 1 AS depth
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.classid = 'pg_rewrite'::regclass
+              AND d.refobjid = %s::regclass
+              AND r.ev_class <> %s::regclass
+            UNION
+            SELECT DISTINCT r.ev_class, deps.depth + 1
+            FROM deps
+            JOIN pg_depend d ON d.refobjid = deps.viewid
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.classid = 'pg_rewrite'::regclass
+              AND r.ev_class <> deps.viewid
+        )
+        SELECT c.oid, n.nspname, c.relname, c.oid::regclass::text, c.relkind, pg_get_viewdef(c.oid)
+        FROM (SELECT viewid, MAX(depth) AS depth FROM deps GROUP BY viewid) v
+        JOIN pg_class c ON c.oid = v.viewid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        ORDER BY v.depth, c.relname;
+    """, (table, table))
+    return [
+        (oid, sql.Identifier(schema, name), display, kind, definition)
+        for oid, schema, name, display, kind, definition in cur.fetchall()
+    ]
+
+
+_VIEW_KINDS = {"v": "VIEW", "m": "MATERIALIZED VIEW"}
+
+
+def _view_indexes(cur, matview_oids):
+    """CREATE INDEX statements for the given materialized views' indexes."""
+    if not matview_oids:
+        return []
+    cur.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = ANY(%s::oid[])
+        ORDER BY i.indexrelid;
+    """, (matview_oids,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def _incoming_foreign_keys(cur, table: str):
+    """
+    (referencing table identifier, display name, constraint name, definition,
+    validated) for every FK on another table pointing at `table`.
+    """
+    cur.execute("""
+        SELECT n.nspname, c.relname, c.oid::regclass::text, k.conname,
+               pg_get_constraintdef(k.oid), k.convalidated
+        FROM pg_constraint k
+        JOIN pg_class c ON c.oid = k.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE k.contype = 'f'
+          AND k.confrelid = %s::regclass
+          AND k.conrelid <> k.confrelid
+        ORDER BY 3, 4;
+    """, (table,))
+    return [
+        (sql.Identifier(schema, name), display, conname, definition, validated)
+        for schema, name, display, conname, definition, validated in cur.fetchall()
+    ]
+
+
+def _grants(cur, relation, ident: sql.Composable):
+    """
+    GRANT statements on `ident` reproducing the privileges other roles hold
+    on `relation` (a name or oid).
+    """
+    cur.execute("""
+        SELECT r.rolname, a.privilege_type, a.is_grantable
+        FROM pg_class c
+        CROSS JOIN LATERAL aclexplode(c.relacl) a
+        LEFT JOIN pg_roles r ON r.oid = a.grantee
+        WHERE c.oid = %s::regclass
+          AND a.grantee <> c.relowner
+        ORDER BY 1, 2;
+    """, (relation,))
+    return [
+        sql.SQL("GRANT {} ON {} TO {}{};").format(
+            sql.SQL(privilege),
+            ident,
+            sql.Identifier(grantee) if grantee is not None else sql.SQL("PUBLIC"),
+            sql.SQL(" WITH GRANT OPTION" if grantable else ""),
+        )
+        for grantee, privilege, grantable in cur.fetchall()
+    ]
+
+
+def _reown_sequences(cur, source: str, target: str):
+    """Hand serial sequences owned by source's columns over to target so DROP doesn't take them."""
+    cur.execute("""
+        SELECT n.nspname, s.relname, a.attname
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_namespace n ON n.oid = s.relnamespace
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.classid = 'pg_class'::regclass
+          AND d.refobjid = %s::regclass
+          AND d.deptype = 'a';
+    """, (source,))
+    for schema, seq, column in cur.fetchall():
+        cur.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.{};").format(
+            sql.Identifier(schema, seq), sql.Identifier(target), sql.Identifier(column)))
+
+
+# Aggregates FactPlayerGame into {target} for the games matching the filters
+# (each of start_date / end_date / game_ids may be None = no filter).
+_AGGREGATE_TEMPLATE = """
         WITH games_in_range AS (
             SELECT gameid, date
             FROM dimgames
-            WHERE (%s IS NULL OR date >= %s)
-              AND (%s IS NULL OR date <= %s)
+            WHERE (%(start_date)s::date IS NULL OR date >= %(start_date)s::date)
+              AND (%(end_date)s::date IS NULL OR date <= %(end_date)s::date)
+              AND (%(game_ids)s::bigint[] IS NULL OR gameid = ANY(%(game_ids)s::bigint[]))
         ),
         team_totals AS (
             SELECT
@@ -94,10 +422,18 @@ def aggregate_team_games(conn, start_date: date | None = None, end_date: date |
                 g.hometeamid,
                 g.awayteamid,
                 g.home_score,
-                g.visitor_score
+                g.visitor_score,
+                -- opponent's summed box score (NULL if it hasn't been loaded)
+                opp.pts      AS opp_pts,
+                -- possession estimate for each side: FGA + 0.44*FTA - OREB + TOV
+                tt.fga  + 0.44 * tt.fta  - tt.oreb  + tt.tov  AS team_poss,
+                opp.fga + 0.44 * opp.fta - opp.oreb + opp.tov AS opp_poss
             FROM team_totals tt
             JOIN dimgames g
               ON tt.gameid = g.gameid
+            LEFT JOIN team_totals opp
+              ON opp.gameid = tt.gameid
+             AND opp.teamid <> tt.teamid
         ),
         final_calc AS (
             SELECT
@@ -134,10 +470,14 @@ def aggregate_team_games(conn, start_date: date | None = None, end_date: date |
                 CASE
                     WHEN j.teamid = j.hometeamid THEN j.visitor_score
                     ELSE j.home_score
-                END AS opp_score
+                END AS opp_score,
+                j.opp_pts,
+                -- both teams get the same number of possessions give or take
+                -- one, so use the average of the two estimates for the game
+                NULLIF((j.team_poss + j.opp_poss) / 2.0, 0) AS possessions
             FROM joined j
         )
-        INSERT INTO factteamgame
+        INSERT INTO {target}
             (teamid, gameid, opponentid,
              pts, reb, oreb, dreb, ast, stl, blk, pf, tov,
              minutes,
@@ -154,53 +494,78 @@ def aggregate_team_games(conn, start_date: date | None = None, end_date: date |
             minutes,
             fgm, fga, threepm, threepa, ftm, fta,
             fgpercent, threepercent, ftpercent,
-            NULL::FLOAT AS offrating,
-            NULL::FLOAT AS defrating,
-            NULL::FLOAT AS pace,
+            (100.0 * pts / possessions)::FLOAT     AS offrating,
+            (100.0 * opp_pts / possessions)::FLOAT AS defrating,
+            -- possessions per 48 minutes; team minutes / 5 = game minutes (incl. OT)
+            (48.0 * possessions / NULLIF(minutes / 5.0, 0))::FLOAT AS pace,
             fantasypointsdk, fantasypointsfd,
             (team_score > opp_score) AS winflag,
             (team_score - opp_score) AS margin
         FROM final_calc
-        ON CONFLICT (teamid, gameid) DO UPDATE
-        SET pts             = EXCLUDED.pts,
-            reb             = EXCLUDED.reb,
-            oreb            = EXCLUDED.oreb,
-            dreb            = EXCLUDED.dreb,
-            ast             = EXCLUDED.ast,
-            stl             = EXCLUDED.stl,
-            blk             = EXCLUDED.blk,
-            pf              = EXCLUDED.pf,
-            tov             = EXCLUDED.tov,
-            minutes         = EXCLUDED.minutes,
-            fgm             = EXCLUDED.fgm,
-            fga             = EXCLUDED.fga,
-            threepm         = EXCLUDED.threepm,
-            threepa         = EXCLUDED.threepa,
-            ftm             = EXCLUDED.ftm,
-            fta             = EXCLUDED.fta,
-            fgpercent       = EXCLUDED.fgpercent,
-            threepercent    = EXCLUDED.threepercent,
-            ftpercent       = EXCLUDED.ftpercent,
-            fantasypointsdk = EXCLUDED.fantasypointsdk,
-            fantasypointsfd = EXCLUDED.fantasypointsfd,
-            winflag         = EXCLUDED.winflag,
-            margin          = EXCLUDED.margin;
-        """,
-        (start_date, start_date, end_date, end_date),
-    )
+        {on_conflict};
+"""
 
-    conn.commit()
-    cur.close()
-    print("FactTeamGame aggregated successfully from FactPlayerGame + DimGames.")
+# Columns refreshed when an aggregated row already exists.
+UPSERT_COLUMNS = [
+    "pts", "reb", "oreb", "dreb", "ast", "stl", "blk", "pf", "tov",
+    "minutes",
+    "fgm", "fga", "threepm", "threepa", "ftm", "fta",
+    "fgpercent", "threepercent", "ftpercent",
+    "offrating", "defrating", "pace",
+    "fantasypointsdk", "fantasypointsfd",
+    "winflag", "margin",
+]
+
+
+def aggregate_sql(target: str = "factteamgame", upsert: bool = True) -> str:
+    """
+    The aggregation INSERT into `target`. With upsert=True existing rows are
+    updated, but only when a value actually changed, so re-aggregating an
+    unchanged game doesn't leave a dead tuple behind.
+    """
+    on_conflict = ""
+    if upsert:
+        sets = ",\n            ".join(f"{c:<15} = EXCLUDED.{c}" for c in UPSERT_COLUMNS)
+        old = ", ".join(f"{target}.{c}" for c in UPSERT_COLUMNS)
+        new = ", ".join(f"EXCLUDED.{c}" for c in UPSERT_COLUMNS)
+        on_conflict = (
+            "ON CONFLICT (teamid, gameid) DO UPDATE\n"
+            f"        SET {sets}\n"
+            f"        WHERE ({old}) IS DISTINCT FROM ({new})"
+        )
+    return _AGGREGATE_TEMPLATE.format(target=target, on_conflict=on_conflict)
+
+
+AGGREGATE_SQL = aggregate_sql()
+
+# Rows for games in the filters whose team no longer has any player rows
+# (e.g. a stat line re-attributed to the other team).
+PRUNE_SQL = """
+        DELETE FROM factteamgame t
+        USING dimgames g
+        WHERE t.gameid = g.gameid
+          AND (%(start_date)s::date IS NULL OR g.date >= %(start_date)s::date)
+          AND (%(end_date)s::date IS NULL OR g.date <= %(end_date)s::date)
+          AND (%(game_ids)s::bigint[] IS NULL OR g.gameid = ANY(%(game_ids)s::bigint[]))
+          AND NOT EXISTS (
+              SELECT 1
+              FROM factplayergame f
+              WHERE f.gameid = t.gameid
+                AND f.teamid = t.teamid
+          );
+"""
 
 
 def get_date_range_from_args():
     """
-    Parse --start-date / --end-date from CLI.
+    Parse --start-date / --end-date / --full from CLI.
 
     - If both provided, use that range.
     - If only one provided, use that day for both (single day).
-    - If none provided, return (None, None) meaning "all games".
+    - If none provided, return (None, None): incremental over DirtyGames,
+      or every game with --full.
+
+    Returns (start_date, end_date, args).
     """
     parser = argparse.ArgumentParser(
         description="Aggregate team-level box scores into FactTeamGame"
@@ -208,40 +573,48 @@ def get_date_range_from_args():
     parser.add_argument(
         "--start-date",
         type=str,
-        help="Start date (YYYY-MM-DD). If omitted, and no end-date, rebuild all games.",
+        help="Start date (YYYY-MM-DD). If omitted, and no end-date, only dirty games are re-aggregated.",
     )
     parser.add_argument(
         "--end-date",
         type=str,
-        help="End date (YYYY-MM-DD). If omitted, and no start-date, rebuild all games.",
+        help="End date (YYYY-MM-DD). If omitted, and no start-date, only dirty games are re-aggregated.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild FactTeamGame for ALL games in a shadow table and swap it in.",
     )
     args = parser.parse_args()
 
     if args.start_date and args.end_date:
         s = datetime.strptime(args.start_date, "%Y-%m-%d").date()
         e = datetime.strptime(args.end_date, "%Y-%m-%d").date()
-        return s, e
+        return s, e, args
     elif args.start_date and not args.end_date:
         d = datetime.strptime(args.start_date, "%Y-%m-%d").date()
-        return d, d
+        return d, d, args
     elif not args.start_date and args.end_date:
         d = datetime.strptime(args.end_date, "%Y-%m-%d").date()
-        return d, d
+        return d, d, args
     else:
-        # No dates -> full rebuild
-        return None, None
+        # No dates -> incremental (or full rebuild with --full)
+        return None, None, args
 
 
 def main():
-    start_date, end_date = get_date_range_from_args()
+    start_date, end_date, args = get_date_range_from_args()
 
-    if start_date is None and end_date is None:
-        print("No dates supplied. Will rebuild FactTeamGame for ALL games.")
+    if args.full:
+        print("--full supplied. Will rebuild FactTeamGame for ALL games.")
+        start_date = end_date = None
+    elif start_date is None and end_date is None:
+        print("No dates supplied. Will re-aggregate FactTeamGame for dirty games only.")
     else:
         print(f"Will aggregate FactTeamGame for games between {start_date} and {end_date}.")
 
     conn = get_connection()
-    aggregate_team_games(conn, start_date, end_date)
+    aggregate_team_games(conn, start_date, end_date, full=args.full)
     conn.close()
 
 